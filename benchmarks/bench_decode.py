@@ -0,0 +1,52 @@
+import os
+import sys
+import json
+import time
+import argparse
+from functools import partial
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import generate_lines
+from scripts.decode import DECODERS, decode_row, orjson
+
+
+def to_arrays(row: dict) -> dict:
+    for value in row.values():
+        for value1 in value.values():
+            for key2, value2 in value1.items():
+                value1[key2] = np.array(value2)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--sites", type=int, default=5000, help="Number of sites")
+    parser.add_argument("--mean-reads", type=float, default=40, help="Mean reads per site")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+
+    args = parser.parse_args()
+
+    lines = list(generate_lines(args.sites, args.mean_reads, args.seed))
+    print(f"{len(lines)} lines, {sum(len(line) for line in lines) / 1e6:.1f} MB")
+
+    decoders = {"json.loads + np.array": lambda line: to_arrays(json.loads(line))}
+    for decoder in DECODERS:
+        if decoder == "orjson" and orjson is None:
+            continue
+        decoders[f"decode_row ({decoder})"] = partial(decode_row, decoder=decoder)
+
+    baseline = None
+    for name, decode in decoders.items():
+        start = time.perf_counter()
+        for line in lines:
+            decode(line)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        print(f"{name:<24}: {elapsed:.3f}s ({baseline / elapsed:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+from contextlib import contextmanager
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import DEPTH_DISTRIBUTIONS, generate_lines
+from scripts.catboost_predictions import load_model, score_batch
+from scripts.decode import decode_row
+from scripts.engine import blocks_to_frame
+from scripts.ragged_features import pack_rows, ragged_features
+from scripts.site_features import fused_site_features
+from scripts.streaming import write_parquet
+from scripts.two_means import batch_two_means, two_means
+
+
+STAGES = ["decode", "cluster", "aggregate", "frame", "write", "load_model", "inference"]
+
+
+class StageTimer:
+    """
+    Accumulates wall time per stage over a run, e.g. over all chunks of a dataset.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+
+
+def featurize_ragged(lines: list, timer: StageTimer) -> tuple:
+    """
+    Featurizes a chunk like `ragged_features.featurize_chunk_ragged`, timing decoding,
+    clustering and aggregation separately.
+    """
+    with timer.stage("decode"):
+        keys, data, offsets = pack_rows([decode_row(line) for line in lines])
+    with timer.stage("cluster"):
+        counts = np.diff(offsets)
+        valid_offsets = np.concatenate(([0], np.cumsum(counts[counts > 0])))
+        labels = batch_two_means(data, valid_offsets) if len(data) else None
+    with timer.stage("aggregate"):
+        features = ragged_features(data, offsets, labels=labels)
+    return keys, features
+
+
+def featurize_sites(lines: list, timer: StageTimer) -> tuple:
+    """
+    Featurizes a chunk one site at a time like `site_features.featurize_site`, timing
+    decoding, clustering and aggregation separately.
+    """
+    with timer.stage("decode"):
+        keys = []
+        arrays = []
+        for row in (decode_row(line) for line in lines):
+            for key, value in row.items():
+                for key1, value1 in value.items():
+                    for key2, value2 in value1.items():
+                        keys.append((key, key1, key2))
+                        arrays.append(value2)
+    with timer.stage("cluster"):
+        labels = [
+            two_means(array) if len(array) >= 2 else np.zeros(len(array), dtype=np.int64)
+            for array in arrays
+        ]
+    with timer.stage("aggregate"):
+        features = np.stack(
+            [fused_site_features(array, site_labels) for array, site_labels in zip(arrays, labels)]
+        )
+    return keys, features
+
+
+FEATURIZERS = {"ragged": featurize_ragged, "site": featurize_sites}
+
+
+def run_once(lines: list, featurizer: str, chunk_size: int, model_path: str, tmp_dir: str) -> dict:
+    """
+    Runs every stage once over the dataset and returns the seconds spent in each.
+    """
+    timer = StageTimer()
+    blocks = []
+    for start in range(0, len(lines), chunk_size):
+        keys, features = FEATURIZERS[featurizer](lines[start:start + chunk_size], timer)
+        blocks.append(
+            {
+                "transcript_id": np.array([key[0] for key in keys], dtype=str),
+                "transcript_position": np.array([key[1] for key in keys], dtype=np.int64),
+                "seq": np.array([key[2] for key in keys], dtype=str),
+                "features": features,
+            }
+        )
+
+    with timer.stage("frame"):
+        df = blocks_to_frame(blocks)
+    with timer.stage("write"):
+        write_parquet(df, os.path.join(tmp_dir, "features.parquet"))
+
+    if model_path:
+        with timer.stage("load_model"):
+            model = load_model(model_path)
+        with timer.stage("inference"):
+            score_batch(model, df)
+    return timer.seconds
+
+
+def git_revision() -> dict:
+    """
+    Returns the current commit and whether the working tree has uncommitted changes,
+    or None outside a git checkout.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=root, capture_output=True, text=True, check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return {"commit": commit, "dirty": bool(status.strip())}
+
+
+def summarize(runs: list, n_sites: int, n_reads: int) -> dict:
+    """
+    Summarizes the stage timings of repeated runs by their best and median time.
+    """
+    stages = {}
+    for name in STAGES:
+        seconds = [run[name] for run in runs if name in run]
+        if not seconds:
+            continue
+        best = min(seconds)
+        stages[name] = {
+            "seconds": seconds,
+            "best": best,
+            "median": float(np.median(seconds)),
+            "sites_per_second": n_sites / best if best > 0 else None,
+            "reads_per_second": n_reads / best if best > 0 else None,
+        }
+    return stages
+
+
+def print_comparison(stages: dict, baseline: dict):
+    """
+    Prints the best time of every stage next to that of an earlier result file.
+    """
+    revision = baseline.get("git") or {}
+    print(f"\nCompared with {revision.get('commit', 'unknown')[:10]} (speed-up > 1 is faster now)")
+    print(f"{'stage':<12} {'before':>9} {'now':>9} {'speed-up':>9}")
+    for name, stage in stages.items():
+        before = baseline.get("stages", {}).get(name)
+        if before is None:
+            continue
+        print(
+            f"{name:<12} {before['best']:>8.3f}s {stage['best']:>8.3f}s "
+            f"{before['best'] / stage['best']:>8.2f}x"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Times every stage of parsing and scoring a synthetic dataset."
+    )
+
+    parser.add_argument("--sites", type=int, default=5000, help="Number of sites")
+    parser.add_argument("--mean-reads", type=float, default=40, help="Mean reads per site")
+    parser.add_argument(
+        "--depth", choices=DEPTH_DISTRIBUTIONS, default="negative_binomial", help="Read depth distribution"
+    )
+    parser.add_argument("--featurizer", choices=list(FEATURIZERS), default="ragged", help="Featurizer")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Sites featurized at a time")
+    parser.add_argument("--repeats", type=int, default=3, help="Number of timed runs")
+    parser.add_argument(
+        "--model",
+        type=str,
+        default="models/final_catboost_model.cbm",
+        help="CatBoost model used for the inference stage, skipped if the file does not exist",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--output", type=str, help="Path of a JSON file to save the results to")
+    parser.add_argument("--compare", type=str, help="Path of an earlier JSON result file to compare with")
+
+    args = parser.parse_args()
+
+    lines = list(generate_lines(args.sites, args.mean_reads, args.seed, args.depth))
+    n_reads = sum(line.count("[") - 1 for line in lines)
+    n_bytes = sum(len(line) + 1 for line in lines)
+    model_path = args.model if os.path.exists(args.model) else None
+    if model_path is None:
+        print(f"Model '{args.model}' not found, skipping the inference stages.")
+
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for _ in range(args.repeats):
+            runs.append(run_once(lines, args.featurizer, args.chunk_size, model_path, tmp_dir))
+    stages = summarize(runs, len(lines), n_reads)
+
+    print(
+        f"{len(lines)} sites, {n_reads} reads, {n_bytes / 1e6:.1f} MB, {args.depth} depths, "
+        f"{args.featurizer} featurizer, best of {args.repeats}"
+    )
+    print(f"{'stage':<12} {'best':>9} {'median':>9} {'sites/s':>10}")
+    for name, stage in stages.items():
+        print(
+            f"{name:<12} {stage['best']:>8.3f}s {stage['median']:>8.3f}s "
+            f"{stage['sites_per_second']:>10.0f}"
+        )
+
+    result = {
+        "benchmark": "pipeline",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git": git_revision(),
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {
+            "sites": args.sites,
+            "mean_reads": args.mean_reads,
+            "depth": args.depth,
+            "featurizer": args.featurizer,
+            "chunk_size": args.chunk_size,
+            "repeats": args.repeats,
+            "model": model_path,
+            "seed": args.seed,
+        },
+        "dataset": {"sites": len(lines), "reads": n_reads, "bytes": n_bytes},
+        "stages": stages,
+        "total": sum(stage["best"] for stage in stages.values()),
+    }
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(stages, json.load(f))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
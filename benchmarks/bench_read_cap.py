@@ -0,0 +1,72 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic import write_dataset
+from scripts.catboost_predictions import load_model, score_batch
+from scripts.decode import SAMPLINGS, ReadCap
+from scripts.engine import blocks_to_frame, iter_feature_blocks
+from scripts.parse_testset import parse_row_features
+
+
+def featurize(json_path: str, read_cap: ReadCap = None) -> tuple:
+    """
+    Featurizes a dataset with the ragged featurizer, returning the parsed frame and
+    the featurization time.
+    """
+    start = time.perf_counter()
+    blocks = list(
+        iter_feature_blocks(
+            json_path, parse_row_features, chunk_size=1000, featurizer="ragged", read_cap=read_cap
+        )
+    )
+    return blocks_to_frame(blocks), time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--sites", type=int, default=3000, help="Number of sites")
+    parser.add_argument("--mean-reads", type=float, default=150, help="Mean reads per site")
+    parser.add_argument(
+        "--max-reads", type=int, nargs="+", default=[50, 100, 200], help="Read caps to compare"
+    )
+    parser.add_argument("--sampling", choices=SAMPLINGS, default="uniform", help="Subsampling")
+    parser.add_argument(
+        "--model", type=str, default="models/final_catboost_model.cbm", help="Model used to score"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        json_path = os.path.join(tmp_dir, "data.json")
+        write_dataset(json_path, args.sites, args.mean_reads, args.seed)
+
+        df, full_time = featurize(json_path)
+        reference = score_batch(model, df)["score"].to_numpy()
+        print(f"{args.sites} sites, mean reads {args.mean_reads:g}, {args.sampling} sampling")
+        print(f"{'max reads':>10} {'capped':>8} {'featurize':>10} {'mean |d|':>9} {'p99 |d|':>8} {'max |d|':>8} {'corr':>7}")
+        print(f"{'none':>10} {0:>7.1%} {full_time:>9.2f}s")
+
+        for max_reads in args.max_reads:
+            read_cap = ReadCap(max_reads, args.sampling, args.seed)
+            capped_df, capped_time = featurize(json_path, read_cap)
+            scores = score_batch(model, capped_df)["score"].to_numpy()
+            capped = (capped_df["n_reads"] > max_reads).mean()
+            diff = np.abs(scores - reference)
+            corr = np.corrcoef(scores, reference)[0, 1]
+            print(
+                f"{max_reads:>10} {capped:>7.1%} {capped_time:>9.2f}s {diff.mean():>9.4f} "
+                f"{np.quantile(diff, 0.99):>8.4f} {diff.max():>8.4f} {corr:>7.4f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
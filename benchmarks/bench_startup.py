@@ -0,0 +1,117 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_pipeline import git_revision
+from benchmarks.synthetic import write_dataset
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENTRY_POINT = os.path.join(ROOT, "m6atect")
+
+
+def startup_cases(dataset_path: str, output_name: str) -> dict:
+    """
+    Returns the commands timed by the benchmark: the interpreter alone, the help of
+    `m6atect` and of each of its commands next to that of the script it runs, and a
+    full parse of a tiny dataset.
+    """
+    python = sys.executable
+    scripts = os.path.join(ROOT, "scripts")
+    return {
+        "python": [python, "-c", "pass"],
+        "m6atect --help": [python, ENTRY_POINT, "--help"],
+        "m6atect parse --help": [python, ENTRY_POINT, "parse", "--help"],
+        "parse_testset.py --help": [python, os.path.join(scripts, "parse_testset.py"), "--help"],
+        "m6atect train --help": [python, ENTRY_POINT, "train", "--help"],
+        "catboost_training.py --help": [python, os.path.join(scripts, "catboost_training.py"), "--help"],
+        "m6atect train --lgbm --help": [python, ENTRY_POINT, "train", "--lgbm", "--help"],
+        "lgbm_predictions.py train --help": [
+            python, os.path.join(scripts, "lgbm_predictions.py"), "train", "--help"
+        ],
+        "m6atect predict --help": [python, ENTRY_POINT, "predict", "--help"],
+        "catboost_predictions.py --help": [
+            python, os.path.join(scripts, "catboost_predictions.py"), "--help"
+        ],
+        "m6atect evaluate --help": [python, ENTRY_POINT, "evaluate", "--help"],
+        "compare_training_results.py --help": [
+            python, os.path.join(scripts, "compare_training_results.py"), "--help"
+        ],
+        "m6atect parse (tiny dataset)": [
+            python, ENTRY_POINT, "parse", dataset_path, output_name, "--workers", "1"
+        ],
+    }
+
+
+def time_command(command: list, repeats: int, cwd: str) -> list:
+    """
+    Runs a command `repeats` times in a fresh process and returns the wall time of
+    every run.
+    """
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Times the startup of the m6atect commands and of the scripts they run."
+    )
+
+    parser.add_argument("--repeats", type=int, default=5, help="Number of timed runs per command")
+    parser.add_argument("--sites", type=int, default=20, help="Number of sites of the tiny parsed dataset")
+    parser.add_argument("--output", type=str, help="Path of a JSON file to save the results to")
+
+    args = parser.parse_args()
+
+    cases = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # The parsing scripts write to data/ under the working directory
+        os.makedirs(os.path.join(tmp_dir, "data"))
+        dataset_path = os.path.join(tmp_dir, "tiny.json")
+        write_dataset(dataset_path, args.sites)
+        for name, command in startup_cases(dataset_path, "tiny").items():
+            seconds = time_command(command, args.repeats, tmp_dir)
+            cases[name] = {
+                "seconds": seconds,
+                "best": min(seconds),
+                "median": float(np.median(seconds)),
+            }
+
+    print(f"Startup of {len(cases)} commands, best of {args.repeats}")
+    print(f"{'command':<36} {'best':>8} {'median':>8}")
+    for name, case in cases.items():
+        print(f"{name:<36} {case['best']:>7.3f}s {case['median']:>7.3f}s")
+
+    result = {
+        "benchmark": "startup",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git": git_revision(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {"repeats": args.repeats, "sites": args.sites},
+        "commands": cases,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
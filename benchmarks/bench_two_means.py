@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from sklearn.cluster import KMeans
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.two_means import N_INIT, batch_two_means, two_means
+
+
+def make_sites(n_sites: int, mean_reads: int, seed: int = 0) -> list:
+    """
+    Generates random read arrays shaped like m6Anet sites (reads x 9 features).
+    """
+    rng = np.random.default_rng(seed)
+    depths = np.maximum(rng.poisson(mean_reads, size=n_sites), 2)
+    return [rng.normal(0, 1, size=(depth, 9)) for depth in depths]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("--sites", type=int, default=2000, help="Number of sites")
+    parser.add_argument("--mean-reads", type=int, default=40, help="Mean reads per site")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+
+    args = parser.parse_args()
+
+    sites = make_sites(args.sites, args.mean_reads, args.seed)
+    offsets = np.concatenate(([0], np.cumsum([len(site) for site in sites])))
+    data = np.vstack(sites)
+
+    start = time.perf_counter()
+    for site in sites:
+        KMeans(n_clusters=2, random_state=0, n_init=N_INIT).fit(site)
+    sklearn_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for site in sites:
+        two_means(site)
+    single_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch_two_means(data, offsets)
+    batch_time = time.perf_counter() - start
+
+    print(f"{args.sites} sites, {len(data)} reads")
+    print(f"sklearn KMeans per site : {sklearn_time:.3f}s")
+    print(f"two_means per site      : {single_time:.3f}s ({sklearn_time / single_time:.1f}x)")
+    print(f"batch_two_means         : {batch_time:.3f}s ({sklearn_time / batch_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
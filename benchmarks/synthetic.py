@@ -0,0 +1,122 @@
+import gzip
+import argparse
+import numpy as np
+
+
+BASES = np.array(list("ACGT"))
+DEPTH_DISTRIBUTIONS = ["negative_binomial", "poisson", "lognormal", "fixed"]
+
+
+def generate_reads(rng: np.random.Generator, n_reads: int) -> np.ndarray:
+    """
+    Generates reads shaped like m6Anet signal features: dwell time, current standard
+    deviation and mean current for the three 5-mers of a 7-mer.
+    """
+    reads = np.empty((n_reads, 9))
+    shift = rng.normal(0, 3)
+    for k in range(3):
+        reads[:, 3 * k] = rng.lognormal(-5, 0.6, size=n_reads)
+        reads[:, 3 * k + 1] = rng.gamma(4, 1.5, size=n_reads)
+        reads[:, 3 * k + 2] = rng.normal(105 + shift, 8, size=n_reads)
+    modified = rng.random(n_reads) < rng.uniform(0, 0.4)
+    reads[modified, 5] += 6
+    return reads
+
+
+def draw_depths(
+    rng: np.random.Generator, n_sites: int, mean_reads: float, depth: str = "negative_binomial"
+) -> np.ndarray:
+    """
+    Draws the number of reads of every site, at least one, with mean close to
+    `mean_reads`. "negative_binomial" is overdispersed like real m6Anet depths,
+    "poisson" is narrow, "lognormal" has a long tail of very deep sites and "fixed"
+    gives every site the same depth.
+    """
+    if depth == "negative_binomial":
+        depths = rng.negative_binomial(2, 2 / (2 + mean_reads), size=n_sites)
+    elif depth == "poisson":
+        depths = rng.poisson(mean_reads, size=n_sites)
+    elif depth == "lognormal":
+        sigma = 1.2
+        depths = np.rint(rng.lognormal(np.log(mean_reads) - sigma**2 / 2, sigma, size=n_sites))
+    elif depth == "fixed":
+        depths = np.full(n_sites, round(mean_reads))
+    else:
+        raise ValueError(f"Unknown depth distribution '{depth}'. Please use one of {DEPTH_DISTRIBUTIONS}.")
+    return np.maximum(depths, 1).astype(np.int64)
+
+
+def generate_lines(
+    n_sites: int, mean_reads: float = 40, seed: int = 0, depth: str = "negative_binomial"
+):
+    """
+    Yields lines in the m6Anet data.json format, {transcript: {position: {kmer: reads}}},
+    with read depths drawn by `draw_depths`.
+
+    Parameters
+    ----------
+    n_sites : int
+        Number of sites (lines) to generate.
+
+    mean_reads : float
+        Mean number of reads per site.
+
+    seed : int
+        Random seed.
+
+    depth : str
+        Read depth distribution, one of `DEPTH_DISTRIBUTIONS`.
+
+    Yields
+    ------
+    line : str
+        A single line of JSON data, without the trailing newline.
+    """
+    rng = np.random.default_rng(seed)
+    depths = draw_depths(rng, n_sites, mean_reads, depth)
+    transcript = 0
+    position = 0
+    for depth in depths:
+        if rng.random() < 0.05:
+            transcript += 1
+            position = 0
+        position += int(rng.integers(1, 50))
+        kmer = "".join(rng.choice(BASES, size=7))
+        reads = ",".join(
+            "[" + ",".join(f"{value:.3g}" for value in read) + "]"
+            for read in generate_reads(rng, depth)
+        )
+        yield f'{{"ENST{transcript:011d}":{{"{position}":{{"{kmer}":[{reads}]}}}}}}'
+
+
+def write_dataset(
+    path: str, n_sites: int, mean_reads: float = 40, seed: int = 0, depth: str = "negative_binomial"
+):
+    """
+    Writes a synthetic dataset to a JSON or gzipped JSON (.json.gz) file.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "wt") as f:
+        for line in generate_lines(n_sites, mean_reads, seed, depth):
+            f.write(line + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("output_path", type=str, help="Path of the .json or .json.gz file to write")
+    parser.add_argument("--sites", type=int, default=10000, help="Number of sites")
+    parser.add_argument("--mean-reads", type=float, default=40, help="Mean reads per site")
+    parser.add_argument(
+        "--depth", choices=DEPTH_DISTRIBUTIONS, default="negative_binomial", help="Read depth distribution"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+
+    args = parser.parse_args()
+
+    write_dataset(args.output_path, args.sites, args.mean_reads, args.seed, args.depth)
+    print(f"{args.sites} synthetic sites saved to {args.output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import gzip
+import json
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def make_line():
+    """
+    Returns a builder of synthetic test set lines with one site of `n_reads` reads.
+
+    The current of the i-th read is `100 - slope * i`, so that a `slope` that varies
+    across sites, e.g. the position, gives them distinct features.
+    """
+
+    def make(transcript_id, position, n_reads=4, slope=1, kmer="AAACTGG"):
+        reads = [[0.01 * (i + 1), 2.0 + i, 100.0 - slope * i] * 3 for i in range(n_reads)]
+        return json.dumps({transcript_id: {str(position): {kmer: reads}}})
+
+    return make
+
+
+@pytest.fixture
+def site_lines(make_line):
+    """
+    Returns a builder of `n_lines` lines of sites with 2 to 5 reads, three per
+    transcript.
+    """
+
+    def make(n_lines):
+        return [make_line(f"ENST{i // 3}", i, n_reads=2 + i % 4) for i in range(n_lines)]
+
+    return make
+
+
+@pytest.fixture
+def random_lines():
+    """
+    Returns a builder of `n_sites` lines of sites with 1 to 29 seeded random reads,
+    rounded to 3 decimals, four per transcript.
+    """
+
+    def make(n_sites, seed=0):
+        rng = np.random.default_rng(seed)
+        return [
+            json.dumps(
+                {f"ENST{i // 4}": {str(i): {"AAACTGG": rng.normal(size=(rng.integers(1, 30), 9)).round(3).tolist()}}}
+            )
+            for i in range(n_sites)
+        ]
+
+    return make
+
+
+@pytest.fixture
+def write_lines():
+    """
+    Returns a writer of lines to a plain or, for a `.gz` path, gzipped file, which
+    returns the path as a string.
+    """
+
+    def write(path, lines):
+        opener = gzip.open if str(path).endswith(".gz") else open
+        with opener(path, "wt") as f:
+            f.write("\n".join(lines) + "\n")
+        return str(path)
+
+    return write
+
+
+@pytest.fixture
+def write_training_set(make_line, write_lines):
+    """
+    Returns a writer of a parsed, labelled training set of `n_sites` sites, five per
+    transcript and `sites_per_gene` per gene, with every third site labelled 1.
+    """
+    from scripts.parse_testset import parse_json
+    from scripts.streaming import write_parquet
+
+    def write(tmp_path, n_sites=120, sites_per_gene=10, kmers=("AAACTGG",)):
+        lines = [
+            make_line(f"ENST{i // 5}", i, n_reads=2 + i % 6, slope=i, kmer=kmers[i % len(kmers)])
+            for i in range(n_sites)
+        ]
+        train = parse_json(write_lines(tmp_path / "data.json", lines)).assign(
+            gene_id=lambda x: "ENSG" + (x["transcript_position"] // sites_per_gene).astype(str),
+            label=lambda x: (x["transcript_position"] % 3 == 0).astype(int),
+        )
+        path = str(tmp_path / "train.parquet")
+        write_parquet(train, path)
+        return path
+
+    return write
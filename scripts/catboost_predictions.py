@@ -1,43 +1,112 @@
 import pandas as pd
+import numpy as np
 import argparse
 import os
+import sys
 from catboost import CatBoostClassifier
 
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-def generate_predictions(testing_path, model_path):
+from scripts.streaming import iter_parquet_frames, write_predictions
 
-    test = pd.read_parquet(testing_path)
-    print(f"{len(test)} rows loaded for predictions")
 
-    na_row_count = test.isna().any(axis=1).sum()
-    print(f"Number of Invalid Rows: {na_row_count}")
+KMER_COLUMNS = ["seq_1", "seq_2", "seq_3"]
 
-    test["seq_1"] = test["seq"].apply(lambda x: x[0:5])
-    test["seq_2"] = test["seq"].apply(lambda x: x[1:6])
-    test["seq_3"] = test["seq"].apply(lambda x: x[2:7])
 
-    if na_row_count > 0:
-        test_valid = test.dropna()
-    else:
-        test_valid = test
-
-    x_test = test_valid.drop(columns=["transcript_id", "transcript_position", "seq"])
-    
+def load_model(model_path: str) -> CatBoostClassifier:
+    """
+    Loads a trained CatBoost model.
+    """
     print("Loading Model...")
-    cb = CatBoostClassifier()
-    cb.load_model(model_path)
+    model = CatBoostClassifier()
+    model.load_model(model_path)
     print("Model loaded")
-
+    return model
+
+
+def add_kmer_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds the three 5-mers of every 7-mer, `seq_1`, `seq_2` and `seq_3`, with vectorized
+    string slicing.
+    """
+    seq = df["seq"].astype(str).str
+    kmers = pd.DataFrame(
+        {"seq_1": seq.slice(0, 5), "seq_2": seq.slice(1, 6), "seq_3": seq.slice(2, 7)},
+        index=df.index,
+    )
+    return pd.concat([df, kmers], axis=1)
+
+
+def score_batch(model: CatBoostClassifier, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Scores a batch of parsed rows with a loaded model. Rows with missing features get a
+    missing score instead of being dropped, so the output keeps the order of the input.
+
+    Parameters
+    ----------
+    model : CatBoostClassifier
+        The loaded model.
+
+    df : pd.DataFrame
+        Parsed rows, with the key columns and the generated features.
+
+    Returns
+    -------
+    scores : pd.DataFrame
+        `transcript_id`, `transcript_position` and the predicted probability `score`.
+    """
+    x = add_kmer_columns(df)[model.feature_names_]
+    valid = ~x.isna().any(axis=1).to_numpy()
+    scores = np.full(len(df), np.nan)
+    if valid.any():
+        scores[valid] = model.predict_proba(x[valid])[:, 1]
+
+    df_scores = df[["transcript_id", "transcript_position"]].reset_index(drop=True)
+    df_scores["score"] = scores
+    return df_scores
+
+
+def iter_predictions(testing_path: str, model: CatBoostClassifier, batch_size: int = 65536):
+    """
+    Scores a parsed dataset one batch at a time, reading only the columns the model
+    needs, so that peak memory is set by the batch size rather than the dataset size.
+
+    Parameters
+    ----------
+    testing_path : str
+        Path of the parsed Parquet file or dataset directory.
+
+    model : CatBoostClassifier
+        The loaded model.
+
+    batch_size : int
+        Maximum number of rows read and scored at a time.
+
+    Yields
+    ------
+    scores : pd.DataFrame
+        The scores of the next batch, see `score_batch`, in the order of the input.
+    """
+    columns = ["transcript_id", "transcript_position", "seq"] + [
+        name for name in model.feature_names_ if name not in KMER_COLUMNS
+    ]
+    for df in iter_parquet_frames(testing_path, columns, batch_size=batch_size):
+        yield score_batch(model, df)
+
+
+def generate_predictions(testing_path, model_path, batch_size=65536):
+    """
+    Scores a parsed dataset in batches and returns all the scores as one frame,
+    see `iter_predictions`.
+    """
+    model = load_model(model_path)
     print("Generating Predictions on Test Set...")
-    df_final = test_valid[["transcript_id", "transcript_position"]].copy()
-    predictions = cb.predict_proba(x_test)[:, 1]
-    df_final["score"] = predictions
-
-    if na_row_count > 0:
-        test_invalid = test[test.isna().any(axis=1)]
-        df_invalid = test_invalid[["transcript_id", "transcript_position"]].copy()
-        df_invalid["score"] = None
-        df_final = pd.concat([df_final, df_invalid], axis = 0).sort_values(by=["transcript_id", "transcript_position"])
+    batches = list(iter_predictions(testing_path, model, batch_size=batch_size))
+    if not batches:
+        return pd.DataFrame(columns=["transcript_id", "transcript_position", "score"])
+    df_final = pd.concat(batches, ignore_index=True)
+    print(f"{len(df_final)} rows scored, Number of Invalid Rows: {df_final['score'].isna().sum()}")
 
     return df_final
 
@@ -45,10 +114,13 @@ def generate_predictions(testing_path, model_path):
 def main():
     parser = argparse.ArgumentParser()
 
-    parser.add_argument("testing_path", type=str, help="Path to the testing file")
+    parser.add_argument("testing_path", type=str, help="Path to the testing file or dataset directory")
     parser.add_argument("model_path", type=str, help="Path to the model file")
     parser.add_argument("output_name", type=str, help="Name of the output file")
     parser.add_argument("--parquet", action="store_true", help="Save output as Parquet instead of CSV")
+    parser.add_argument(
+        "--batch-size", type=int, default=65536, help="Rows read and scored per batch"
+    )
 
     args = parser.parse_args()
 
@@ -58,16 +130,19 @@ def main():
     save_as_parquet = args.parquet
 
     print("Generate Predictions")
-    df = generate_predictions(testing_path, model_path)
+    model = load_model(model_path)
 
     os.makedirs("output", exist_ok=True)
     if save_as_parquet:
         output_path = f"output/{output_name}.parquet"
-        df.to_parquet(output_path)
     else:
         output_path = f"output/{output_name}.csv"
-        df.to_csv(output_path, index=False)
-        
+
+    print("Generating Predictions on Test Set...")
+    batches = iter_predictions(testing_path, model, batch_size=args.batch_size)
+    rows_written, invalid_rows = write_predictions(batches, output_path)
+    print(f"{rows_written} rows scored, Number of Invalid Rows: {invalid_rows}")
+
     print(f"Processing complete, dataset saved to {output_path}")
 
 
@@ -1,43 +1,302 @@
+import hashlib
+import json
+import shutil
+import sys
+import tempfile
+import numpy as np
 import pandas as pd
 import argparse
 import os
-from sklearn.metrics import (
-    roc_auc_score,
-    auc,
-    precision_recall_curve,
-    confusion_matrix,
-    accuracy_score,
-)
-from catboost import CatBoostClassifier
 
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-def generate_predictions(training_path):
+
+# Bump whenever a change to how pools are built changes their content, so that pools
+# cached by an older version are no longer reused
+POOL_VERSION = 1
+NON_FEATURE_COLUMNS = ["transcript_id", "transcript_position", "seq", "gene_id", "label", "n_reads"]
+
+
+def split_by_gene(genes: np.ndarray, validation_fraction: float, seed: int = 0) -> np.ndarray:
+    """
+    Holds out whole genes, drawn in a seeded random order until they cover
+    `validation_fraction` of the rows, so that no gene is in both the training and
+    the held-out rows. At least one gene is always kept for training.
+
+    Parameters
+    ----------
+    genes : np.ndarray
+        Gene of every row.
+
+    validation_fraction : float
+        Fraction of rows to hold out, between 0 and 1.
+
+    seed : int
+        Seed of the order in which genes are drawn.
+
+    Returns
+    -------
+    held_out : np.ndarray
+        Boolean mask of the held-out rows.
+    """
+    if not 0 <= validation_fraction < 1:
+        raise ValueError(f"The validation fraction must be in [0, 1), got {validation_fraction}.")
+    unique, inverse, counts = np.unique(genes, return_inverse=True, return_counts=True)
+    if validation_fraction == 0 or len(unique) < 2:
+        return np.zeros(len(genes), dtype=bool)
+    order = np.random.default_rng(seed).permutation(len(unique))
+    covered = np.cumsum(counts[order])
+    n_genes = int(np.searchsorted(covered, validation_fraction * len(genes))) + 1
+    return np.isin(inverse, order[:min(n_genes, len(unique) - 1)])
+
+
+def training_frame(train: pd.DataFrame) -> tuple:
+    """
+    Splits a parsed, labelled training set into the model inputs, the generated
+    features followed by the `seq_1`, `seq_2` and `seq_3` 5-mers, and the labels.
+    """
+    from scripts.catboost_predictions import add_kmer_columns
+
+    x = add_kmer_columns(train).drop(columns=NON_FEATURE_COLUMNS, errors="ignore")
+    return x, train["label"].to_numpy()
+
+
+def _dataset_digest(training_path: str) -> str:
+    # Hashes the content of a Parquet file or of every file of a dataset directory
+    if os.path.isdir(training_path):
+        paths = sorted(
+            os.path.join(root, name) for root, _, names in os.walk(training_path) for name in names
+        )
+    else:
+        paths = [training_path]
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.relpath(path, training_path).encode("utf-8"))
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(2**20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def build_pools(
+    training_path: str,
+    validation_fraction: float = 0.0,
+    seed: int = 0,
+    border_count: int = 254,
+    thread_count: int = -1,
+    pool_dir: str = None,
+) -> tuple:
+    """
+    Reads a parsed, labelled training set, holds out whole genes with `split_by_gene`
+    and builds quantized CatBoost pools of the training and held-out rows. The
+    held-out rows are quantized with the borders of the training rows.
+
+    Parameters
+    ----------
+    training_path : str
+        Path of the parsed, labelled training Parquet file or dataset directory.
+
+    validation_fraction : float
+        Fraction of rows held out for early stopping. No rows are held out when 0.
+
+    seed : int
+        Seed of the held-out genes.
+
+    border_count : int
+        Number of borders of every numerical feature.
+
+    thread_count : int
+        Number of threads used to build the pools, all cores when -1.
+
+    pool_dir : str
+        Optional directory in which the pools are saved, as `train.qpool`,
+        `eval.qpool` and `borders.tsv`.
+
+    Returns
+    -------
+    train_pool : catboost.Pool
+        The quantized training rows.
+
+    eval_pool : catboost.Pool
+        The quantized held-out rows, or None when no rows are held out.
+    """
+    from catboost import Pool
+    from scripts.catboost_predictions import KMER_COLUMNS
 
     train = pd.read_parquet(training_path)
+    if validation_fraction > 0 and "gene_id" not in train.columns:
+        raise ValueError(f"'{training_path}' has no gene_id column to hold out genes by.")
+    held_out = (
+        split_by_gene(train["gene_id"].to_numpy(), validation_fraction, seed)
+        if validation_fraction > 0
+        else np.zeros(len(train), dtype=bool)
+    )
+    x, y = training_frame(train)
+    del train
+
+    train_pool = Pool(x[~held_out], y[~held_out], cat_features=KMER_COLUMNS, thread_count=thread_count)
+    train_pool.quantize(border_count=border_count, random_seed=seed)
+    eval_pool = None
+    if held_out.any():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            borders_path = os.path.join(pool_dir or tmp_dir, "borders.tsv")
+            train_pool.save_quantization_borders(borders_path)
+            eval_pool = Pool(x[held_out], y[held_out], cat_features=KMER_COLUMNS, thread_count=thread_count)
+            eval_pool.quantize(input_borders=borders_path)
+    print(f"{(~held_out).sum()} training rows and {held_out.sum()} held-out rows quantized")
+
+    if pool_dir is not None:
+        train_pool.save(os.path.join(pool_dir, "train.qpool"))
+        if eval_pool is not None:
+            eval_pool.save(os.path.join(pool_dir, "eval.qpool"))
+    return train_pool, eval_pool
 
-    train["seq_1"] = train["seq"].apply(lambda x: x[0:5])
-    train["seq_2"] = train["seq"].apply(lambda x: x[1:6])
-    train["seq_3"] = train["seq"].apply(lambda x: x[2:7])
 
-    x_train = train.drop(
-        columns=["transcript_id", "transcript_position", "seq", "gene_id", "label"]
+def load_pools(
+    training_path: str,
+    cache_dir: str,
+    validation_fraction: float = 0.0,
+    seed: int = 0,
+    border_count: int = 254,
+    thread_count: int = -1,
+) -> tuple:
+    """
+    Returns the quantized pools of `build_pools`, loading them from `cache_dir` when
+    they were already built for the same training data and settings. Pools are keyed
+    by a hash of the content of the training data, the split and quantization
+    settings and `POOL_VERSION`, so retraining, e.g. with other iterations, skips
+    reading and quantizing the data.
+    """
+    from catboost import Pool
+
+    settings = json.dumps(
+        {
+            "version": POOL_VERSION,
+            "validation_fraction": validation_fraction,
+            "seed": seed,
+            "border_count": border_count,
+        },
+        sort_keys=True,
     )
-    y_train = train[["label"]]
+    key = hashlib.sha256(f"{settings}\n{_dataset_digest(training_path)}".encode("utf-8")).hexdigest()
+    pool_dir = os.path.join(cache_dir, key)
+    if not os.path.isdir(pool_dir):
+        # Pools are built in a temporary directory that is renamed once complete, so an
+        # interrupted run never leaves a partial entry behind
+        tmp_dir = f"{pool_dir}.tmp-{os.getpid()}"
+        os.makedirs(tmp_dir)
+        try:
+            build_pools(training_path, validation_fraction, seed, border_count, thread_count, tmp_dir)
+            os.replace(tmp_dir, pool_dir)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        print(f"Quantized pools cached in {pool_dir}")
+
+    # Loaded even right after building, as CatBoost can draw different bootstrap samples
+    # from a pool in memory and the same pool loaded from disk
+    print(f"Loading quantized pools from {pool_dir}")
+    train_pool = Pool(f"quantized://{os.path.join(pool_dir, 'train.qpool')}")
+    eval_path = os.path.join(pool_dir, "eval.qpool")
+    eval_pool = Pool(f"quantized://{eval_path}") if os.path.exists(eval_path) else None
+    return train_pool, eval_pool
+
+
+def generate_predictions(
+    training_path,
+    iterations=1000,
+    thread_count=-1,
+    validation_fraction=0.0,
+    early_stopping_rounds=50,
+    seed=0,
+    border_count=254,
+    cache_dir=None,
+):
+    """
+    Trains a CatBoost model on a parsed, labelled training set.
+
+    With a `validation_fraction`, whole genes are held out and training stops once
+    the held-out loss has not improved for `early_stopping_rounds` iterations,
+    keeping the best iteration, and the ROC AUC and PR AUC are those CatBoost computes
+    on the held-out rows while training. Without held-out rows they are computed on
+    the training rows from the predicted probabilities, as scikit-learn's
+    `roc_auc_score` and the `auc` of the `precision_recall_curve`.
+
+    Parameters
+    ----------
+    training_path : str
+        Path of the parsed, labelled training Parquet file or dataset directory.
+
+    iterations : int
+        Maximum number of trees.
+
+    thread_count : int
+        Number of threads used to build the pools and train, all cores when -1.
+
+    validation_fraction : float
+        Fraction of rows held out by gene for early stopping, see `split_by_gene`.
+
+    early_stopping_rounds : int
+        Number of iterations without improvement of the held-out loss after which
+        training stops.
+
+    seed : int
+        Seed of the held-out genes and of training.
+
+    border_count : int
+        Number of borders of every numerical feature.
+
+    cache_dir : str
+        Optional directory of quantized pools reused across runs, see `load_pools`.
+
+    Returns
+    -------
+    cb : CatBoostClassifier
+        The trained model.
+    """
+    # Imported here so that the command line starts without loading them
+    from catboost import CatBoostClassifier
+
+    if cache_dir is not None:
+        train_pool, eval_pool = load_pools(
+            training_path, cache_dir, validation_fraction, seed, border_count, thread_count
+        )
+    else:
+        train_pool, eval_pool = build_pools(
+            training_path, validation_fraction, seed, border_count, thread_count
+        )
 
     # Fitting Catboost
     print("Train Dataset Loaded, Begin Model Training...")
-    categorical_features = [135, 136, 137]
-    cb = CatBoostClassifier()
-    cb.fit(x_train, y_train, cat_features=categorical_features)
-    print("Model Trained")
+    if eval_pool is None:
+        from sklearn.metrics import auc, precision_recall_curve, roc_auc_score
 
-    print(
-        f"train roc auc: {round(roc_auc_score(y_train, cb.predict_proba(x_train)[:,1]),4)}"
-    )
-    precision, recall, thresholds = precision_recall_curve(
-        y_train, cb.predict_proba(x_train)[:, 1]
-    )
-    print(f"train pr auc: {round(auc(recall, precision),4)}")
+        cb = CatBoostClassifier(iterations=iterations, thread_count=thread_count, random_seed=seed)
+        cb.fit(train_pool)
+        print("Model Trained")
+
+        y_train = np.asarray(train_pool.get_label(), dtype=np.float64)
+        scores = cb.predict_proba(train_pool)[:, 1]
+        print(f"train roc auc: {round(roc_auc_score(y_train, scores),4)}")
+        precision, recall, thresholds = precision_recall_curve(y_train, scores)
+        print(f"train pr auc: {round(auc(recall, precision),4)}")
+    else:
+        cb = CatBoostClassifier(
+            iterations=iterations,
+            thread_count=thread_count,
+            random_seed=seed,
+            custom_metric=["AUC", "PRAUC"],
+            early_stopping_rounds=early_stopping_rounds,
+            use_best_model=True,
+        )
+        cb.fit(train_pool, eval_set=eval_pool)
+        print(f"Best iteration {cb.best_iteration_ + 1} of at most {iterations}")
+        print("Model Trained")
+
+        results = cb.evals_result_["validation"]
+        print(f"held-out roc auc: {round(results['AUC'][cb.best_iteration_],4)}")
+        print(f"held-out pr auc: {round(results['PRAUC'][cb.best_iteration_],4)}")
 
     return cb
 
@@ -47,6 +306,30 @@ def main():
 
     parser.add_argument("training_path", type=str, help="Path to the training file")
     parser.add_argument("output_name", type=str, help="Name of the output file")
+    parser.add_argument("--iterations", type=int, default=1000, help="Maximum number of trees")
+    parser.add_argument(
+        "--thread-count", type=int, default=-1, help="Number of training threads, all cores by default"
+    )
+    parser.add_argument(
+        "--validation-fraction",
+        type=float,
+        default=0.0,
+        help="Fraction of rows held out by gene for early stopping, e.g. 0.2 (none by default)",
+    )
+    parser.add_argument(
+        "--early-stopping-rounds",
+        type=int,
+        default=50,
+        help="Iterations without improvement on the held-out genes before training stops",
+    )
+    parser.add_argument("--border-count", type=int, default=254, help="Borders per numerical feature")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the held-out genes and training")
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Directory of quantized pools reused by later runs on the same training data",
+    )
 
     args = parser.parse_args()
 
@@ -54,7 +337,16 @@ def main():
     output_name = args.output_name
 
     print("Generate Predictions")
-    cb = generate_predictions(training_path)
+    cb = generate_predictions(
+        training_path,
+        iterations=args.iterations,
+        thread_count=args.thread_count,
+        validation_fraction=args.validation_fraction,
+        early_stopping_rounds=args.early_stopping_rounds,
+        seed=args.seed,
+        border_count=args.border_count,
+        cache_dir=args.cache_dir,
+    )
 
     os.makedirs("models", exist_ok=True)
     output_path = f"models/{output_name}.cbm"
@@ -0,0 +1,239 @@
+import json
+import os
+from collections import deque
+import pandas as pd
+
+from scripts.decode import ReadCap
+from scripts.engine import blocks_to_frame, featurize_chunks, frame_to_block
+from scripts.feature_cache import FEATURIZER_VERSION
+from scripts.streaming import iter_line_chunks, write_parquet
+
+
+MANIFEST_NAME = "manifest.json"
+
+
+class Checkpoint:
+    """
+    Work directory of a resumable parsing run. Every finished chunk is saved as its
+    own Parquet file, and a JSON manifest records the chunk files in input order with
+    the byte range and the number of lines and sites of the input each one covers. Chunks are committed in order, so the
+    end offset of the last chunk is where a resumed run starts reading.
+
+    Chunk files and the manifest are written to a temporary file and renamed, so a
+    crash at any point leaves the work directory consistent.
+
+    Parameters
+    ----------
+    work_dir : str
+        Directory holding the chunk files and the manifest.
+
+    manifest : dict
+        The manifest, as created by `Checkpoint.open`.
+    """
+
+    def __init__(self, work_dir: str, manifest: dict):
+        self.work_dir = work_dir
+        self.manifest = manifest
+
+    @classmethod
+    def open(
+        cls,
+        work_dir: str,
+        json_path: str,
+        resume: bool = False,
+        featurizer: str = "site",
+        features: list = None,
+        read_cap: ReadCap = None,
+    ):
+        """
+        Opens the work directory of a parsing run on `json_path`.
+
+        With `resume`, the chunks recorded by an earlier run on the same input, with
+        the same `featurizer`, `FEATURIZER_VERSION`, selection of `features` and
+        `read_cap`, are kept. Otherwise any earlier progress is discarded.
+        """
+        os.makedirs(work_dir, exist_ok=True)
+        source = {"path": os.path.abspath(json_path), "size": os.path.getsize(json_path)}
+        settings = {
+            "version": FEATURIZER_VERSION,
+            "featurizer": featurizer,
+            "features": features,
+            "read_cap": read_cap.settings() if read_cap is not None else None,
+        }
+        manifest_path = os.path.join(work_dir, MANIFEST_NAME)
+
+        if resume and os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            if manifest["source"] != source:
+                raise ValueError(
+                    f"The work directory '{work_dir}' belongs to a run on "
+                    f"{manifest['source']['path']}. Please use another work directory."
+                )
+            if manifest["settings"] != settings:
+                raise ValueError(
+                    f"The work directory '{work_dir}' belongs to a run with other "
+                    f"settings {manifest['settings']}. Please use another work directory."
+                )
+            return cls(work_dir, manifest)
+
+        checkpoint = cls(
+            work_dir, {"source": source, "settings": settings, "complete": False, "chunks": []}
+        )
+        checkpoint._save()
+        return checkpoint
+
+    @property
+    def offset(self) -> int:
+        """Byte offset of the input up to which all lines have been featurized."""
+        chunks = self.manifest["chunks"]
+        return chunks[-1]["end"] if chunks else 0
+
+    @property
+    def lines_done(self) -> int:
+        """Number of lines featurized so far."""
+        return sum(chunk["lines"] for chunk in self.manifest["chunks"])
+
+    @property
+    def complete(self) -> bool:
+        return self.manifest["complete"]
+
+    def commit(self, block: dict, start: int, end: int, lines: int):
+        """
+        Saves the feature block of the chunk covering bytes `start` to `end`, `lines`
+        lines, of the input and records it in the manifest.
+        """
+        if start != self.offset:
+            raise ValueError(f"Chunk starting at byte {start} does not follow byte {self.offset}.")
+        name = f"chunk-{len(self.manifest['chunks']):06d}.parquet"
+        path = os.path.join(self.work_dir, name)
+        write_parquet(blocks_to_frame([block]), f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+
+        self.manifest["chunks"].append(
+            {
+                "file": name,
+                "start": start,
+                "end": end,
+                "lines": lines,
+                "sites": len(block["transcript_id"]),
+            }
+        )
+        self._save()
+
+    def finish(self):
+        """Marks the whole input as featurized."""
+        self.manifest["complete"] = True
+        self._save()
+
+    def iter_blocks(self):
+        """
+        Yields the feature blocks of the committed chunks in input order, one chunk
+        in memory at a time.
+        """
+        for chunk in self.manifest["chunks"]:
+            yield frame_to_block(pd.read_parquet(os.path.join(self.work_dir, chunk["file"])))
+
+    def _save(self):
+        path = os.path.join(self.work_dir, MANIFEST_NAME)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(f"{path}.tmp", path)
+
+
+def featurize_checkpointed(
+    json_path: str,
+    work_dir: str,
+    row_parser,
+    resume: bool = False,
+    backend: str = "thread",
+    workers: int = None,
+    chunk_size: int = 1000,
+    max_pending: int = None,
+    featurizer: str = "site",
+    features: list = None,
+    read_cap: ReadCap = None,
+    cache_dir: str = None,
+) -> Checkpoint:
+    """
+    Featurizes a JSON or gzipped JSON (.json.gz) file in chunks, committing every
+    finished chunk to `work_dir`, so that an interrupted run can be resumed without
+    featurizing the committed chunks again.
+
+    Parameters
+    ----------
+    json_path : str
+        Path to the JSON or gzipped JSON (.json.gz) file that contains the input data.
+
+    work_dir : str
+        Directory in which the chunks and the manifest are saved.
+
+    row_parser : callable
+        Function turning a decoded JSON row into a list of keys and features.
+
+    resume : bool
+        Whether to continue from the chunks committed by an earlier run on the same
+        input. Otherwise the run starts from the beginning.
+
+    backend : str
+        Execution backend, "thread" or "process".
+
+    workers : int
+        Number of workers, see `engine.create_executor`.
+
+    chunk_size : int
+        Number of lines per chunk. A resumed run may use a different chunk size.
+
+    max_pending : int
+        Maximum number of chunks in flight. Defaults to twice the number of workers.
+
+    featurizer : str
+        "site" or "ragged", see `engine.featurize_chunks`.
+
+    features : list
+        Optional selection of generated features, see `site_features.feature_mask`.
+
+    read_cap : decode.ReadCap
+        Optional cap on the number of reads featurized per site, see `decode.ReadCap`.
+
+    cache_dir : str
+        Optional directory of a `feature_cache.FeatureCache`.
+
+    Returns
+    -------
+    checkpoint : Checkpoint
+        The completed work directory, whose blocks can be read with `iter_blocks`.
+    """
+    checkpoint = Checkpoint.open(
+        work_dir, json_path, resume=resume, featurizer=featurizer, features=features, read_cap=read_cap
+    )
+    if checkpoint.complete:
+        print(f"All {checkpoint.lines_done} lines were already featurized")
+        return checkpoint
+    if checkpoint.offset > 0:
+        print(f"Resuming after {checkpoint.lines_done} lines (byte {checkpoint.offset})")
+
+    # Results come back in input order, so the byte ranges are matched first in, first out
+    spans = deque()
+
+    def chunks():
+        for start, end, lines in iter_line_chunks(json_path, chunk_size, checkpoint.offset):
+            spans.append((start, end, len(lines)))
+            yield lines
+
+    blocks = featurize_chunks(
+        chunks(),
+        row_parser,
+        backend=backend,
+        workers=workers,
+        max_pending=max_pending,
+        featurizer=featurizer,
+        features=features,
+        read_cap=read_cap,
+        cache_dir=cache_dir,
+    )
+    for block in blocks:
+        checkpoint.commit(block, *spans.popleft())
+
+    checkpoint.finish()
+    return checkpoint
@@ -0,0 +1,125 @@
+import os
+import sys
+import argparse
+import importlib
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# Only the module of the chosen command is imported, so that e.g. parsing never loads
+# CatBoost or scikit-learn and `m6atect --help` loads nothing heavy at all
+COMMANDS = {
+    "parse": "Featurize a dataset of reads: a test set, or a training set with --labels",
+    "train": "Train a CatBoost model, or a LightGBM artifact with --lgbm",
+    "predict": "Score a dataset with a saved model, parsing it first if it is JSON or a read store",
+    "evaluate": "Print the ROC AUC and PR AUC of predictions against labels",
+    "search": "Compare models, parameters and feature lists with gene-grouped cross-validation",
+}
+
+JSON_SUFFIXES = (".json", ".json.gz")
+
+
+def _positionals(args: list) -> list:
+    # Arguments before the first option, the usual place of the positional arguments
+    positionals = []
+    for arg in args:
+        if arg.startswith("-"):
+            break
+        positionals.append(arg)
+    return positionals
+
+
+def _is_raw_dataset(path: str) -> bool:
+    # A JSON dataset or a read store, see `read_store.is_read_store`
+    return path.endswith(JSON_SUFFIXES) or os.path.isfile(os.path.join(path, "manifest.json"))
+
+
+def resolve_command(command: str, args: list) -> tuple:
+    """
+    Picks the script module running a command and the arguments to pass to it.
+
+    Parameters
+    ----------
+    command : str
+        One of `COMMANDS`.
+
+    args : list
+        Arguments given after the command.
+
+    Returns
+    -------
+    module : str
+        Name of the module whose `main` runs the command.
+
+    args : list
+        Arguments for the module's `main`.
+    """
+    if command == "parse":
+        parser = argparse.ArgumentParser(add_help=False)
+        parser.add_argument("--labels", type=str, default=None)
+        known, rest = parser.parse_known_args(args)
+        if known.labels is None:
+            return "scripts.parse_testset", rest
+        # parse_json takes the labels as its second positional argument
+        n_before = min(len(_positionals(rest)), 1)
+        return "scripts.parse_json", rest[:n_before] + [known.labels] + rest[n_before:]
+
+    if command == "train":
+        parser = argparse.ArgumentParser(add_help=False)
+        parser.add_argument("--lgbm", action="store_true")
+        known, rest = parser.parse_known_args(args)
+        if known.lgbm:
+            return "scripts.lgbm_predictions", ["train"] + rest
+        return "scripts.catboost_training", rest
+
+    if command == "predict":
+        positionals = _positionals(args)
+        if positionals and _is_raw_dataset(positionals[0]):
+            return "scripts.pipeline", args
+        if len(positionals) > 1 and positionals[1].endswith(".joblib"):
+            return "scripts.lgbm_predictions", ["predict"] + args
+        return "scripts.catboost_predictions", args
+
+    if command == "evaluate":
+        return "scripts.compare_training_results", args
+
+    if command == "search":
+        return "scripts.grid_search", args
+
+    raise ValueError(f"Unknown command '{command}'. Please use one of {list(COMMANDS)}.")
+
+
+def main(argv: list = None):
+    argv = sys.argv[1:] if argv is None else argv
+    parser = argparse.ArgumentParser(
+        prog="m6atect",
+        usage="m6atect <command> [<args>]",
+        description="Detect m6A modifications from nanopore direct RNA-seq reads.",
+        epilog="Run 'm6atect <command> --help' for the arguments of a command. "
+        "'parse --labels <labels>' and 'train --lgbm' select the training variants; "
+        "'predict' parses and scores JSON input in one pass and scores parsed Parquet "
+        "datasets with a CatBoost model (.cbm) or a LightGBM artifact (.joblib).",
+    )
+    commands = parser.add_argument_group("commands")
+    for command, help_text in COMMANDS.items():
+        commands.add_argument(command, nargs="?", help=help_text)
+
+    if not argv or argv[0] in ("-h", "--help"):
+        parser.print_help()
+        return
+    command, args = argv[0], argv[1:]
+    if command not in COMMANDS:
+        parser.error(f"unknown command '{command}', please use one of {', '.join(COMMANDS)}")
+
+    module_name, module_args = resolve_command(command, args)
+    module = importlib.import_module(module_name)
+    # The command's own parser reads sys.argv and shows "m6atect <command>" in its usage,
+    # or adds the command itself when the script has subcommands of the same name
+    prog = "m6atect" if module_args[:1] == [command] else f"m6atect {command}"
+    sys.argv = [prog] + module_args
+    module.main()
+
+
+if __name__ == "__main__":
+    main()
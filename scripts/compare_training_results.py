@@ -1,17 +1,12 @@
 import pandas as pd
 import argparse
-from sklearn.metrics import (
-    roc_auc_score,
-    auc,
-    precision_recall_curve,
-    confusion_matrix,
-    accuracy_score,
-)
 
 
 def score_predictions(training_path, results_path):
+    # Imported here so that the command line starts without loading scikit-learn
+    from sklearn.metrics import auc, precision_recall_curve, roc_auc_score
 
-    train = pd.read_parquet(training_path)
+    train = pd.read_parquet(training_path, columns=["label"])
     results = pd.read_csv(results_path)
 
     y_train = train[["label"]]
@@ -0,0 +1,307 @@
+import json
+import re
+import zlib
+from itertools import chain
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+DECODERS = ["auto", "scan", "orjson", "json"]
+SAMPLINGS = ["uniform", "stratified"]
+
+# One site per line: {"transcript": {"position": {"kmer": [[...], ...]}}}
+SITE_LINE = re.compile(
+    r'\s*\{\s*"([^"\\]*)"\s*:\s*\{\s*"([^"\\]*)"\s*:\s*\{\s*"([^"\\]*)"\s*:\s*(\[.*\])\s*\}\s*\}\s*\}\s*',
+    re.DOTALL,
+)
+READ_SEPARATOR = re.compile(r"\]\s*,\s*\[")
+READ = re.compile(r"\[([^\[\]]*)\]")
+
+
+class ReadCap:
+    """
+    Caps the number of reads kept per site. Sites with more than `max_reads` reads are
+    subsampled while they are decoded, so that their full read arrays are never built.
+
+    The sample of a site only depends on `seed`, its transcript id and its position,
+    so it is the same whatever the chunking, backend or input order. Featurizers given
+    a cap add the original read count of every site as an `n_reads` column, which is
+    never a model input.
+
+    Parameters
+    ----------
+    max_reads : int
+        Maximum number of reads kept per site.
+
+    sampling : str
+        "uniform" to keep a uniform random sample of the reads, or "stratified" to
+        split the reads, in input order, into `max_reads` equal strata and keep one
+        random read of each.
+
+    seed : int
+        Random seed.
+    """
+
+    def __init__(self, max_reads: int, sampling: str = "uniform", seed: int = 0):
+        if max_reads < 1:
+            raise ValueError("max_reads must be a positive integer.")
+        if sampling not in SAMPLINGS:
+            raise ValueError(f"Unknown sampling '{sampling}'. Please use one of {SAMPLINGS}.")
+        self.max_reads = max_reads
+        self.sampling = sampling
+        self.seed = seed
+
+    def settings(self) -> dict:
+        return {"max_reads": self.max_reads, "sampling": self.sampling, "seed": self.seed}
+
+    def select(self, n_reads: int, transcript: str, position: str) -> np.ndarray:
+        """
+        Picks the reads to keep from a site with `n_reads` reads.
+
+        Returns
+        -------
+        indices : np.ndarray
+            Sorted indices of the kept reads, or None to keep all of them.
+        """
+        if n_reads <= self.max_reads:
+            return None
+        site = zlib.crc32(f"{transcript}:{position}".encode("utf-8"))
+        rng = np.random.default_rng([self.seed, site])
+        if self.sampling == "uniform":
+            return np.sort(rng.choice(n_reads, self.max_reads, replace=False))
+        edges = np.arange(self.max_reads + 1) * n_reads // self.max_reads
+        return edges[:-1] + (rng.random(self.max_reads) * np.diff(edges)).astype(np.int64)
+
+
+def loads(line: str, decoder: str = "auto"):
+    """
+    Decodes a JSON string with orjson when it is installed, falling back to the
+    standard library.
+
+    Parameters
+    ----------
+    line : str
+        A string containing a single line of JSON data.
+
+    decoder : str
+        "orjson" to require orjson, "json" to use the standard library, or any other
+        value to use orjson if available.
+
+    Returns
+    -------
+    row : object
+        The decoded JSON value.
+    """
+    if decoder == "json" or (decoder != "orjson" and orjson is None):
+        return json.loads(line)
+    if orjson is None:
+        raise ImportError("orjson is not installed. Please install it or use another decoder.")
+    return orjson.loads(line)
+
+
+def parse_reads(text: str, indices: np.ndarray = None) -> np.ndarray:
+    """
+    Converts the text of a list of reads, e.g. "[[1.0, 2.0], [3.0, 4.0]]", straight into
+    a 2D float32 array without creating intermediate Python floats.
+
+    Parameters
+    ----------
+    text : str
+        The JSON text of a list of equally long lists of numbers.
+
+    indices : np.ndarray
+        Optional indices of the reads to keep. Only their text is converted.
+
+    Returns
+    -------
+    reads : np.ndarray
+        A 2D float32 array with one row per read, or None if the text is not a
+        well-formed list of reads.
+    """
+    if '"' in text or "{" in text:
+        return None
+    n_reads = text.count("[") - 1
+    if n_reads == 0:
+        return np.empty((0, 0), dtype=np.float32)
+
+    if indices is not None:
+        reads = READ_SEPARATOR.split(text.strip()[1:-1].strip()[1:-1])
+        if len(reads) != n_reads:
+            return None
+        text = "[[" + "],[".join(reads[i] for i in indices) + "]]"
+        n_reads = len(indices)
+
+    n_values = text[: text.index("]")].count(",") + 1
+    flat = text.replace("[", " ").replace("]", " ")
+    try:
+        values = np.fromstring(flat, dtype=np.float32, sep=",")
+    except ValueError:
+        return None
+    if values.size != n_reads * n_values:
+        return None
+    return values.reshape(n_reads, n_values)
+
+
+def reads_to_array(reads: list) -> np.ndarray:
+    """
+    Converts decoded reads (a list of equally long lists of numbers) into a 2D float32
+    array, filling the buffer directly from a flat iterator.
+    """
+    if len(reads) == 0:
+        return np.empty((0, 0), dtype=np.float32)
+    n_values = len(reads[0])
+    try:
+        values = np.fromiter(
+            chain.from_iterable(reads), dtype=np.float32, count=len(reads) * n_values
+        )
+    except ValueError:
+        return np.asarray(reads, dtype=np.float32)
+    return values.reshape(len(reads), n_values)
+
+
+def decode_row(
+    line: str, decoder: str = "auto", read_cap: ReadCap = None, read_counts: list = None
+) -> dict:
+    """
+    Decodes a line of the nested transcript/position/kmer reads format into a row
+    whose reads are 2D float32 arrays.
+
+    The "scan" decoder matches single-site lines with a specialized scanner and converts
+    the reads text into a float32 buffer with NumPy, without creating Python floats.
+    The "orjson" and "json" decoders parse the line with that JSON backend and fill a
+    float32 buffer from the decoded lists. "auto" uses orjson when it is installed, as it
+    is the fastest backend, and the scanner otherwise. Lines the scanner does not handle
+    fall back to the available JSON backend.
+
+    Parameters
+    ----------
+    line : str
+        A string containing a single line of JSON data.
+
+    decoder : str
+        One of "auto", "scan", "orjson" or "json".
+
+    read_cap : ReadCap
+        Optional cap on the number of reads kept per site.
+
+    read_counts : list
+        Optional list to which the original number of reads of every site of the row
+        is appended, before any cap.
+
+    Returns
+    -------
+    row : dict
+        {transcript: {position: {kmer: reads}}} where reads is a 2D float32 array.
+    """
+    if decoder not in DECODERS:
+        raise ValueError(f"Unknown decoder '{decoder}'. Please use one of {DECODERS}.")
+
+    if decoder == "scan" or (decoder == "auto" and orjson is None):
+        match = SITE_LINE.fullmatch(line)
+        if match is not None:
+            transcript, position, kmer, text = match.groups()
+            indices = None
+            if read_cap is not None:
+                n_reads = text.count("[") - 1
+                indices = read_cap.select(n_reads, transcript, position)
+            reads = parse_reads(text, indices)
+            if reads is not None:
+                if read_counts is not None:
+                    read_counts.append(n_reads if indices is not None else len(reads))
+                return {transcript: {position: {kmer: reads}}}
+
+    row = loads(line, decoder)
+    for key, value in row.items():
+        for key1, value1 in value.items():
+            for key2, value2 in value1.items():
+                if read_counts is not None:
+                    read_counts.append(len(value2))
+                if read_cap is not None:
+                    indices = read_cap.select(len(value2), key, key1)
+                    if indices is not None:
+                        value2 = [value2[i] for i in indices]
+                value1[key2] = reads_to_array(value2)
+    return row
+
+
+def iter_read_blocks(text: str, block_size: int):
+    """
+    Lazily converts the text of a list of reads into 2D float32 arrays of at most
+    `block_size` reads, so that only one block of a site is held as floats at a time.
+
+    Parameters
+    ----------
+    text : str
+        The JSON text of a list of equally long lists of numbers, see `parse_reads`.
+
+    block_size : int
+        Maximum number of reads per block.
+
+    Yields
+    ------
+    reads : np.ndarray
+        The next block of reads.
+    """
+    reads = []
+    for match in READ.finditer(text, text.index("[") + 1):
+        reads.append(match.group(1))
+        if len(reads) == block_size:
+            yield _parse_block(reads)
+            reads = []
+    if reads:
+        yield _parse_block(reads)
+
+
+def _parse_block(reads: list) -> np.ndarray:
+    block = parse_reads("[[" + "],[".join(reads) + "]]")
+    if block is None:
+        raise ValueError("Reads are not a well-formed list of equally long lists of numbers.")
+    return block
+
+
+def decode_site_blocks(line: str, block_size: int, decoder: str = "auto") -> list:
+    """
+    Decodes a line of the nested transcript/position/kmer reads format into its sites,
+    giving the reads of every site as a lazy sequence of blocks instead of one array.
+
+    Single-site lines handled by the scanner are converted one block at a time with
+    `iter_read_blocks`. Other lines are decoded with `decode_row` and their arrays are
+    split into blocks.
+
+    Parameters
+    ----------
+    line : str
+        A string containing a single line of JSON data.
+
+    block_size : int
+        Maximum number of reads per block.
+
+    decoder : str
+        One of `DECODERS`, see `decode_row`.
+
+    Returns
+    -------
+    sites : list
+        (transcript, position, kmer, blocks) of every site of the line, where blocks
+        is an iterator over 2D float32 arrays of at most `block_size` reads.
+    """
+    if decoder not in DECODERS:
+        raise ValueError(f"Unknown decoder '{decoder}'. Please use one of {DECODERS}.")
+
+    match = SITE_LINE.fullmatch(line)
+    if match is not None:
+        transcript, position, kmer, text = match.groups()
+        if '"' not in text and "{" not in text:
+            return [(transcript, position, kmer, iter_read_blocks(text, block_size))]
+
+    sites = []
+    for key, value in decode_row(line, decoder).items():
+        for key1, value1 in value.items():
+            for key2, reads in value1.items():
+                blocks = iter(np.array_split(reads, range(block_size, len(reads), block_size)))
+                sites.append((key, key1, key2, blocks))
+    return sites
@@ -0,0 +1,846 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from threadpoolctl import threadpool_limits
+
+from scripts.decode import SAMPLINGS, ReadCap, decode_row
+from scripts.feature_cache import CachedTask, FeatureCache
+from scripts.metrics import Metrics, active_metrics, count, stage
+from scripts.online_features import featurize_chunk_online
+from scripts.ragged_features import featurize_chunk_ragged
+from scripts.read_store import ReadStore, StoreTask, is_read_store
+from scripts.site_features import feature_mask
+from scripts.streaming import (
+    COMPRESSION_CODECS,
+    KEY_COLUMNS,
+    READ_COUNT_COLUMN,
+    ParquetStreamWriter,
+    bounded_map,
+    feature_columns,
+    iter_batches,
+    iter_json_lines,
+    merge_sorted_runs,
+    parquet_to_csv,
+    read_feature_list,
+    to_compact_frame,
+    write_parquet,
+)
+
+
+BACKENDS = ["thread", "process"]
+FEATURIZERS = ["site", "ragged", "online"]
+N_FEATURES = len(feature_columns()) - len(KEY_COLUMNS)
+
+
+def featurize_chunk(lines: list, row_parser, read_cap: ReadCap = None) -> dict:
+    """
+    Decodes a chunk of JSON lines with `decode_row` and packs the results into compact
+    NumPy blocks, which are much cheaper to send back from a worker process than lists
+    of Python objects.
+
+    Parameters
+    ----------
+    lines : list
+        Strings each containing a single line of JSON data.
+
+    row_parser : callable
+        Function turning a decoded JSON row into its keys and a 1D feature array
+        (or None for an invalid row), such as `parse_row_features`.
+
+    read_cap : decode.ReadCap
+        Optional cap on the number of reads featurized per site.
+
+    Returns
+    -------
+    block : dict
+        `transcript_id`, `transcript_position` and `seq` arrays and a 2D float32
+        `features` array, with one entry per line in input order. Invalid rows
+        have NaN features. With `read_cap`, the original read counts are added as
+        `n_reads`.
+    """
+    keys = []
+    features = None
+    read_counts = []
+    for i, line in enumerate(lines):
+        line_counts = [] if read_cap is not None else None
+        with stage("decode"):
+            row = decode_row(line, read_cap=read_cap, read_counts=line_counts)
+        row_keys, row_features = row_parser(row)
+        keys.append(row_keys)
+        if read_cap is not None:
+            read_counts.append(line_counts[-1] if line_counts else 0)
+        if row_features is None:
+            continue
+        if features is None:
+            features = np.full((len(lines), len(row_features)), np.nan, dtype=np.float32)
+        features[i] = row_features
+
+    if features is None:
+        features = np.full((len(lines), N_FEATURES), np.nan, dtype=np.float32)
+    count(lines=len(lines), sites=len(lines))
+
+    block = {
+        "transcript_id": np.array([row_keys[0] for row_keys in keys], dtype=str),
+        "transcript_position": np.array([row_keys[1] for row_keys in keys], dtype=np.int64),
+        "seq": np.array([row_keys[2] for row_keys in keys], dtype=str),
+        "features": features,
+    }
+    if read_cap is not None:
+        block[READ_COUNT_COLUMN] = np.array(read_counts, dtype=np.int64)
+    return block
+
+
+def keys_sorted(block: dict) -> bool:
+    """
+    Checks whether the rows of a block are ordered by transcript id and position.
+    """
+    transcript_ids = block["transcript_id"]
+    positions = block["transcript_position"]
+    if len(transcript_ids) < 2:
+        return True
+    before, after = transcript_ids[:-1], transcript_ids[1:]
+    return bool(
+        np.all((before < after) | ((before == after) & (positions[:-1] <= positions[1:])))
+    )
+
+
+def sort_block(block: dict) -> dict:
+    """
+    Orders the rows of a block by transcript id and position. Only the key arrays are
+    sorted, and the features are reordered with a single take. Blocks that are already
+    in order are returned unchanged.
+
+    Parameters
+    ----------
+    block : dict
+        Block returned by `featurize_chunk` or `concat_blocks`.
+
+    Returns
+    -------
+    block : dict
+        The block with its rows in sorted order.
+    """
+    with stage("sort"):
+        if keys_sorted(block):
+            return block
+        order = np.lexsort((block["transcript_position"], block["transcript_id"]))
+        return {key: values[order] for key, values in block.items()}
+
+
+def concat_blocks(blocks: list) -> dict:
+    """
+    Concatenates feature blocks into a single block.
+    """
+    return {key: np.concatenate([block[key] for block in blocks]) for key in blocks[0]}
+
+
+def blocks_to_frame(blocks: list) -> pd.DataFrame:
+    """
+    Concatenates feature blocks into a DataFrame with the parsed dataset layout.
+
+    Parameters
+    ----------
+    blocks : list
+        Blocks returned by `featurize_chunk`.
+
+    Returns
+    -------
+    df : pd.DataFrame
+        Key columns followed by the generated features, and the read counts of
+        blocks that have them.
+    """
+    columns = feature_columns()
+    if not blocks:
+        return pd.DataFrame(columns=columns)
+
+    with stage("frame"):
+        block = concat_blocks(blocks) if len(blocks) > 1 else blocks[0]
+        keys = pd.DataFrame({key: block[key] for key in KEY_COLUMNS})
+        features = pd.DataFrame(block["features"], columns=columns[len(KEY_COLUMNS):])
+        frames = [keys, features]
+        if READ_COUNT_COLUMN in block:
+            frames.append(pd.DataFrame({READ_COUNT_COLUMN: block[READ_COUNT_COLUMN]}))
+        return pd.concat(frames, axis=1)
+
+
+def frame_to_block(df: pd.DataFrame) -> dict:
+    """
+    Converts a parsed dataset frame, e.g. one read back from Parquet, into a feature
+    block. This is the inverse of `blocks_to_frame`.
+    """
+    block = {
+        "transcript_id": df["transcript_id"].to_numpy(dtype=str),
+        "transcript_position": df["transcript_position"].to_numpy(dtype=np.int64),
+        "seq": df["seq"].to_numpy(dtype=str),
+        "features": df[feature_columns()[len(KEY_COLUMNS):]].to_numpy(dtype=np.float32),
+    }
+    if READ_COUNT_COLUMN in df.columns:
+        block[READ_COUNT_COLUMN] = df[READ_COUNT_COLUMN].to_numpy(dtype=np.int64)
+    return block
+
+
+def write_blocks_parquet(
+    blocks,
+    output_path: str,
+    sort: bool = True,
+    transform=None,
+    compression: str = "snappy",
+    row_group_size: int = None,
+) -> int:
+    """
+    Writes feature blocks to a Parquet file, one row group per block, as they arrive.
+
+    With `sort`, every block is ordered by transcript id and position before it is
+    written. When the blocks also follow each other in order (the usual case for
+    m6Anet data, which is grouped by transcript), the file is sorted as written and
+    no further work is needed. Otherwise the sorted row groups are combined with a
+    streaming k-way merge, so the whole dataset is never sorted in memory.
+
+    Parameters
+    ----------
+    blocks : iterable
+        Blocks returned by `iter_feature_blocks`.
+
+    output_path : str
+        Path of the Parquet file to write.
+
+    sort : bool
+        Whether the output should be ordered by transcript id and position.
+
+    transform : callable
+        Optional function applied to each block's DataFrame before it is written,
+        e.g. to merge labels. It must keep the row order.
+
+    compression : str
+        Parquet compression codec, see `streaming.COMPRESSION_CODECS`.
+
+    row_group_size : int
+        Maximum number of rows per row group. Defaults to one row group per block.
+
+    Returns
+    -------
+    rows_written : int
+        Number of rows written to the output file.
+    """
+    in_order = True
+    last_key = None
+    with ParquetStreamWriter(
+        output_path, compression=compression, row_group_size=row_group_size
+    ) as writer:
+        for block in blocks:
+            if sort and len(block["transcript_id"]) > 0:
+                block = sort_block(block)
+                first_key = (block["transcript_id"][0], block["transcript_position"][0])
+                if last_key is not None and first_key < last_key:
+                    in_order = False
+                last_key = (block["transcript_id"][-1], block["transcript_position"][-1])
+            df = blocks_to_frame([block])
+            if transform is not None:
+                df = transform(df)
+            writer.write_frame(df)
+
+    if not in_order:
+        print("Merging sorted batches...")
+        merged_path = f"{output_path}.merge"
+        with stage("sort"):
+            merge_sorted_runs(
+                output_path,
+                merged_path,
+                compression=compression,
+                row_group_size=row_group_size,
+            )
+        os.replace(merged_path, output_path)
+
+    return writer.rows_written
+
+
+def limit_worker_threads(threads: int = 1):
+    """
+    Caps the native thread pools (BLAS, OpenMP) of a worker process, so that a pool of
+    workers does not oversubscribe the CPUs. Used as a `ProcessPoolExecutor`
+    initializer; by default each worker runs single-threaded native code and
+    parallelism comes from the pool.
+    """
+    threadpool_limits(threads)
+
+
+def create_executor(backend: str = "thread", workers: int = None):
+    """
+    Creates the executor used to run feature extraction.
+
+    Parameters
+    ----------
+    backend : str
+        "thread" for a ThreadPoolExecutor or "process" for a ProcessPoolExecutor,
+        which is not limited by the GIL.
+
+    workers : int
+        Number of workers. Defaults to the number of CPUs for processes and to the
+        ThreadPoolExecutor default for threads.
+
+    Returns
+    -------
+    executor : concurrent.futures.Executor
+        The executor, to be used as a context manager.
+
+    workers : int
+        The resolved number of workers.
+    """
+    if backend == "process":
+        workers = workers or os.cpu_count() or 1
+        return ProcessPoolExecutor(workers, initializer=limit_worker_threads), workers
+    if backend == "thread":
+        workers = workers or min(32, (os.cpu_count() or 1) + 4)
+        return ThreadPoolExecutor(workers), workers
+    raise ValueError(f"Unknown backend '{backend}'. Please use one of {BACKENDS}.")
+
+
+def chunk_task(featurizer: str, row_parser, features: list = None, read_cap: ReadCap = None):
+    """
+    Returns the function featurizing one chunk of lines: `featurize_chunk` with
+    `row_parser` for the "site" featurizer, `featurize_chunk_ragged` for "ragged" or
+    `featurize_chunk_online` for "online", computing only `features` when given and
+    capping reads with `read_cap`.
+    """
+    if featurizer == "ragged":
+        mask = None if features is None else feature_mask(features)
+        if mask is None and read_cap is None:
+            return featurize_chunk_ragged
+        return partial(featurize_chunk_ragged, mask=mask, read_cap=read_cap)
+    if featurizer in ("site", "online") and features is not None:
+        raise ValueError("Selecting features is only supported by the 'ragged' featurizer.")
+    if featurizer == "online":
+        if read_cap is not None:
+            raise ValueError("The 'online' featurizer keeps every read and cannot cap them.")
+        return featurize_chunk_online
+    if featurizer == "site":
+        return partial(featurize_chunk, row_parser=row_parser, read_cap=read_cap)
+    raise ValueError(f"Unknown featurizer '{featurizer}'. Please use one of {FEATURIZERS}.")
+
+
+def featurize_chunks(
+    chunks,
+    row_parser,
+    backend: str = "thread",
+    workers: int = None,
+    max_pending: int = None,
+    featurizer: str = "site",
+    features: list = None,
+    read_cap: ReadCap = None,
+    cache_dir: str = None,
+):
+    """
+    Featurizes chunks of JSON lines on an executor, one task per chunk, keeping at most
+    `max_pending` chunks in flight.
+
+    Parameters
+    ----------
+    chunks : iterable
+        Lists of strings each containing a single line of JSON data. The iterable is
+        only advanced when a slot frees up.
+
+    row_parser : callable
+        Function turning a decoded JSON row into a list of keys and features.
+        It must be defined at module level when using the process backend.
+
+    backend : str
+        Execution backend, "thread" or "process".
+
+    workers : int
+        Number of workers, see `create_executor`.
+
+    max_pending : int
+        Maximum number of chunks in flight. Defaults to twice the number of workers.
+
+    featurizer : str
+        "site" to featurize one site at a time with `row_parser`, "ragged" to
+        featurize all sites of a chunk at once with `featurize_chunk_ragged`, or
+        "online" to featurize one block of reads at a time in bounded memory with
+        `featurize_chunk_online`.
+
+    features : list
+        Optional selection of generated features, see `site_features.feature_mask`.
+
+    read_cap : decode.ReadCap
+        Optional cap on the number of reads featurized per site, see `decode.ReadCap`.
+
+    cache_dir : str
+        Optional directory of a `feature_cache.FeatureCache`.
+
+    Yields
+    ------
+    block : dict
+        Feature block of the next chunk, in input order.
+    """
+    task = chunk_task(featurizer, row_parser, features, read_cap)
+    cache = None
+    if cache_dir is not None:
+        cache = FeatureCache(cache_dir, featurizer, row_parser, features, read_cap)
+        task = CachedTask(cache, task)
+        chunks = cache.keyed(chunks)
+    yield from _run_tasks(task, chunks, backend, workers, max_pending)
+
+    if cache is not None:
+        print(f"Reused {cache.hits} of {cache.hits + cache.misses} chunks from {cache_dir}")
+
+
+def _run_tasks(task, chunks, backend: str, workers: int, max_pending: int):
+    # Stage timings and counts come back with every block and are merged into the
+    # metrics of the run, which also report progress
+    metrics = active_metrics() or Metrics()
+    task = metrics.instrument(task)
+    executor, workers = create_executor(backend, workers)
+    if max_pending is None:
+        max_pending = 2 * workers
+
+    with executor:
+        for block, recorder in bounded_map(executor, task, enumerate(chunks), max_pending):
+            metrics.merge(recorder)
+            yield block
+    metrics.report(force=True)
+
+
+def iter_feature_blocks(
+    json_path: str,
+    row_parser,
+    backend: str = "thread",
+    workers: int = None,
+    chunk_size: int = 500,
+    max_pending: int = None,
+    featurizer: str = "site",
+    features: list = None,
+    read_cap: ReadCap = None,
+    cache_dir: str = None,
+):
+    """
+    Reads a JSON or gzipped JSON (.json.gz) file lazily and featurizes it in chunks of
+    lines with `featurize_chunks`. A read store written by `read_store.write_read_store`
+    is featurized in chunks of sites sliced from its memory-mapped reads instead,
+    without decoding JSON.
+
+    Parameters
+    ----------
+    json_path : str
+        Path to the JSON or gzipped JSON (.json.gz) file that contains the input data,
+        or to a read store directory.
+
+    row_parser : callable
+        Function turning a decoded JSON row into a list of keys and features.
+        It must be defined at module level when using the process backend.
+
+    backend : str
+        Execution backend, "thread" or "process".
+
+    workers : int
+        Number of workers, see `create_executor`.
+
+    chunk_size : int
+        Number of lines, or sites of a read store, per task.
+
+    max_pending : int
+        Maximum number of chunks in flight. Defaults to twice the number of workers.
+
+    featurizer : str
+        "site", "ragged" or "online", see `featurize_chunks`.
+
+    features : list
+        Optional selection of generated features, see `site_features.feature_mask`.
+
+    read_cap : decode.ReadCap
+        Optional cap on the number of reads featurized per site, see `decode.ReadCap`.
+
+    cache_dir : str
+        Optional directory of a `feature_cache.FeatureCache`, not used for read stores.
+
+    Yields
+    ------
+    block : dict
+        Feature block of the next chunk, in input order.
+    """
+    if is_read_store(json_path):
+        task = StoreTask(json_path, featurizer, features, read_cap)
+        chunks = ReadStore(json_path).chunk_ranges(chunk_size)
+        yield from _run_tasks(task, chunks, backend, workers, max_pending)
+        return
+
+    chunks = iter_batches(iter_json_lines(json_path), chunk_size)
+    yield from featurize_chunks(
+        chunks,
+        row_parser,
+        backend=backend,
+        workers=workers,
+        max_pending=max_pending,
+        featurizer=featurizer,
+        features=features,
+        read_cap=read_cap,
+        cache_dir=cache_dir,
+    )
+
+
+def parse_dataset(
+    json_path: str,
+    row_parser,
+    chunk_size: int = 500,
+    backend: str = "thread",
+    workers: int = None,
+    featurizer: str = "site",
+    features: list = None,
+    read_cap: ReadCap = None,
+    cache_dir: str = None,
+    sort: bool = True,
+    transform=None,
+) -> pd.DataFrame:
+    """
+    Featurizes a dataset with `iter_feature_blocks` and returns it in memory.
+
+    Parameters
+    ----------
+    json_path : str
+        Path to the JSON or gzipped JSON (.json.gz) file that contains the input data,
+        or to a read store directory.
+
+    row_parser : callable
+        Function turning a decoded JSON row into its keys and features, such as
+        `parse_testset.parse_row_features`.
+
+    chunk_size, backend, workers, featurizer, features, read_cap, cache_dir
+        See `iter_feature_blocks`.
+
+    sort : bool
+        Whether to order the rows by transcript id and position. Rows are otherwise
+        returned in input order. Only the key arrays are sorted, and already sorted
+        input is detected and left as is.
+
+    transform : callable
+        Optional function applied to the parsed DataFrame, e.g. to merge labels.
+
+    Returns
+    -------
+    df : pd.DataFrame
+        The parsed dataset, with the column types of `streaming.to_compact_frame`.
+    """
+    blocks = list(
+        iter_feature_blocks(
+            json_path,
+            row_parser,
+            backend=backend,
+            workers=workers,
+            chunk_size=chunk_size,
+            featurizer=featurizer,
+            features=features,
+            read_cap=read_cap,
+            cache_dir=cache_dir,
+        )
+    )
+    if sort and blocks:
+        blocks = [sort_block(concat_blocks(blocks))]
+    df = blocks_to_frame(blocks)
+    if transform is not None:
+        df = transform(df)
+    return to_compact_frame(df)
+
+
+def parse_dataset_streaming(
+    json_path: str,
+    output_path: str,
+    row_parser,
+    batch_size: int = 1000,
+    max_pending: int = None,
+    backend: str = "thread",
+    workers: int = None,
+    featurizer: str = "site",
+    features: list = None,
+    read_cap: ReadCap = None,
+    cache_dir: str = None,
+    sort: bool = True,
+    transform=None,
+    compression: str = "snappy",
+    row_group_size: int = None,
+    work_dir: str = None,
+    resume: bool = False,
+) -> int:
+    """
+    Featurizes a dataset in bounded batches and writes it to Parquet incrementally,
+    one row group per batch. Lines are read lazily and at most `max_pending` batches
+    are in flight at once, so peak memory does not grow with the size of the input.
+
+    Parameters
+    ----------
+    json_path, row_parser
+        See `parse_dataset`.
+
+    output_path : str
+        Path of the Parquet file to write.
+
+    batch_size : int
+        Number of lines processed per batch and written per row group.
+
+    max_pending, backend, workers, featurizer, features, read_cap, cache_dir
+        See `iter_feature_blocks`.
+
+    sort, transform, compression, row_group_size
+        See `write_blocks_parquet`.
+
+    work_dir : str
+        Optional directory in which every finished batch is committed, so that an
+        interrupted run can be resumed, see `checkpoint.featurize_checkpointed`. The
+        output file is written from the committed batches once the whole input has
+        been featurized.
+
+    resume : bool
+        Whether to skip the batches already committed to `work_dir` by an earlier,
+        interrupted run on the same input.
+
+    Returns
+    -------
+    rows_written : int
+        Number of rows written to the output file.
+    """
+    if work_dir is not None:
+        # Imported here as the checkpoints build on this module
+        from scripts.checkpoint import featurize_checkpointed
+
+        checkpoint = featurize_checkpointed(
+            json_path,
+            work_dir,
+            row_parser,
+            resume=resume,
+            backend=backend,
+            workers=workers,
+            chunk_size=batch_size,
+            max_pending=max_pending,
+            featurizer=featurizer,
+            features=features,
+            read_cap=read_cap,
+            cache_dir=cache_dir,
+        )
+        blocks = checkpoint.iter_blocks()
+    else:
+        blocks = iter_feature_blocks(
+            json_path,
+            row_parser,
+            backend=backend,
+            workers=workers,
+            chunk_size=batch_size,
+            max_pending=max_pending,
+            featurizer=featurizer,
+            features=features,
+            read_cap=read_cap,
+            cache_dir=cache_dir,
+        )
+    return write_blocks_parquet(
+        blocks,
+        output_path,
+        sort=sort,
+        transform=transform,
+        compression=compression,
+        row_group_size=row_group_size,
+    )
+
+
+def add_parse_arguments(parser: argparse.ArgumentParser):
+    """
+    Adds the options shared by the parsing scripts, which are run with `run_parse`,
+    after their positional arguments.
+    """
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Process the input in bounded batches and write Parquet incrementally",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=1000, help="Lines featurized per batch"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="thread",
+        help="Run feature extraction on threads or on worker processes",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Number of workers (default: number of CPUs)"
+    )
+    parser.add_argument(
+        "--featurizer",
+        choices=FEATURIZERS,
+        default=None,
+        help="Featurize one site at a time, all sites of a batch at once, or with "
+        "bounded-memory online statistics "
+        "(default: ragged with --features, otherwise site)",
+    )
+    parser.add_argument(
+        "--features",
+        type=str,
+        default=None,
+        help="Path to a JSON feature list, e.g. data/features_reduced.json; only these "
+        "features are computed and the others are left empty",
+    )
+    parser.add_argument(
+        "--max-reads",
+        type=int,
+        default=None,
+        help="Subsample sites with more reads than this while decoding, and record the "
+        "original read count as an n_reads column",
+    )
+    parser.add_argument(
+        "--sampling",
+        choices=SAMPLINGS,
+        default="uniform",
+        help="How reads are subsampled with --max-reads",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Random seed of the --max-reads subsampling"
+    )
+    parser.add_argument(
+        "--no-sort",
+        action="store_true",
+        help="Keep the input order instead of sorting by transcript id and position",
+    )
+    parser.add_argument(
+        "--compression",
+        choices=COMPRESSION_CODECS,
+        default="snappy",
+        help="Parquet compression codec",
+    )
+    parser.add_argument(
+        "--row-group-size", type=int, default=None, help="Maximum rows per Parquet row group"
+    )
+    parser.add_argument(
+        "--parts",
+        action="store_true",
+        help="Read byte ranges or shards in parallel and write a directory of Parquet part files "
+        "(used automatically when the dataset path is a directory or glob)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Reuse featurized batches cached here by earlier runs, and cache new ones",
+    )
+    parser.add_argument(
+        "--work-dir",
+        type=str,
+        default=None,
+        help="Commit finished batches here so the run can be resumed (implies --stream)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip the batches already committed to --work-dir by an interrupted run",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=str,
+        default=None,
+        help="Save per-stage timings, lines/s, sites/s and peak RSS to this JSON file",
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        default=None,
+        help="Run a fraction of the batches under cProfile and save the statistics to this .prof file",
+    )
+    parser.add_argument(
+        "--profile-fraction",
+        type=float,
+        default=0.1,
+        help="Fraction of the batches profiled with --profile",
+    )
+    parser.add_argument(
+        "--csv", action="store_true", help="Also save the parsed dataset as CSV"
+    )
+
+
+def run_parse(parser: argparse.ArgumentParser, args, row_parser, transform=None):
+    """
+    Parses `args.dataset_path` into `data/<args.output_name>` with the options added by
+    `add_parse_arguments`, choosing the sharded, streaming or in-memory driver, and
+    records the metrics of the run.
+
+    Parameters
+    ----------
+    parser : argparse.ArgumentParser
+        The parser of `args`, used to report invalid combinations of options.
+
+    args : argparse.Namespace
+        The parsed command line.
+
+    row_parser, transform
+        See `parse_dataset`. `transform` is applied to every batch when streaming.
+    """
+    if args.resume and args.work_dir is None:
+        parser.error("--resume requires --work-dir")
+    if is_read_store(args.dataset_path) and (args.parts or args.work_dir is not None):
+        parser.error("--parts and --work-dir read JSON input and do not apply to a read store")
+    features = read_feature_list(args.features) if args.features else None
+    if args.featurizer is None:
+        args.featurizer = "site" if features is None else "ragged"
+    if features is not None and args.featurizer != "ragged":
+        parser.error("--features requires the ragged featurizer")
+    read_cap = None
+    if args.max_reads is not None:
+        read_cap = ReadCap(args.max_reads, args.sampling, args.seed)
+
+    metrics = Metrics(profile_path=args.profile, profile_fraction=args.profile_fraction)
+    with metrics.recording():
+        _parse(args, row_parser, transform, features, read_cap)
+    metrics.finish(args.metrics)
+
+
+def _parse(args, row_parser, transform, features: list, read_cap: ReadCap):
+    # Parses the dataset as set up by `run_parse`, within its metrics
+    from scripts.shards import is_sharded, parse_sharded
+
+    os.makedirs("data", exist_ok=True)
+    output_path = f"data/{args.output_name}.parquet"
+    options = dict(
+        backend=args.backend,
+        workers=args.workers,
+        featurizer=args.featurizer,
+        features=features,
+        read_cap=read_cap,
+        cache_dir=args.cache_dir,
+        sort=not args.no_sort,
+        transform=transform,
+    )
+
+    print(f"Processing {args.dataset_path}")
+    if args.parts or is_sharded(args.dataset_path):
+        output_path = f"data/{args.output_name}"
+        rows_written = parse_sharded(
+            args.dataset_path,
+            output_path,
+            row_parser,
+            chunk_size=args.batch_size,
+            compression=args.compression,
+            row_group_size=args.row_group_size,
+            **options,
+        )
+    elif args.stream or args.work_dir is not None:
+        rows_written = parse_dataset_streaming(
+            args.dataset_path,
+            output_path,
+            row_parser,
+            batch_size=args.batch_size,
+            compression=args.compression,
+            row_group_size=args.row_group_size,
+            work_dir=args.work_dir,
+            resume=args.resume,
+            **options,
+        )
+    else:
+        df = parse_dataset(args.dataset_path, row_parser, chunk_size=args.batch_size, **options)
+        write_parquet(
+            df, output_path, compression=args.compression, row_group_size=args.row_group_size
+        )
+        rows_written = len(df)
+    print(f"{rows_written} entries created")
+
+    if args.csv:
+        # Written from the Parquet output in every mode, so that every mode writes the
+        # same CSV
+        parquet_to_csv(output_path, f"data/{args.output_name}.csv", index=True)
+    print(f"Processing complete, dataset saved to {output_path}")
@@ -0,0 +1,188 @@
+import os
+import sys
+import argparse
+import pandas as pd
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.engine import BACKENDS, blocks_to_frame, iter_feature_blocks
+from scripts.model_artifacts import load_scorer
+from scripts.parse_testset import parse_row_features
+from scripts.streaming import KEY_COLUMNS, iter_parquet_frames, write_predictions
+
+
+def load_scorers(model_paths: list) -> list:
+    """
+    Loads several saved models, see `model_artifacts.load_scorer`, giving each a
+    unique name.
+    """
+    scorers = []
+    names = set()
+    for model_path in model_paths:
+        scorer = load_scorer(model_path)
+        name = scorer.name
+        suffix = 2
+        while scorer.name in names:
+            scorer.name = f"{name}_{suffix}"
+            suffix += 1
+        names.add(scorer.name)
+        scorers.append(scorer)
+    return scorers
+
+
+def score_ensemble(scorers: list, df: pd.DataFrame, average: bool = False) -> pd.DataFrame:
+    """
+    Scores one batch of parsed rows with every model.
+
+    Parameters
+    ----------
+    scorers : list
+        Models loaded with `load_scorers`.
+
+    df : pd.DataFrame
+        Parsed rows with the columns every model reads.
+
+    average : bool
+        Whether to add the mean of the model scores as `score`.
+
+    Returns
+    -------
+    scores : pd.DataFrame
+        `transcript_id`, `transcript_position`, one `score_<name>` column per model
+        and, with `average`, the ensemble `score`. Invalid rows have missing scores.
+    """
+    scores = df[["transcript_id", "transcript_position"]].reset_index(drop=True)
+    score_columns = []
+    for scorer in scorers:
+        scores[f"score_{scorer.name}"] = scorer.score(df)
+        score_columns.append(f"score_{scorer.name}")
+    if average:
+        scores["score"] = scores[score_columns].mean(axis=1, skipna=False)
+    return scores
+
+
+def iter_input_frames(
+    input_path: str,
+    columns: list,
+    batch_size: int = 65536,
+    backend: str = "thread",
+    workers: int = None,
+):
+    """
+    Yields batches of parsed rows from either a parsed Parquet file or dataset
+    directory, reading only `columns`, or a raw JSON or gzipped JSON (.json.gz) file,
+    which is featurized on the fly.
+    """
+    if input_path.endswith((".json", ".json.gz")):
+        blocks = iter_feature_blocks(
+            input_path,
+            parse_row_features,
+            backend=backend,
+            workers=workers,
+            chunk_size=batch_size,
+        )
+        for block in blocks:
+            yield blocks_to_frame([block])
+    else:
+        yield from iter_parquet_frames(input_path, columns, batch_size=batch_size)
+
+
+def iter_ensemble_predictions(
+    input_path: str,
+    scorers: list,
+    average: bool = False,
+    batch_size: int = 65536,
+    backend: str = "thread",
+    workers: int = None,
+):
+    """
+    Scores a dataset with several models in a single pass over the features: every
+    batch is read or featurized once and scored by all models while in memory.
+
+    Parameters
+    ----------
+    input_path : str
+        A parsed Parquet file or dataset directory, or a raw JSON or gzipped JSON
+        (.json.gz) file.
+
+    scorers : list
+        Models loaded with `load_scorers`.
+
+    average : bool
+        Whether to add the mean of the model scores as `score`.
+
+    batch_size : int
+        Number of rows (or lines of raw input) per batch.
+
+    backend, workers
+        Execution backend and number of workers used to featurize raw input.
+
+    Yields
+    ------
+    scores : pd.DataFrame
+        The scores of the next batch, see `score_ensemble`.
+    """
+    columns = list(KEY_COLUMNS)
+    for scorer in scorers:
+        columns.extend(column for column in scorer.columns if column not in columns)
+
+    for df in iter_input_frames(input_path, columns, batch_size, backend, workers):
+        yield score_ensemble(scorers, df, average=average)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "testing_path", type=str, help="Path to the parsed test set, or to a raw .json/.json.gz file"
+    )
+    parser.add_argument("output_name", type=str, help="Name of the output file")
+    parser.add_argument(
+        "--model",
+        action="append",
+        required=True,
+        dest="models",
+        help="Path to a CatBoost (.cbm) or LightGBM artifact (.joblib) model, can be repeated",
+    )
+    parser.add_argument(
+        "--average", action="store_true", help="Add the mean of the model scores as 'score'"
+    )
+    parser.add_argument("--parquet", action="store_true", help="Save output as Parquet instead of CSV")
+    parser.add_argument(
+        "--batch-size", type=int, default=65536, help="Rows read and scored per batch"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="thread",
+        help="Run feature extraction of raw input on threads or on worker processes",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Number of workers (default: number of CPUs)"
+    )
+
+    args = parser.parse_args()
+
+    scorers = load_scorers(args.models)
+    print(f"{len(scorers)} models loaded: {', '.join(scorer.name for scorer in scorers)}")
+
+    os.makedirs("output", exist_ok=True)
+    output_path = f"output/{args.output_name}.{'parquet' if args.parquet else 'csv'}"
+
+    print("Generating Predictions on Test Set...")
+    batches = iter_ensemble_predictions(
+        args.testing_path,
+        scorers,
+        average=args.average,
+        batch_size=args.batch_size,
+        backend=args.backend,
+        workers=args.workers,
+    )
+    rows_written, invalid_rows = write_predictions(batches, output_path)
+    print(f"{rows_written} rows scored, Number of Invalid Rows: {invalid_rows}")
+    print(f"Processing complete, dataset saved to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
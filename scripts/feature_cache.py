@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+import sys
+import argparse
+import numpy as np
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.metrics import count, stage
+
+
+# Bump whenever a change to the featurizers changes their output, so that blocks
+# cached by an older version are no longer reused
+FEATURIZER_VERSION = 2
+
+
+class FeatureCache:
+    """
+    Content-addressed store of featurized chunks. Every chunk of input lines is keyed
+    by a hash of its content, the featurizer settings and `FEATURIZER_VERSION`, and
+    its feature block is saved under that key. Later runs on the same or a partly
+    changed input reuse the blocks of unchanged chunks, whatever the input file is
+    called, and only featurize new or changed chunks.
+
+    Chunks are only found again if they hold the same lines, so runs that should share
+    the cache must use the same batch size. Blocks are saved compressed and are never
+    evicted while a run uses the cache; `prune` deletes the least recently used ones
+    to bound its size.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Directory holding the cached blocks, shared by all runs and inputs.
+
+    featurizer : str
+        "site", "ragged" or "online", see `engine.featurize_chunks`.
+
+    row_parser : callable
+        Function used by the "site" featurizer to parse every row.
+
+    features : list
+        Optional selection of generated features, see `site_features.feature_mask`.
+
+    read_cap : decode.ReadCap
+        Optional cap on the number of reads featurized per site, see `decode.ReadCap`.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        featurizer: str = "site",
+        row_parser=None,
+        features: list = None,
+        read_cap=None,
+    ):
+        self.cache_dir = cache_dir
+        settings = {"version": FEATURIZER_VERSION, "featurizer": featurizer, "features": features}
+        if read_cap is not None:
+            settings["read_cap"] = read_cap.settings()
+        if featurizer == "site":
+            # Named by defining file rather than module, which is "__main__" in a script
+            source = os.path.splitext(os.path.basename(row_parser.__code__.co_filename))[0]
+            settings["row_parser"] = f"{source}.{row_parser.__qualname__}"
+        self.settings = json.dumps(settings, sort_keys=True)
+        self.hits = 0
+        self.misses = 0
+
+    def chunk_key(self, lines: list) -> str:
+        """
+        Hashes a chunk of lines together with the featurizer settings. Surrounding
+        whitespace of the lines is ignored.
+        """
+        digest = hashlib.sha256(self.settings.encode("utf-8"))
+        for line in lines:
+            digest.update(line.strip().encode("utf-8"))
+            digest.update(b"\n")
+        return digest.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.npz")
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def load(self, key: str) -> dict:
+        path = self.path(key)
+        with np.load(path, allow_pickle=False) as arrays:
+            block = {name: arrays[name] for name in arrays.files}
+        # Marks the entry as recently used for `prune`
+        os.utime(path)
+        return block
+
+    def store(self, key: str, block: dict):
+        """
+        Saves the feature block of a chunk. The file is written under a temporary name
+        and renamed, so concurrent runs and crashes never leave a partial entry.
+        """
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, **block)
+        os.replace(tmp_path, path)
+
+    def keyed(self, chunks):
+        """
+        Pairs every chunk of lines with its key, counting the chunks already cached.
+        """
+        for lines in chunks:
+            key = self.chunk_key(lines)
+            if key in self:
+                self.hits += 1
+            else:
+                self.misses += 1
+            yield key, lines
+
+    def prune(self, max_bytes: int) -> int:
+        """
+        Deletes the least recently stored or loaded blocks until the cache holds at
+        most `max_bytes`, see `prune_cache`.
+        """
+        return prune_cache(self.cache_dir, max_bytes)
+
+
+def prune_cache(cache_dir: str, max_bytes: int) -> int:
+    """
+    Bounds the size of a feature cache directory by deleting its least recently stored
+    or loaded blocks. Deleted blocks are simply featurized again by the next run that
+    needs them.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Directory holding the cached blocks.
+
+    max_bytes : int
+        Maximum total size of the blocks kept.
+
+    Returns
+    -------
+    removed : int
+        Number of blocks deleted.
+    """
+    entries = []
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            if name.endswith(".npz"):
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        os.remove(path)
+        total -= size
+        removed += 1
+    return removed
+
+
+class CachedTask:
+    """
+    Wraps the function featurizing one chunk so that it takes a (key, lines) pair from
+    `FeatureCache.keyed`, loads the block of a cached chunk and featurizes and caches
+    any other chunk. It can be sent to worker processes when `task` can.
+    """
+
+    def __init__(self, cache: FeatureCache, task):
+        self.cache = cache
+        self.task = task
+
+    def __call__(self, item: tuple) -> dict:
+        key, lines = item
+        if key in self.cache:
+            with stage("cache"):
+                block = self.cache.load(key)
+            count(lines=len(lines), sites=len(block["transcript_id"]))
+            return block
+        block = self.task(lines)
+        self.cache.store(key, block)
+        return block
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bound the size of a feature cache directory")
+
+    parser.add_argument("cache_dir", type=str, help="Directory of the feature cache")
+    parser.add_argument(
+        "--max-size-mb",
+        type=float,
+        default=2048,
+        help="Size in MB the cache is pruned to, deleting the least recently used batches first",
+    )
+
+    args = parser.parse_args()
+
+    removed = prune_cache(args.cache_dir, int(args.max_size_mb * 1024 * 1024))
+    print(f"Removed {removed} cached batches from {args.cache_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+import glob
+import itertools
+import json
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from threadpoolctl import threadpool_limits
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.engine import limit_worker_threads
+from scripts.streaming import KEY_COLUMNS, bounded_map, feature_columns, read_feature_list
+
+
+MODELS = ["catboost", "lgbm"]
+DEFAULT_GRIDS = {
+    "catboost": {"iterations": [500], "depth": [4, 6, 8], "learning_rate": [0.05, 0.1]},
+    "lgbm": {"n_estimators": [300], "num_leaves": [15, 31, 63], "learning_rate": [0.05, 0.1]},
+}
+SHARED_ARRAYS = ["features", "kmers", "labels", "folds"]
+
+
+def gene_folds(genes: np.ndarray, n_folds: int, seed: int = 0) -> np.ndarray:
+    """
+    Assigns every row to one of `n_folds` folds so that all rows of a gene are in the
+    same fold. Genes are taken from the largest to the smallest, ties in a seeded
+    random order, and each is added to the fold with the fewest rows so far, so that
+    folds have close numbers of rows.
+
+    Parameters
+    ----------
+    genes : np.ndarray
+        Gene of every row.
+
+    n_folds : int
+        Number of folds, at most the number of genes.
+
+    seed : int
+        Seed of the order of genes of the same size.
+
+    Returns
+    -------
+    folds : np.ndarray
+        Fold of every row, from 0 to `n_folds` - 1.
+    """
+    unique, inverse, counts = np.unique(genes, return_inverse=True, return_counts=True)
+    if not 2 <= n_folds <= len(unique):
+        raise ValueError(f"Cannot split {len(unique)} genes into {n_folds} folds.")
+    shuffled = np.random.default_rng(seed).permutation(len(unique))
+    order = shuffled[np.argsort(-counts[shuffled], kind="stable")]
+    gene_fold = np.empty(len(unique), dtype=np.int64)
+    fold_rows = np.zeros(n_folds, dtype=np.int64)
+    for gene in order:
+        fold = int(np.argmin(fold_rows))
+        gene_fold[gene] = fold
+        fold_rows[fold] += counts[gene]
+    return gene_fold[inverse]
+
+
+def expand_grid(grid: dict) -> list:
+    """
+    Returns every combination of a parameter grid, e.g. `{"depth": [4, 6]}`, as a
+    list of parameter dictionaries.
+    """
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def write_shared_matrix(training_path: str, work_dir: str, n_folds: int = 5, seed: int = 0) -> dict:
+    """
+    Reads a parsed, labelled training set once and saves what every fold needs as
+    .npy files in `work_dir`: the float32 matrix of all generated features, the
+    categorical codes of the `seq_1`, `seq_2` and `seq_3` 5-mers, the labels and the
+    gene-grouped fold of every row (see `gene_folds`). Workers memory-map them
+    read-only, so they share one copy through the page cache.
+
+    Returns
+    -------
+    manifest : dict
+        `columns` of the feature matrix and number of `rows`.
+    """
+    from scripts.catboost_predictions import KMER_COLUMNS, add_kmer_columns
+
+    columns = feature_columns()[len(KEY_COLUMNS):]
+    train = pd.read_parquet(training_path, columns=["seq", "gene_id", "label"] + columns)
+    kmers = add_kmer_columns(train[["seq"]])[KMER_COLUMNS]
+    arrays = {
+        "features": train[columns].to_numpy(dtype=np.float32),
+        "kmers": np.stack([pd.factorize(kmers[name])[0] for name in KMER_COLUMNS], axis=1).astype(np.int32),
+        "labels": train["label"].to_numpy(dtype=np.int64),
+        "folds": gene_folds(train["gene_id"].to_numpy(), n_folds, seed),
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(work_dir, f"{name}.npy"), array, allow_pickle=False)
+    return {"columns": columns, "rows": len(train)}
+
+
+def _fit_and_score(model: str, params: dict, train: tuple, valid: tuple, names: list, threads: int, seed: int):
+    # Fits one configuration on the (features, 5-mer codes, labels) of the training
+    # rows and returns a function scoring the (features, 5-mer codes) of the validation rows
+    x_train, kmers_train, y_train = train
+    x_valid, kmers_valid = valid
+    if model == "catboost":
+        from catboost import CatBoostClassifier, Pool
+        from scripts.catboost_predictions import KMER_COLUMNS
+
+        def pool(x, kmers, y=None):
+            df = pd.DataFrame(x, columns=names)
+            for i, name in enumerate(KMER_COLUMNS):
+                df[name] = kmers[:, i]
+            return Pool(df, y, cat_features=KMER_COLUMNS)
+
+        cb = CatBoostClassifier(
+            **params, thread_count=threads, random_seed=seed, verbose=0, allow_writing_files=False
+        )
+        cb.fit(pool(x_train, kmers_train, y_train))
+        return lambda: cb.predict_proba(pool(x_valid, kmers_valid))[:, 1]
+
+    if model == "lgbm":
+        from lightgbm import LGBMClassifier
+        from sklearn.preprocessing import MinMaxScaler
+
+        # Scaled as by lgbm_predictions.train_model
+        scaler = MinMaxScaler()
+        lgbm = LGBMClassifier(**params, n_jobs=threads, random_state=seed, verbose=-1)
+        lgbm.fit(scaler.fit_transform(x_train), y_train)
+        return lambda: lgbm.predict_proba(scaler.transform(x_valid))[:, 1]
+
+    raise ValueError(f"Unknown model '{model}'. Please use one of {MODELS}.")
+
+
+class FoldTask:
+    """
+    Trains one configuration on all folds but one and scores the held-out fold. The
+    shared arrays of `write_shared_matrix` are memory-mapped on first use in every
+    worker, so the task can be sent to worker processes without the data.
+
+    Parameters
+    ----------
+    work_dir : str
+        Directory written by `write_shared_matrix`.
+
+    threads : int
+        Number of threads of every model fit.
+
+    seed : int
+        Seed of the models.
+    """
+
+    def __init__(self, work_dir: str, threads: int = 1, seed: int = 0):
+        self.work_dir = work_dir
+        self.threads = threads
+        self.seed = seed
+        self._arrays = None
+
+    def __getstate__(self) -> dict:
+        return {**self.__dict__, "_arrays": None}
+
+    def __call__(self, item: tuple) -> dict:
+        from sklearn.metrics import auc, precision_recall_curve, roc_auc_score
+
+        if self._arrays is None:
+            self._arrays = {
+                name: np.load(os.path.join(self.work_dir, f"{name}.npy"), mmap_mode="r")
+                for name in SHARED_ARRAYS
+            }
+        model, params, feature_set, indices, names, fold = item
+        features, kmers, labels = (self._arrays[name] for name in ("features", "kmers", "labels"))
+        valid = np.asarray(self._arrays["folds"]) == fold
+
+        # Only the selected columns of the shared matrix are copied
+        x = features[:, indices]
+        start = time.perf_counter()
+        predict = _fit_and_score(
+            model,
+            params,
+            (x[~valid], kmers[~valid], labels[~valid]),
+            (x[valid], kmers[valid]),
+            names,
+            self.threads,
+            self.seed,
+        )
+        fit_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        scores = predict()
+        predict_seconds = time.perf_counter() - start
+
+        precision, recall, thresholds = precision_recall_curve(labels[valid], scores)
+        return {
+            "model": model,
+            "params": json.dumps(params, sort_keys=True),
+            "features": feature_set,
+            "fold": fold,
+            "train_rows": int((~valid).sum()),
+            "valid_rows": int(valid.sum()),
+            "roc_auc": roc_auc_score(labels[valid], scores),
+            "pr_auc": auc(recall, precision),
+            "fit_seconds": fit_seconds,
+            "predict_seconds": predict_seconds,
+        }
+
+
+def summarize_folds(folds: pd.DataFrame) -> pd.DataFrame:
+    """
+    Averages the per-fold results of every configuration and sorts the
+    configurations from the best to the worst mean PR AUC.
+    """
+    summary = (
+        folds.groupby(["model", "params", "features"], sort=False)
+        .agg(
+            roc_auc_mean=("roc_auc", "mean"),
+            roc_auc_std=("roc_auc", "std"),
+            pr_auc_mean=("pr_auc", "mean"),
+            pr_auc_std=("pr_auc", "std"),
+            folds=("fold", "count"),
+            fit_seconds=("fit_seconds", "sum"),
+            predict_seconds=("predict_seconds", "sum"),
+        )
+        .reset_index()
+    )
+    return summary.sort_values("pr_auc_mean", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def run_search(
+    training_path: str,
+    features_paths: list,
+    models: list = MODELS,
+    grids: dict = None,
+    n_folds: int = 5,
+    workers: int = None,
+    threads_per_worker: int = None,
+    seed: int = 0,
+) -> tuple:
+    """
+    Runs gene-grouped k-fold cross-validation of every combination of model,
+    parameters and feature list, scheduling the folds on a process pool.
+
+    The training set is read once and saved as a shared read-only feature matrix,
+    see `write_shared_matrix`, which workers memory-map instead of receiving copies.
+    Every worker caps its native thread pools, and every fit, to
+    `threads_per_worker` threads.
+
+    Parameters
+    ----------
+    training_path : str
+        Path of the parsed, labelled training Parquet file or dataset directory,
+        with a `gene_id` column.
+
+    features_paths : list
+        Paths of JSON feature lists, e.g. "data/features_pr_auc.json".
+
+    models : list
+        Models to evaluate, among `MODELS`.
+
+    grids : dict
+        Parameter grid of every model, e.g. `{"lgbm": {"num_leaves": [15, 31]}}`.
+        Defaults to `DEFAULT_GRIDS`.
+
+    n_folds : int
+        Number of folds.
+
+    workers : int
+        Number of worker processes. Defaults to the number of CPUs. Folds run in this
+        process when 1.
+
+    threads_per_worker : int
+        Threads of every worker. Defaults to the number of CPUs divided by `workers`.
+
+    seed : int
+        Seed of the folds and of the models.
+
+    Returns
+    -------
+    folds : pd.DataFrame
+        Scores and timings of every configuration on every fold.
+
+    summary : pd.DataFrame
+        Mean and standard deviation of the scores of every configuration and its
+        total fit and predict time, see `summarize_folds`.
+    """
+    grids = {**DEFAULT_GRIDS, **(grids or {})}
+    unknown = [model for model in models if model not in MODELS]
+    if unknown:
+        raise ValueError(f"Unknown models {unknown}. Please use some of {MODELS}.")
+    workers = workers or os.cpu_count() or 1
+    threads_per_worker = threads_per_worker or max((os.cpu_count() or 1) // workers, 1)
+    feature_sets = {
+        os.path.splitext(os.path.basename(path))[0]: read_feature_list(path) for path in features_paths
+    }
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        manifest = write_shared_matrix(training_path, work_dir, n_folds, seed)
+        position = {name: i for i, name in enumerate(manifest["columns"])}
+        items = [
+            (model, params, feature_set, [position[name] for name in names], list(names), fold)
+            for feature_set, names in feature_sets.items()
+            for model in models
+            for params in expand_grid(grids[model])
+            for fold in range(n_folds)
+        ]
+        print(
+            f"{len(items) // n_folds} configurations x {n_folds} folds on {manifest['rows']} rows, "
+            f"{workers} workers x {threads_per_worker} threads"
+        )
+
+        task = FoldTask(work_dir, threads_per_worker, seed)
+        start = time.perf_counter()
+        results = []
+        if workers == 1:
+            with threadpool_limits(threads_per_worker):
+                results = [task(item) for item in items]
+        else:
+            with ProcessPoolExecutor(
+                workers, initializer=limit_worker_threads, initargs=(threads_per_worker,)
+            ) as executor:
+                for result in bounded_map(executor, task, items, 2 * workers):
+                    results.append(result)
+                    if len(results) % n_folds == 0:
+                        print(f"{len(results)} of {len(items)} folds done in {time.perf_counter() - start:.1f}s")
+        print(f"Search complete in {time.perf_counter() - start:.1f}s")
+
+    folds = pd.DataFrame(results)
+    return folds, summarize_folds(folds)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare CatBoost and LightGBM configurations and feature lists with gene-grouped cross-validation"
+    )
+
+    parser.add_argument("training_path", type=str, help="Path to the parsed training file with labels and genes")
+    parser.add_argument("output_name", type=str, help="Name of the output file")
+    parser.add_argument(
+        "--features",
+        type=str,
+        nargs="+",
+        default=sorted(glob.glob("data/features_*.json")),
+        help="Paths of the feature lists to compare, all of data/features_*.json by default",
+    )
+    parser.add_argument("--models", choices=MODELS, nargs="+", default=MODELS, help="Models to compare")
+    parser.add_argument(
+        "--grid",
+        type=str,
+        default=None,
+        help='Path of a JSON file of parameter grids, e.g. {"lgbm": {"num_leaves": [15, 31]}}',
+    )
+    parser.add_argument("--folds", type=int, default=5, help="Number of gene-grouped folds")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument(
+        "--threads-per-worker",
+        type=int,
+        default=None,
+        help="Threads of every worker, the number of CPUs divided by the workers by default",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the folds and the models")
+
+    args = parser.parse_args()
+
+    if not args.features:
+        parser.error("no feature lists found, please pass them with --features")
+    grids = None
+    if args.grid is not None:
+        with open(args.grid, "r") as f:
+            grids = json.load(f)
+
+    folds, summary = run_search(
+        args.training_path,
+        args.features,
+        models=args.models,
+        grids=grids,
+        n_folds=args.folds,
+        workers=args.workers,
+        threads_per_worker=args.threads_per_worker,
+        seed=args.seed,
+    )
+
+    os.makedirs("output", exist_ok=True)
+    summary_path = f"output/{args.output_name}.csv"
+    folds_path = f"output/{args.output_name}_folds.csv"
+    summary.to_csv(summary_path, index=False)
+    folds.to_csv(folds_path, index=False)
+    with pd.option_context("display.max_colwidth", 60, "display.width", 200):
+        print(summary.head(10).to_string(index=False))
+    print(f"Results saved to {summary_path} and {folds_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,48 @@
-import json
 import sys
 import os
-import gzip
 import pandas as pd
-import numpy as np
 import argparse
 
-import pandas as pd
-from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import (
-    roc_auc_score,
-    auc,
-    precision_recall_curve,
-    confusion_matrix,
-    accuracy_score,
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.model_artifacts import load_scorer, save_lgbm_artifact
+from scripts.streaming import (
+    iter_parquet_frames,
+    read_feature_list,
+    read_parsed_dataset,
+    write_predictions,
 )
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import StandardScaler, MinMaxScaler
-from xgboost import XGBClassifier
-from lightgbm import LGBMClassifier
-from catboost import CatBoostClassifier
-from imblearn.over_sampling import SMOTE, ADASYN
-from collections import Counter
-
-
-def generate_predictions(training_path, testing_path, features_path):
-    with open(features_path, "r") as file:
-        final_columns = json.load(file)
+
+
+def train_model(training_path, features_path, artifact_path):
+    """
+    Fits a MinMaxScaler and an LGBMClassifier on the selected features of a labelled
+    training set and saves them, with the feature list, as one artifact.
+
+    Parameters
+    ----------
+    training_path : str
+        Path of the parsed, labelled training Parquet file.
+
+    features_path : str
+        Path of a JSON list of the feature columns to train on, e.g.
+        "data/features_pr_auc.json".
+
+    artifact_path : str
+        Path of the artifact to write, see `model_artifacts.save_lgbm_artifact`.
+    """
+    # Imported here as they are only needed for training and slow to import
+    from lightgbm import LGBMClassifier
+    from sklearn.metrics import auc, precision_recall_curve, roc_auc_score
+    from sklearn.preprocessing import MinMaxScaler
+
+    final_columns = read_feature_list(features_path)
     print(f"{len(final_columns)} features loaded!")
 
-    train = pd.read_parquet(training_path)
-    x_train = train[final_columns]
-    y_train = train[["label"]]
+    train = read_parsed_dataset(training_path, final_columns, columns=["label"])
+    x_train = train[final_columns].to_numpy()
+    y_train = train["label"].to_numpy()
 
     # Minmax Scaling
     scaler = MinMaxScaler()
@@ -44,45 +54,88 @@ def generate_predictions(training_path, testing_path, features_path):
     lgbm.fit(x_train_scaled, y_train)
     print("Model Trained")
 
-    print(
-        f"roc auc: {round(roc_auc_score(y_train, lgbm.predict_proba(x_train_scaled)[:,1]),4)}"
-    )
-    precision, recall, thresholds = precision_recall_curve(
-        y_train, lgbm.predict_proba(x_train_scaled)[:, 1]
-    )
+    train_scores = lgbm.predict_proba(x_train_scaled)[:, 1]
+    print(f"roc auc: {round(roc_auc_score(y_train, train_scores),4)}")
+    precision, recall, thresholds = precision_recall_curve(y_train, train_scores)
     print(f"pr auc: {round(auc(recall, precision),4)}")
 
-    print("Generating Predictions on Test Set...")
-    test = pd.read_parquet(testing_path)
-    df_final = test[["transcript_id", "transcript_position"]].copy()
-    x_test = test[final_columns]
-    x_test_scaled = scaler.transform(x_test)
-    predictions = lgbm.predict_proba(x_test_scaled)[:, 1]
-    df_final["score"] = predictions
+    save_lgbm_artifact(artifact_path, lgbm, scaler, final_columns)
+    print(f"Model saved to {artifact_path}")
+
+
+def iter_predictions(testing_path, artifact_path, batch_size=65536):
+    """
+    Scores a parsed test set with a saved LightGBM artifact one batch at a time,
+    reading only the key columns and the artifact's features.
+
+    Parameters
+    ----------
+    testing_path : str
+        Path of the parsed Parquet file or dataset directory.
+
+    artifact_path : str
+        Path of the artifact saved by `train_model`.
+
+    batch_size : int
+        Maximum number of rows read and scored at a time.
+
+    Yields
+    ------
+    scores : pd.DataFrame
+        `transcript_id`, `transcript_position` and `score` of the next batch, with a
+        missing score for invalid rows.
+    """
+    scorer = load_scorer(artifact_path)
+    columns = ["transcript_id", "transcript_position"] + scorer.columns
+    for df in iter_parquet_frames(testing_path, columns, batch_size=batch_size):
+        df_final = df[["transcript_id", "transcript_position"]].reset_index(drop=True)
+        df_final["score"] = scorer.score(df)
+        yield df_final
+
+
+def generate_predictions(
+    training_path, testing_path, features_path, artifact_path="models/lgbm_model.joblib"
+):
+    """
+    Trains a LightGBM artifact and scores a test set with it, see `train_model` and
+    `iter_predictions`.
+    """
+    train_model(training_path, features_path, artifact_path)
 
-    return df_final
+    print("Generating Predictions on Test Set...")
+    return pd.concat(list(iter_predictions(testing_path, artifact_path)), ignore_index=True)
 
 
 def main():
     parser = argparse.ArgumentParser()
-
-    parser.add_argument("training_path", type=str, help="Path to the training file")
-    parser.add_argument("testing_path", type=str, help="Path to the testing file")
-    parser.add_argument("features_path", type=str, help="Path to features")
-    parser.add_argument("output_name", type=str, help="Name of the output file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    train = subparsers.add_parser("train", help="Train a model and save it as an artifact")
+    train.add_argument("training_path", type=str, help="Path to the training file")
+    train.add_argument("features_path", type=str, help="Path to features")
+    train.add_argument("artifact_path", type=str, help="Path of the model artifact (.joblib) to save")
+
+    predict = subparsers.add_parser("predict", help="Generate predictions with a saved artifact")
+    predict.add_argument("testing_path", type=str, help="Path to the testing file or dataset directory")
+    predict.add_argument("artifact_path", type=str, help="Path to the model artifact (.joblib)")
+    predict.add_argument("output_name", type=str, help="Name of the output file")
+    predict.add_argument(
+        "--batch-size", type=int, default=65536, help="Rows read and scored per batch"
+    )
 
     args = parser.parse_args()
 
-    training_path = args.training_path
-    testing_path = args.testing_path
-    features_path = args.features_path
-    output_name = args.output_name
+    if args.command == "train":
+        train_model(args.training_path, args.features_path, args.artifact_path)
+        return
 
     print("Generate Predictions")
-    df = generate_predictions(training_path, testing_path, features_path)
-
-    output_path = f"output/{output_name}_results.csv"
-    df.to_csv(output_path)
+    os.makedirs("output", exist_ok=True)
+    output_path = f"output/{args.output_name}_results.csv"
+    batches = iter_predictions(args.testing_path, args.artifact_path, batch_size=args.batch_size)
+    # Keeps the leading row number column of the CSV files written before batching
+    rows_written, invalid_rows = write_predictions(batches, output_path, index=True)
+    print(f"{rows_written} rows scored, Number of Invalid Rows: {invalid_rows}")
     print(f"Processing complete, dataset saved to {output_path}")
 
 
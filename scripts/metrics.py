@@ -0,0 +1,261 @@
+import cProfile
+import glob
+import json
+import os
+import pstats
+import shutil
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+STAGES = ["decode", "cluster", "aggregate", "frame", "sort", "write", "inference"]
+
+_local = threading.local()
+_active = None
+_profile_lock = threading.Lock()
+
+
+class stage:
+    """
+    Adds the time spent in a block of code, and one call, to a stage of the recorder
+    of the calling thread. Does nothing when the thread is not recording, see
+    `Metrics.recording` and `recorded`.
+
+    Examples
+    --------
+    >>> with stage("decode"):
+    ...     rows = [decode_row(line) for line in lines]
+    """
+
+    __slots__ = ("name", "recorder", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.recorder = getattr(_local, "recorder", None)
+        if self.recorder is not None:
+            self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        if self.recorder is not None:
+            seconds, calls = self.recorder["stages"].get(self.name, (0.0, 0))
+            self.recorder["stages"][self.name] = (seconds + time.perf_counter() - self.start, calls + 1)
+
+
+def count(**counts):
+    """
+    Adds to the counters, e.g. `lines` and `sites`, of the recorder of the calling
+    thread, if it is recording.
+    """
+    recorder = getattr(_local, "recorder", None)
+    if recorder is not None:
+        for name, n in counts.items():
+            recorder["counters"][name] = recorder["counters"].get(name, 0) + n
+
+
+def _new_recorder() -> dict:
+    return {"stages": {}, "counters": {}}
+
+
+def recorded(fn, *args, **kwargs) -> tuple:
+    """
+    Calls `fn` with a fresh recorder on the calling thread, e.g. a worker, and returns
+    its result together with the recorder, so that the stage timings and counters of
+    the call can be sent back and merged with `Metrics.merge`.
+    """
+    previous = getattr(_local, "recorder", None)
+    _local.recorder = _new_recorder()
+    try:
+        result = fn(*args, **kwargs)
+        return result, _local.recorder
+    finally:
+        _local.recorder = previous
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size in MB of this process, or of its largest finished child
+    process when that is larger. None where the `resource` module is not available.
+    """
+    if resource is None:
+        return None
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+class InstrumentedTask:
+    """
+    Wraps the function featurizing one chunk so that it takes an (index, chunk) pair
+    and returns the block together with the recorder of the call. Every
+    1 / `profile_fraction`-th chunk is also run under cProfile, and its statistics are
+    saved to `profile_dir`. It can be sent to worker processes when `task` can.
+    """
+
+    def __init__(self, task, profile_fraction: float = 0.0, profile_dir: str = None):
+        self.task = task
+        self.profile_fraction = profile_fraction if profile_dir is not None else 0.0
+        self.profile_dir = profile_dir
+
+    def profiled(self, index: int) -> bool:
+        return int((index + 1) * self.profile_fraction) > int(index * self.profile_fraction)
+
+    def __call__(self, item: tuple) -> tuple:
+        index, chunk = item
+        if not self.profiled(index):
+            return recorded(self.task, chunk)
+
+        # Only one profiler can be active at a time
+        with _profile_lock:
+            profiler = cProfile.Profile()
+            result = profiler.runcall(recorded, self.task, chunk)
+            profiler.dump_stats(os.path.join(self.profile_dir, f"chunk-{index:06d}-{os.getpid()}.prof"))
+        return result
+
+
+class Metrics:
+    """
+    Run-wide instrumentation of the parsing pipeline: cumulative time and number of
+    calls of every stage (decode, cluster, aggregate, frame, sort, write and, when
+    scoring, inference), counts of lines and sites, throughput and peak RSS, a
+    rate-limited progress report, and an optional cProfile of a fraction of chunks.
+
+    Stages run by workers are timed on the workers and merged as their chunks come
+    back, so with several workers the stage times add up to more than the wall time.
+
+    Parameters
+    ----------
+    progress_interval : float
+        Minimum number of seconds between two progress reports.
+
+    profile_path : str
+        Optional path of a cProfile statistics file (.prof) written by `finish`, readable
+        with `pstats` or snakeviz. Profiling is off when it is not given.
+
+    profile_fraction : float
+        Fraction of chunks, and so of lines, run under cProfile with `profile_path`.
+    """
+
+    def __init__(
+        self, progress_interval: float = 10.0, profile_path: str = None, profile_fraction: float = 0.1
+    ):
+        self.progress_interval = progress_interval
+        self.profile_path = profile_path
+        self.profile_fraction = profile_fraction
+        self.profile_dir = None
+        if profile_path is not None:
+            self.profile_dir = f"{profile_path}.chunks"
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+            os.makedirs(self.profile_dir)
+        self.recorder = _new_recorder()
+        self.start = time.perf_counter()
+        self.last_report = self.start
+
+    @contextmanager
+    def recording(self):
+        """
+        Makes this the active instance, picked up by `active_metrics`, and records the
+        stages run on the calling thread.
+        """
+        global _active
+        previous_active = _active
+        previous_recorder = getattr(_local, "recorder", None)
+        _active = self
+        _local.recorder = self.recorder
+        try:
+            yield self
+        finally:
+            _active = previous_active
+            _local.recorder = previous_recorder
+
+    def instrument(self, task) -> InstrumentedTask:
+        return InstrumentedTask(task, self.profile_fraction, self.profile_dir)
+
+    def merge(self, recorder: dict):
+        """
+        Adds the stage timings and counters returned by `recorded` and reports progress.
+        """
+        for name, (seconds, calls) in recorder["stages"].items():
+            total_seconds, total_calls = self.recorder["stages"].get(name, (0.0, 0))
+            self.recorder["stages"][name] = (total_seconds + seconds, total_calls + calls)
+        for name, n in recorder["counters"].items():
+            self.recorder["counters"][name] = self.recorder["counters"].get(name, 0) + n
+        self.report()
+
+    def report(self, force: bool = False):
+        """
+        Prints the progress so far, at most once every `progress_interval` seconds.
+        """
+        now = time.perf_counter()
+        if not force and now - self.last_report < self.progress_interval:
+            return
+        self.last_report = now
+        counters = self.recorder["counters"]
+        elapsed = max(now - self.start, 1e-9)
+        print(
+            f"Processed {counters.get('lines', 0)} lines, {counters.get('sites', 0)} sites "
+            f"in {elapsed:.1f}s ({counters.get('sites', 0) / elapsed:.0f} sites/s)"
+        )
+
+    def summary(self) -> dict:
+        """
+        Returns the metrics of the run so far as a JSON-serializable dictionary.
+        """
+        elapsed = time.perf_counter() - self.start
+        counters = dict(self.recorder["counters"])
+        stages = self.recorder["stages"]
+        names = [name for name in STAGES if name in stages] + sorted(set(stages) - set(STAGES))
+        return {
+            "elapsed_seconds": elapsed,
+            "counters": counters,
+            "lines_per_second": counters.get("lines", 0) / elapsed if elapsed > 0 else None,
+            "sites_per_second": counters.get("sites", 0) / elapsed if elapsed > 0 else None,
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": {
+                name: {"seconds": stages[name][0], "calls": stages[name][1]} for name in names
+            },
+        }
+
+    def finish(self, metrics_path: str = None) -> dict:
+        """
+        Prints the stage timings, writes the summary to `metrics_path` as JSON when
+        given, and combines the profiled chunks into `profile_path`.
+        """
+        summary = self.summary()
+        print(
+            f"{summary['counters'].get('lines', 0)} lines and {summary['counters'].get('sites', 0)} "
+            f"sites in {summary['elapsed_seconds']:.1f}s, peak RSS {summary['peak_rss_mb'] or 0:.0f} MB"
+        )
+        for name, timing in summary["stages"].items():
+            print(f"  {name:<10} {timing['seconds']:>9.2f}s {timing['calls']:>9} calls")
+
+        if metrics_path is not None:
+            with open(metrics_path, "w") as f:
+                json.dump(summary, f, indent=2)
+            print(f"Metrics saved to {metrics_path}")
+
+        if self.profile_dir is not None:
+            profiles = sorted(glob.glob(os.path.join(self.profile_dir, "*.prof")))
+            if profiles:
+                pstats.Stats(*profiles).dump_stats(self.profile_path)
+                print(f"Profile of {len(profiles)} chunks saved to {self.profile_path}")
+            shutil.rmtree(self.profile_dir, ignore_errors=True)
+        return summary
+
+
+def active_metrics() -> Metrics:
+    """
+    Returns the `Metrics` of the current run, or None outside `Metrics.recording`.
+    """
+    return _active
@@ -0,0 +1,123 @@
+import os
+import joblib
+import numpy as np
+import pandas as pd
+
+from scripts.streaming import KEY_COLUMNS
+
+
+LGBM_ARTIFACT_KEYS = ["model", "scaler", "features"]
+
+
+def save_lgbm_artifact(path: str, model, scaler, features: list):
+    """
+    Saves a fitted LightGBM model together with its fitted scaler and the ordered list
+    of feature columns it was trained on, as a single joblib artifact.
+
+    Parameters
+    ----------
+    path : str
+        Path of the artifact to write, e.g. "models/lgbm_model.joblib".
+
+    model : LGBMClassifier
+        The fitted model.
+
+    scaler : sklearn transformer
+        The scaler fitted on the training features, e.g. a MinMaxScaler.
+
+    features : list
+        The feature columns, in the order the model expects them.
+    """
+    joblib.dump({"model": model, "scaler": scaler, "features": list(features)}, path)
+
+
+def load_lgbm_artifact(path: str) -> dict:
+    """
+    Loads an artifact saved by `save_lgbm_artifact`.
+
+    Returns
+    -------
+    artifact : dict
+        The fitted `model` and `scaler`, and the list of `features`.
+    """
+    artifact = joblib.load(path)
+    if not isinstance(artifact, dict) or any(key not in artifact for key in LGBM_ARTIFACT_KEYS):
+        raise ValueError(f"'{path}' is not a LightGBM artifact with keys {LGBM_ARTIFACT_KEYS}.")
+    return artifact
+
+
+class Scorer:
+    """
+    A loaded model that scores parsed rows, whatever its type.
+
+    Parameters
+    ----------
+    name : str
+        Name of the model, used for its score column.
+
+    columns : list
+        Columns of a parsed dataset that the model reads.
+
+    score_fn : callable
+        Function turning a frame with `columns` into an array of scores, with NaN
+        for rows that cannot be scored.
+    """
+
+    def __init__(self, name: str, columns: list, score_fn):
+        self.name = name
+        self.columns = columns
+        self.score_fn = score_fn
+
+    def score(self, df: pd.DataFrame) -> np.ndarray:
+        return self.score_fn(df)
+
+
+def _catboost_scorer(name: str, model_path: str) -> Scorer:
+    from scripts.catboost_predictions import KMER_COLUMNS, load_model, score_batch
+
+    model = load_model(model_path)
+    columns = KEY_COLUMNS + [column for column in model.feature_names_ if column not in KMER_COLUMNS]
+    return Scorer(name, columns, lambda df: score_batch(model, df)["score"].to_numpy())
+
+
+def _lgbm_scorer(name: str, model_path: str) -> Scorer:
+    artifact = load_lgbm_artifact(model_path)
+    model, scaler, features = artifact["model"], artifact["scaler"], artifact["features"]
+
+    def score_fn(df):
+        x = df[features]
+        valid = ~x.isna().any(axis=1).to_numpy()
+        scores = np.full(len(df), np.nan)
+        if valid.any():
+            scores[valid] = model.predict_proba(scaler.transform(x[valid].to_numpy()))[:, 1]
+        return scores
+
+    return Scorer(name, list(features), score_fn)
+
+
+def load_scorer(model_path: str, name: str = None) -> Scorer:
+    """
+    Loads a saved model for scoring: a CatBoost model (.cbm) or a LightGBM artifact
+    (.joblib) saved by `save_lgbm_artifact`.
+
+    Parameters
+    ----------
+    model_path : str
+        Path of the saved model.
+
+    name : str
+        Name of the model. Defaults to the file name without its extension.
+
+    Returns
+    -------
+    scorer : Scorer
+        The loaded model.
+    """
+    name = name or os.path.splitext(os.path.basename(model_path))[0]
+    if model_path.endswith(".cbm"):
+        return _catboost_scorer(name, model_path)
+    if model_path.endswith(".joblib"):
+        return _lgbm_scorer(name, model_path)
+    raise ValueError(
+        f"Unknown model format '{model_path}'. Please provide a .cbm or .joblib model."
+    )
@@ -0,0 +1,270 @@
+import numpy as np
+
+from scripts.decode import decode_site_blocks
+from scripts.metrics import count, stage
+from scripts.site_features import AGGREGATES, DATA_RANGES
+from scripts.two_means import two_means
+
+
+class RunningStats:
+    """
+    Count, mean, variance, min and max of every column of a stream of reads, updated
+    one block of reads at a time. Block statistics are merged into the running ones
+    with the pairwise form of Welford's algorithm (Chan et al.), which stays accurate
+    without keeping the reads.
+
+    Parameters
+    ----------
+    n_features : int
+        Number of columns of every read.
+    """
+
+    def __init__(self, n_features: int):
+        self.count = 0
+        self.mean = np.zeros(n_features)
+        self.m2 = np.zeros(n_features)
+        self.min = np.full(n_features, np.inf)
+        self.max = np.full(n_features, -np.inf)
+
+    def update(self, block: np.ndarray):
+        n_block = len(block)
+        if n_block == 0:
+            return
+        block_mean = block.mean(axis=0)
+        block_m2 = ((block - block_mean) ** 2).sum(axis=0)
+        count = self.count + n_block
+        delta = block_mean - self.mean
+        self.mean += delta * n_block / count
+        self.m2 += block_m2 + delta**2 * self.count * n_block / count
+        self.count = count
+        np.minimum(self.min, block.min(axis=0), out=self.min)
+        np.maximum(self.max, block.max(axis=0), out=self.max)
+
+    @property
+    def sd(self) -> np.ndarray:
+        """Population standard deviation, as `np.std`."""
+        return np.sqrt(self.m2 / self.count)
+
+
+class QuantileSketch:
+    """
+    Streaming median of every column in bounded memory, using a compactor hierarchy
+    (as in the KLL sketch). Reads are buffered at level 0; when a level holds more than
+    `capacity` items, they are sorted and every other one is promoted to the next
+    level with twice the weight. Memory is O(capacity * log(n / capacity)) reads, and
+    the median is exact as long as no more than `capacity` reads have been seen.
+
+    Compaction alternates between keeping the odd and the even items, so the sketch
+    is deterministic.
+
+    Parameters
+    ----------
+    n_features : int
+        Number of columns of every read.
+
+    capacity : int
+        Number of items a level holds before it is compacted.
+    """
+
+    def __init__(self, n_features: int, capacity: int = 1024):
+        self.capacity = capacity
+        self.levels = [np.empty((0, n_features))]
+        self.compactions = 0
+
+    def update(self, block: np.ndarray):
+        self.levels[0] = np.concatenate((self.levels[0], block))
+        level = 0
+        while len(self.levels[level]) > self.capacity:
+            items = np.sort(self.levels[level], axis=0)
+            parity = self.compactions % 2
+            self.compactions += 1
+            # An odd item out, alternately the smallest and the largest, stays at its
+            # level so that no weight is lost
+            kept = items[:0]
+            if len(items) % 2 == 1:
+                kept, items = (items[-1:], items[:-1]) if parity else (items[:1], items[1:])
+            promoted = items[parity::2]
+            self.levels[level] = kept
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty((0, items.shape[1])))
+            self.levels[level + 1] = np.concatenate((self.levels[level + 1], promoted))
+            level += 1
+
+    def median(self) -> np.ndarray:
+        if len(self.levels) == 1:
+            return np.median(self.levels[0], axis=0)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate(
+            [np.full(len(level), 2.0**i) for i, level in enumerate(self.levels)]
+        )
+        order = np.argsort(items, axis=0, kind="stable")
+        cumulative = np.cumsum(weights[order], axis=0)
+        half = cumulative[-1] / 2
+        lower = np.argmax(cumulative >= half, axis=0)
+        upper = np.argmax(cumulative > half, axis=0)
+        columns = np.arange(items.shape[1])
+        sorted_items = np.take_along_axis(items, order, axis=0)
+        return (sorted_items[lower, columns] + sorted_items[upper, columns]) / 2
+
+
+class OnlineSiteFeaturizer:
+    """
+    Computes the 15 * n_features features of a site from a stream of read blocks,
+    with memory bounded independently of the number of reads.
+
+    The whole set statistics come from a `RunningStats` and a `QuantileSketch`. The
+    clusters come from a mini-batch 2-means: the first `init_size` reads are buffered
+    and split with `two_means`, and every later block is assigned to the nearest
+    center, after which each center moves to the running mean of its reads. Cluster
+    statistics are accumulated as reads are assigned.
+
+    Sites with at most `init_size` reads (and at most `capacity` reads per median)
+    get the same features as `site_features.featurize_site`, up to rounding.
+
+    Parameters
+    ----------
+    n_features : int
+        Number of columns of every read.
+
+    init_size : int
+        Number of reads buffered to seed the clusters.
+
+    capacity : int
+        Capacity of the median sketches, see `QuantileSketch`.
+    """
+
+    def __init__(self, n_features: int, init_size: int = 1024, capacity: int = 1024):
+        self.init_size = init_size
+        self.buffer = []
+        self.n_buffered = 0
+        self.centers = None
+        self.stats = [RunningStats(n_features) for _ in DATA_RANGES]
+        self.sketches = [QuantileSketch(n_features, capacity) for _ in DATA_RANGES]
+
+    @property
+    def count(self) -> int:
+        return self.stats[0].count
+
+    def update(self, block: np.ndarray):
+        block = np.asarray(block, dtype=np.float64)
+        if len(block) == 0:
+            return
+        with stage("aggregate"):
+            self.stats[0].update(block)
+            self.sketches[0].update(block)
+
+        if self.centers is None:
+            self.buffer.append(block)
+            self.n_buffered += len(block)
+            if self.n_buffered >= self.init_size:
+                self._seed_clusters()
+            return
+
+        with stage("cluster"):
+            labels = (
+                np.sum((block - self.centers[1]) ** 2, axis=1)
+                < np.sum((block - self.centers[0]) ** 2, axis=1)
+            ).astype(np.int64)
+        self._add_to_clusters(block, labels)
+
+    def features(self) -> np.ndarray:
+        """
+        Returns the features of the reads seen so far as a 1D float32 array, in the
+        layout of `streaming.feature_columns`.
+        """
+        if self.centers is None:
+            self._seed_clusters()
+        n_features = len(self.stats[0].mean)
+        out = np.empty((len(DATA_RANGES), len(AGGREGATES), n_features), dtype=np.float32)
+        with stage("aggregate"):
+            for data_range, (stats, sketch) in enumerate(zip(self.stats, self.sketches)):
+                if stats.count == 0:
+                    # An empty cluster 2 takes the statistics of cluster 1
+                    out[data_range] = out[data_range - 1]
+                    continue
+                out[data_range] = (stats.mean, sketch.median(), stats.max, stats.min, stats.sd)
+        return out.ravel()
+
+    def _seed_clusters(self):
+        reads = np.concatenate(self.buffer)
+        self.buffer = []
+        with stage("cluster"):
+            if len(reads) >= 2:
+                labels = two_means(reads)
+            else:
+                labels = np.zeros(len(reads), dtype=np.int64)
+        self.centers = np.zeros((2, reads.shape[1]))
+        self._add_to_clusters(reads, labels)
+
+    def _add_to_clusters(self, block: np.ndarray, labels: np.ndarray):
+        with stage("aggregate"):
+            for cluster in (0, 1):
+                reads = block[labels == cluster]
+                if len(reads) == 0:
+                    continue
+                self.stats[1 + cluster].update(reads)
+                self.sketches[1 + cluster].update(reads)
+                self.centers[cluster] = self.stats[1 + cluster].mean
+
+
+def featurize_chunk_online(
+    lines: list, block_size: int = 256, init_size: int = 1024, capacity: int = 1024
+) -> dict:
+    """
+    Decodes a chunk of JSON lines one block of reads at a time with
+    `decode.decode_site_blocks` and featurizes every site with an
+    `OnlineSiteFeaturizer`, so that the reads of a site are never all held as floats.
+    Returns the same block layout as `engine.featurize_chunk`.
+
+    Parameters
+    ----------
+    lines : list
+        Strings each containing a single line of JSON data.
+
+    block_size : int
+        Number of reads decoded at a time.
+
+    init_size, capacity : int
+        See `OnlineSiteFeaturizer`.
+
+    Returns
+    -------
+    block : dict
+        `transcript_id`, `transcript_position` and `seq` arrays and a 2D float32
+        `features` array, with one entry per site in input order. Sites without reads
+        have NaN features.
+    """
+    keys = []
+    rows = []
+    for line in lines:
+        with stage("decode"):
+            sites = decode_site_blocks(line, block_size)
+        for transcript, position, kmer, blocks in sites:
+            featurizer = None
+            while True:
+                # Reads are decoded lazily, one block at a time
+                with stage("decode"):
+                    block = next(blocks, None)
+                if block is None:
+                    break
+                if len(block) == 0:
+                    continue
+                if featurizer is None:
+                    featurizer = OnlineSiteFeaturizer(block.shape[1], init_size, capacity)
+                featurizer.update(block)
+            keys.append((transcript, position, kmer))
+            rows.append(featurizer.features() if featurizer is not None else None)
+    count(lines=len(lines), sites=len(keys))
+
+    n_features = next((len(row) for row in rows if row is not None), 15 * 9)
+    features = np.full((len(rows), n_features), np.nan, dtype=np.float32)
+    for i, row in enumerate(rows):
+        if row is not None:
+            features[i] = row
+
+    return {
+        "transcript_id": np.array([key[0] for key in keys], dtype=str),
+        "transcript_position": np.array([key[1] for key in keys], dtype=np.int64),
+        "seq": np.array([key[2] for key in keys], dtype=str),
+        "features": features,
+    }
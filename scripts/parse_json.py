@@ -1,11 +1,17 @@
 import json
 import os
-import gzip
+import sys
 import pandas as pd
 import numpy as np
 import argparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from sklearn.cluster import KMeans
+from functools import partial
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.engine import add_parse_arguments, parse_dataset, run_parse
+from scripts.site_features import featurize_site
+from scripts.two_means import two_means
 
 
 def generate_features(array: np.ndarray) -> np.ndarray:
@@ -37,8 +43,9 @@ def generate_features(array: np.ndarray) -> np.ndarray:
 
 def cluster_samples(array: np.ndarray) -> np.ndarray:
     """
-    Performs KMeans clustering on the input data, grouping it into
-    two clusters.
+    Performs 2-means clustering on the input data, grouping it into
+    two clusters. Uses the vectorized implementation in `two_means`, which
+    avoids the per-call overhead of sklearn's KMeans on small arrays.
 
     Parameters
     ----------
@@ -53,14 +60,43 @@ def cluster_samples(array: np.ndarray) -> np.ndarray:
     cluster_2 : np.ndArray
         Subset of the input array corresponding to the second cluster with labels == 1.
     """
-    kmeans = KMeans(n_clusters=2, random_state=0)
-    kmeans.fit(array)
-    labels = kmeans.labels_
+    labels = two_means(array)
     cluster_1 = array[labels == 0]
     cluster_2 = array[labels == 1]
     return cluster_1, cluster_2
 
 
+def parse_row_features(row: dict) -> tuple:
+    """
+    Parses a single JSON row of hierarchical data and generates the feature set for
+    the whole data and for each cluster as one preallocated float32 row, using the
+    fused kernel in `site_features`.
+
+    Parameters
+    ----------
+    row : dict
+        A dictionary containing hierarchical data, where the values contain numerical arrays.
+
+    Returns
+    -------
+    keys : list
+        The parsed keys (transcript id, position and sequence).
+
+    features : np.ndarray
+        A 1D float32 array with the generated features.
+    """
+    keys = []
+    features = None
+    for key, value in row.items():
+        keys.append(key)
+        for key1, value1 in value.items():
+            keys.append(key1)
+            for key2, value2 in value1.items():
+                keys.append(key2)
+                features = featurize_site(np.array(value2))
+    return keys, features
+
+
 def parse_row(row: dict) -> list:
     """
     Parses a single JSON row of hierarchical data, extracts arrays, and
@@ -77,21 +113,8 @@ def parse_row(row: dict) -> list:
         A list containing the parsed keys, followed by the generated features
         for the entire array and two KMeans clusters.
     """
-    ls = []
-    for key, value in row.items():
-        ls.append(key)
-        for key1, value1 in value.items():
-            ls.append(key1)
-            for key2, value2 in value1.items():
-                ls.append(key2)
-                array = np.array(value2)
-                cluster_1, cluster_2 = cluster_samples(array)
-
-                whole_set = generate_features(array).tolist()
-                cluster_1_set = generate_features(cluster_1).tolist()
-                cluster_2_set = generate_features(cluster_2).tolist()
-                ls += whole_set + cluster_1_set + cluster_2_set
-    return ls
+    keys, features = parse_row_features(row)
+    return keys + features.tolist()
 
 
 def process_line(index: int, line: str) -> list:
@@ -113,66 +136,42 @@ def process_line(index: int, line: str) -> list:
     """
     row = json.loads(line)
     parsed_row = parse_row(row)
-    print(f"Processed line {index + 1}")
     return parsed_row
 
 
-def parse_json(json_path: str, csv_path: str) -> pd.DataFrame:
+def merge_labels(df: pd.DataFrame, labels: pd.DataFrame) -> pd.DataFrame:
     """
-    Processes a single line from a gzipped JSON file and returns a generated feature set.
+    Merges parsed rows with their labels on transcript id and position. Defined at
+    module level so that it can be sent to worker processes.
+    """
+    return df.merge(labels, on=["transcript_id", "transcript_position"])
+
+
+def parse_json(json_path: str, csv_path: str, **options) -> pd.DataFrame:
+    """
+    Processes a gzipped JSON file in chunks of lines and returns the generated feature sets merged with their labels.
 
     Parameters
     ----------
     json_path : str
-        Path to the gzipped JSON file that contains the input data.
+        Path to the gzipped JSON file that contains the input data, or to a read store
+        written by `read_store.write_read_store`.
 
     csv_path : str
         Path to the CSV file containing labels to be merged with the parsed data.
 
+    **options
+        Options of `engine.parse_dataset`, e.g. `featurizer` or `sort`.
+
     Returns
     -------
     df_with_labels : pd.DataFrame
         A pandas DataFrame that includes the processed feature data merged with the label information from the CSV.
     """
-    with gzip.open(json_path, "rt") as f:
-        lines = f.readlines()
-
-    # Create new dimensions
-    columns = ["transcript_id", "transcript_position", "seq"]
-    values = [
-        "dt_1",
-        "sd_1",
-        "curr_1",
-        "dt_2",
-        "sd_2",
-        "curr_2",
-        "dt_3",
-        "sd_3",
-        "curr_3",
-    ]
-
-    for data_range in ["whole", "cluster_1", "cluster_2"]:
-        for aggregate in ["mean", "median", "max", "min", "sd"]:
-            for val in values:
-                columns.append(f"{data_range}_{aggregate}_{val}")
-
-    parsed_rows = []
-
-    with ThreadPoolExecutor() as executor:
-        future_to_index = {
-            executor.submit(process_line, i, line): i for i, line in enumerate(lines)
-        }
-        for future in as_completed(future_to_index):
-            parsed_row = future.result()
-            parsed_rows.append(parsed_row)
-
-    df = pd.DataFrame(parsed_rows, columns=columns)
-
-    df["transcript_position"] = df["transcript_position"].astype(int)
-    df = df.sort_values(by=["transcript_id", "transcript_position"])
-
     labels = pd.read_csv(csv_path)
-    df_with_labels = df.merge(labels, on=["transcript_id", "transcript_position"])
+    df_with_labels = parse_dataset(
+        json_path, parse_row_features, transform=partial(merge_labels, labels=labels), **options
+    )
     print(df_with_labels.columns)
 
     return df_with_labels
@@ -181,24 +180,20 @@ def parse_json(json_path: str, csv_path: str) -> pd.DataFrame:
 def main():
     parser = argparse.ArgumentParser()
 
-    parser.add_argument("dataset_path", type=str, help="Path to the dataset file")
+    parser.add_argument(
+        "dataset_path",
+        type=str,
+        help="Path to the dataset file, or to a read store written by scripts/read_store.py",
+    )
     parser.add_argument("label_path", type=str, help="Path to the label file")
     parser.add_argument("output_name", type=str, help="Name of the output file")
+    add_parse_arguments(parser)
 
     args = parser.parse_args()
 
-    dataset_path = args.dataset_path
-    label_path = args.label_path
-    output_name = args.output_name
-
-    print("Processing Json")
-    df = parse_json(dataset_path, label_path)
-
-    os.makedirs("data", exist_ok=True)
-    output_path = f"data/{output_name}.parquet"
-    df.to_parquet(output_path)
-    # df.to_csv(f"data/{output_name}.csv")
-    print(f"Processing complete, dataset saved to {output_path}")
+    # Every batch is merged with the labels before it is written
+    labels = pd.read_csv(args.label_path)
+    run_parse(parser, args, parse_row_features, transform=partial(merge_labels, labels=labels))
 
 
 if __name__ == "__main__":
@@ -1,11 +1,16 @@
 import json
-import gzip
 import os
+import sys
 import pandas as pd
 import numpy as np
 import argparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from sklearn.cluster import KMeans
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.engine import add_parse_arguments, parse_dataset, run_parse
+from scripts.site_features import featurize_site
+from scripts.two_means import two_means
 
 import warnings
 warnings.filterwarnings("ignore")
@@ -39,8 +44,9 @@ def generate_features(array):
 
 def cluster_samples(array):
     """
-    Performs KMeans clustering on the input data, grouping it into
-    two clusters.
+    Performs 2-means clustering on the input data, grouping it into
+    two clusters. Uses the vectorized implementation in `two_means`, which
+    avoids the per-call overhead of sklearn's KMeans on small arrays.
 
     Parameters
     ----------
@@ -55,9 +61,7 @@ def cluster_samples(array):
     cluster_2 : np.ndArray
         Subset of the input array corresponding to the second cluster with labels == 1.
     """
-    kmeans = KMeans(n_clusters=2, random_state=0)
-    kmeans.fit(array)
-    labels = kmeans.labels_
+    labels = two_means(array)
     cluster_1 = array[labels == 0]
     cluster_2 = array[labels == 1]
     if len(cluster_2) == 0:
@@ -65,6 +69,44 @@ def cluster_samples(array):
     return cluster_1, cluster_2
 
 
+def parse_row_features(row: dict) -> tuple:
+    """
+    Parses a single JSON row of hierarchical data and generates the feature set for
+    the whole data and for each cluster as one preallocated float32 row, using the
+    fused kernel in `site_features`.
+
+    Parameters
+    ----------
+    row : dict
+        A dictionary containing hierarchical data, where the values contain numerical arrays.
+
+    Returns
+    -------
+    keys : list
+        The parsed keys (transcript id, position and sequence).
+
+    features : np.ndarray
+        A 1D float32 array with the generated features, or None for an invalid row
+        without reads.
+    """
+    keys = []
+    features = None
+    for key, value in row.items():
+        keys.append(key)
+        for key1, value1 in value.items():
+            keys.append(key1)
+            for key2, value2 in value1.items():
+                keys.append(key2)
+
+                if len(value2) == 0:
+                    print("Invalid Row")
+                    return keys, None
+
+                features = featurize_site(np.array(value2))
+
+    return keys, features
+
+
 def parse_row(row: dict) -> list:
     """
     Parses a single JSON row of hierarchical data, extracts arrays, and
@@ -81,31 +123,10 @@ def parse_row(row: dict) -> list:
         A list containing the parsed keys, followed by the generated features
         for the entire array and two KMeans clusters.
     """
-    ls = []
-    for key, value in row.items():
-        ls.append(key)
-        for key1, value1 in value.items():
-            ls.append(key1)
-            for key2, value2 in value1.items():
-                ls.append(key2)
-                
-                if len(value2) == 0:
-                    print("Invalid Row")
-                    ls += [None] * 135
-                    return ls
-
-                array = np.array(value2)
-                whole_set = generate_features(array).tolist()
-                if len(array) >= 2:
-                    cluster_1, cluster_2 = cluster_samples(array)
-                    cluster_1_set = generate_features(cluster_1).tolist()
-                    cluster_2_set = generate_features(cluster_2).tolist()
-                else:
-                    cluster_1_set = whole_set
-                    cluster_2_set = whole_set
-                ls += whole_set + cluster_1_set + cluster_2_set
-                
-    return ls
+    keys, features = parse_row_features(row)
+    if features is None:
+        return keys + [None] * 135
+    return keys + features.tolist()
 
 
 def process_line(index: int, line: str, size: int) -> list:
@@ -130,72 +151,31 @@ def process_line(index: int, line: str, size: int) -> list:
     """
     row = json.loads(line)
     parsed_row = parse_row(row)
-    print(f"Processed line {index + 1}/{size}")
     return parsed_row
 
 
-def parse_json(json_path: str) -> pd.DataFrame:
+def parse_json(json_path: str, **options) -> pd.DataFrame:
     """
-    Processes a single line from a JSON or gzipped JSON (.json.gz) file and returns a generated feature set.
+    Processes a JSON or gzipped JSON (.json.gz) file, or a read store, and returns the
+    generated feature sets.
 
     Parameters
     ----------
-     json_path : str
-        Path to the JSON or gzipped JSON (.json.gz) file that contains the input data.
+    json_path : str
+        Path to the JSON or gzipped JSON (.json.gz) file that contains the input data,
+        or to a read store written by `read_store.write_read_store`.
 
-    csv_path : str
-        Path to the CSV file containing labels to be merged with the parsed data.
+    **options
+        Options of `engine.parse_dataset`, e.g. `featurizer` or `sort`.
 
     Returns
     -------
-    df_with_labels : pd.DataFrame
-        A pandas DataFrame that includes the processed feature data merged with the label information from the CSV.
+    df : pd.DataFrame
+        A pandas DataFrame that includes the processed feature data.
     """
-    if json_path.endswith(".gz"):
-        with gzip.open(json_path, "rt") as f:
-            lines = f.readlines()
-    elif json_path.endswith(".json"):
-        with open(json_path, "r") as f:
-            lines = f.readlines()
-    else:
-        raise ValueError("File format not supported. Please provide a .json or .json.gz file.")
-
-    size = len(lines)
-    columns = ["transcript_id", "transcript_position", "seq"]
-    values = [
-        "dt_1",
-        "sd_1",
-        "curr_1",
-        "dt_2",
-        "sd_2",
-        "curr_2",
-        "dt_3",
-        "sd_3",
-        "curr_3",
-    ]
-
-    for data_range in ["whole", "cluster_1", "cluster_2"]:
-        for aggregate in ["mean", "median", "max", "min", "sd"]:
-            for val in values:
-                columns.append(f"{data_range}_{aggregate}_{val}")
-
-    parsed_rows = []
-
-    with ThreadPoolExecutor() as executor:
-        future_to_index = {
-            executor.submit(process_line, i, line, size): i for i, line in enumerate(lines)
-        }
-        for future in as_completed(future_to_index):
-            parsed_row = future.result()
-            parsed_rows.append(parsed_row)
-
-    df = pd.DataFrame(parsed_rows, columns=columns)
-
-    df["transcript_position"] = df["transcript_position"].astype(int)
-    df = df.sort_values(by=["transcript_id", "transcript_position"])
+    df = parse_dataset(json_path, parse_row_features, **options)
 
     print(f"{len(df)} entries created for testing")
-    # print(df.columns)
 
     return df
 
@@ -203,22 +183,17 @@ def parse_json(json_path: str) -> pd.DataFrame:
 def main():
     parser = argparse.ArgumentParser()
 
-    parser.add_argument("dataset_path", type=str, help="Path to the dataset file")
+    parser.add_argument(
+        "dataset_path",
+        type=str,
+        help="Path to the dataset file, or to a read store written by scripts/read_store.py",
+    )
     parser.add_argument("output_name", type=str, help="Name of the output file")
+    add_parse_arguments(parser)
 
     args = parser.parse_args()
 
-    dataset_path = args.dataset_path
-    output_name = args.output_name
-
-    print("Processing Test Set")
-    df = parse_json(dataset_path)
-
-    os.makedirs("data", exist_ok=True)
-    output_path = f"data/{output_name}.parquet"
-    df.to_parquet(output_path)
-    df.to_csv(f"data/{output_name}.csv")
-    print(f"Processing complete, dataset saved to {output_path}")
+    run_parse(parser, args, parse_row_features)
 
 
 if __name__ == "__main__":
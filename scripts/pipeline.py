@@ -0,0 +1,259 @@
+import os
+import sys
+import argparse
+from collections import deque
+import pandas as pd
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.catboost_predictions import load_model, score_batch
+from scripts.metrics import Metrics, stage
+from scripts.decode import SAMPLINGS, ReadCap
+from scripts.engine import (
+    BACKENDS,
+    FEATURIZERS,
+    blocks_to_frame,
+    iter_feature_blocks,
+    write_blocks_parquet,
+)
+from scripts.parse_testset import parse_row_features
+from scripts.streaming import COMPRESSION_CODECS
+
+
+def _score_blocks(blocks, model, scores: list):
+    # Scores every block as it passes through, so that it can also be persisted
+    for block in blocks:
+        df = blocks_to_frame([block])
+        with stage("inference"):
+            scores.append(score_batch(model, df))
+        yield block
+
+
+def run_pipeline(
+    json_path: str,
+    model_path: str,
+    batch_size: int = 1000,
+    max_pending: int = None,
+    backend: str = "thread",
+    workers: int = None,
+    featurizer: str = "site",
+    sort: bool = True,
+    features_path: str = None,
+    compression: str = "snappy",
+    cache_dir: str = None,
+    read_cap: ReadCap = None,
+) -> pd.DataFrame:
+    """
+    Parses a JSON or gzipped JSON (.json.gz) test set and scores it in a single process.
+    Featurized batches go straight into the loaded CatBoost model, so the feature
+    table is never written to disk and read back unless `features_path` is given.
+
+    Parameters
+    ----------
+    json_path : str
+        Path to the JSON or gzipped JSON (.json.gz) file that contains the input data.
+
+    model_path : str
+        Path to the trained CatBoost model.
+
+    batch_size : int
+        Number of lines featurized and scored per batch.
+
+    max_pending : int
+        Maximum number of batches submitted but not yet scored. Defaults to twice
+        the number of workers.
+
+    backend : str
+        Execution backend, "thread" or "process".
+
+    workers : int
+        Number of workers. Defaults to the number of CPUs for the process backend.
+
+    featurizer : str
+        "site" or "ragged", see `engine.featurize_chunks`.
+
+    sort : bool
+        Whether to order the scores (and the saved features) by transcript id and
+        position. Rows are otherwise kept in input order.
+
+    features_path : str
+        Optional path of a Parquet file in which the parsed features are also saved.
+
+    compression : str
+        Parquet compression codec of the saved features, one of
+        `streaming.COMPRESSION_CODECS`.
+
+    cache_dir : str
+        Optional directory of a `feature_cache.FeatureCache`.
+
+    read_cap : decode.ReadCap
+        Optional cap on the number of reads featurized per site, see `decode.ReadCap`.
+
+    Returns
+    -------
+    df : pd.DataFrame
+        `transcript_id`, `transcript_position` and `score` of every site. Invalid
+        rows have a missing score.
+    """
+    model = load_model(model_path)
+    blocks = iter_feature_blocks(
+        json_path,
+        parse_row_features,
+        backend=backend,
+        workers=workers,
+        chunk_size=batch_size,
+        max_pending=max_pending,
+        featurizer=featurizer,
+        cache_dir=cache_dir,
+        read_cap=read_cap,
+    )
+
+    scores = []
+    scored_blocks = _score_blocks(blocks, model, scores)
+    if features_path is not None:
+        write_blocks_parquet(scored_blocks, features_path, sort=sort, compression=compression)
+    else:
+        deque(scored_blocks, maxlen=0)
+
+    if not scores:
+        return pd.DataFrame(columns=["transcript_id", "transcript_position", "score"])
+    df = pd.concat(scores, ignore_index=True)
+    if sort:
+        df = df.sort_values(["transcript_id", "transcript_position"], ignore_index=True)
+
+    print(f"{len(df)} sites scored, {df['score'].isna().sum()} invalid rows")
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "dataset_path",
+        type=str,
+        help="Path to the dataset file, or to a read store written by scripts/read_store.py",
+    )
+    parser.add_argument("model_path", type=str, help="Path to the model file")
+    parser.add_argument("output_name", type=str, help="Name of the output file")
+    parser.add_argument("--parquet", action="store_true", help="Save output as Parquet instead of CSV")
+    parser.add_argument(
+        "--save-features",
+        type=str,
+        default=None,
+        metavar="NAME",
+        help="Also save the parsed features to data/NAME.parquet",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=1000, help="Lines featurized and scored per batch"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="thread",
+        help="Run feature extraction on threads or on worker processes",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="Number of workers (default: number of CPUs)"
+    )
+    parser.add_argument(
+        "--featurizer",
+        choices=FEATURIZERS,
+        default="site",
+        help="Featurize one site at a time, all sites of a batch at once, or with "
+        "bounded-memory online statistics",
+    )
+    parser.add_argument(
+        "--max-reads",
+        type=int,
+        default=None,
+        help="Subsample sites with more reads than this while decoding, and record the "
+        "original read count as an n_reads column",
+    )
+    parser.add_argument(
+        "--sampling",
+        choices=SAMPLINGS,
+        default="uniform",
+        help="How reads are subsampled with --max-reads",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Random seed of the --max-reads subsampling"
+    )
+    parser.add_argument(
+        "--no-sort",
+        action="store_true",
+        help="Keep the input order instead of sorting by transcript id and position",
+    )
+    parser.add_argument(
+        "--compression",
+        choices=COMPRESSION_CODECS,
+        default="snappy",
+        help="Parquet compression codec of the saved features",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Reuse featurized batches cached here by earlier runs, and cache new ones",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=str,
+        default=None,
+        help="Save per-stage timings, lines/s, sites/s and peak RSS to this JSON file",
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        default=None,
+        help="Run a fraction of the batches under cProfile and save the statistics to this .prof file",
+    )
+    parser.add_argument(
+        "--profile-fraction",
+        type=float,
+        default=0.1,
+        help="Fraction of the batches profiled with --profile",
+    )
+
+    args = parser.parse_args()
+
+    features_path = None
+    if args.save_features is not None:
+        os.makedirs("data", exist_ok=True)
+        features_path = f"data/{args.save_features}.parquet"
+
+    read_cap = None
+    if args.max_reads is not None:
+        read_cap = ReadCap(args.max_reads, args.sampling, args.seed)
+
+    print("Parsing and Scoring Test Set")
+    metrics = Metrics(profile_path=args.profile, profile_fraction=args.profile_fraction)
+    with metrics.recording():
+        df = run_pipeline(
+            args.dataset_path,
+            args.model_path,
+            batch_size=args.batch_size,
+            backend=args.backend,
+            workers=args.workers,
+            featurizer=args.featurizer,
+            sort=not args.no_sort,
+            features_path=features_path,
+            compression=args.compression,
+            cache_dir=args.cache_dir,
+            read_cap=read_cap,
+        )
+    metrics.finish(args.metrics)
+
+    os.makedirs("output", exist_ok=True)
+    if args.parquet:
+        output_path = f"output/{args.output_name}.parquet"
+        df.to_parquet(output_path)
+    else:
+        output_path = f"output/{args.output_name}.csv"
+        df.to_csv(output_path, index=False)
+
+    print(f"Processing complete, predictions saved to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
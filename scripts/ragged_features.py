@@ -0,0 +1,259 @@
+import numpy as np
+
+from scripts.decode import ReadCap, decode_row
+from scripts.metrics import count, stage
+from scripts.streaming import READ_COUNT_COLUMN
+from scripts.two_means import batch_two_means
+
+
+def pack_rows(rows: list) -> tuple:
+    """
+    Packs the reads of every site in a list of decoded JSON rows into one contiguous
+    float array plus an offsets array (CSR-style).
+
+    Parameters
+    ----------
+    rows : list
+        Dictionaries of hierarchical data, {transcript: {position: {kmer: reads}}}.
+
+    Returns
+    -------
+    keys : list
+        (transcript id, position, sequence) of every site, in input order.
+
+    data : np.ndarray
+        A 2D float64 array with the reads of all sites one after the other.
+
+    offsets : np.ndarray
+        Array of length n_sites + 1, the reads of site i are
+        `data[offsets[i]:offsets[i + 1]]`. Sites without reads have an empty range.
+    """
+    keys = []
+    arrays = []
+    counts = []
+    for row in rows:
+        for key, value in row.items():
+            for key1, value1 in value.items():
+                for key2, value2 in value1.items():
+                    keys.append((key, key1, key2))
+                    counts.append(len(value2))
+                    if len(value2) > 0:
+                        arrays.append(np.asarray(value2, dtype=np.float64))
+
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    data = np.concatenate(arrays) if arrays else np.empty((0, 0))
+    return keys, data, offsets
+
+
+def segment_stats(data: np.ndarray, offsets: np.ndarray, mask: np.ndarray = None) -> np.ndarray:
+    """
+    Computes the mean, median, max, min and standard deviation of every column for
+    each segment of a CSR-style array with segment-wise vectorized operations.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        A 2D array of shape (n_reads, n_features).
+
+    offsets : np.ndarray
+        Segment boundaries of length n_segments + 1. Every segment must be non-empty.
+
+    mask : np.ndarray
+        Optional boolean array of shape (5, n_features) selecting the aggregates to
+        compute. Medians, the only aggregate needing a sort, are then only sorted for
+        the columns that need them. Aggregates that are not selected are NaN.
+
+    Returns
+    -------
+    stats : np.ndarray
+        Array of shape (n_segments, 5, n_features) with the aggregates in the order
+        mean, median, max, min, sd.
+    """
+    starts = offsets[:-1]
+    counts = np.diff(offsets)
+    segment_ids = np.repeat(np.arange(len(counts)), counts)
+
+    if mask is None:
+        means = np.add.reduceat(data, starts, axis=0) / counts[:, None]
+        variances = np.add.reduceat((data - means[segment_ids]) ** 2, starts, axis=0) / counts[:, None]
+        medians, maxs, mins = _segment_order_stats(data, offsets)
+        return np.stack((means, medians, maxs, mins, np.sqrt(variances)), axis=1)
+
+    stats = np.full((len(counts), 5, data.shape[1]), np.nan)
+    if mask[0].any() or mask[4].any():
+        means = np.add.reduceat(data, starts, axis=0) / counts[:, None]
+        stats[:, 0] = means
+        if mask[4].any():
+            variances = np.add.reduceat((data - means[segment_ids]) ** 2, starts, axis=0)
+            stats[:, 4] = np.sqrt(variances / counts[:, None])
+    # Sorted columns give their max and min for free, the others use a cheaper reduction
+    sorted_columns = np.flatnonzero(mask[1])
+    if len(sorted_columns) == data.shape[1]:
+        stats[:, 1], stats[:, 2], stats[:, 3] = _segment_order_stats(data, offsets)
+    elif len(sorted_columns) > 0:
+        medians, maxs, mins = _segment_order_stats(data[:, sorted_columns], offsets)
+        stats[:, 1, sorted_columns] = medians
+        stats[:, 2, sorted_columns] = maxs
+        stats[:, 3, sorted_columns] = mins
+    for aggregate, reduce in ((2, np.maximum), (3, np.minimum)):
+        columns = np.flatnonzero(mask[aggregate] & ~mask[1])
+        if len(columns) > 0:
+            stats[:, aggregate, columns] = reduce.reduceat(data[:, columns], starts, axis=0)
+    stats[:, ~mask] = np.nan
+    return stats
+
+
+def _segment_order_stats(data: np.ndarray, offsets: np.ndarray) -> tuple:
+    """
+    Computes per-segment medians, maxima and minima. Segments are grouped into buckets
+    of similar length (powers of two), and each bucket is padded with +inf into a dense
+    3D array and sorted along the read axis in a single call, so padding at most doubles
+    the work and no Python loop over segments is needed.
+    """
+    starts = offsets[:-1]
+    counts = np.diff(offsets)
+    n_segments, n_features = len(counts), data.shape[1]
+    medians = np.empty((n_segments, n_features))
+    maxs = np.empty((n_segments, n_features))
+    mins = np.empty((n_segments, n_features))
+
+    buckets = np.ceil(np.log2(counts)).astype(np.int64)
+    for bucket in np.unique(buckets):
+        segments = np.flatnonzero(buckets == bucket)
+        bucket_counts = counts[segments]
+        width = bucket_counts.max()
+        padded = np.full((len(segments), width, n_features), np.inf)
+        rows = np.repeat(np.arange(len(segments)), bucket_counts)
+        cols = np.arange(len(rows)) - np.repeat(
+            np.cumsum(bucket_counts) - bucket_counts, bucket_counts
+        )
+        reads = np.repeat(starts[segments], bucket_counts) + cols
+        padded[rows, cols] = data[reads]
+        padded.sort(axis=1)
+
+        index = np.arange(len(segments))
+        medians[segments] = (
+            padded[index, (bucket_counts - 1) // 2] + padded[index, bucket_counts // 2]
+        ) / 2
+        maxs[segments] = padded[index, bucket_counts - 1]
+        mins[segments] = padded[index, 0]
+
+    return medians, maxs, mins
+
+
+def ragged_features(
+    data: np.ndarray, offsets: np.ndarray, mask: np.ndarray = None, labels: np.ndarray = None
+) -> np.ndarray:
+    """
+    Generates the whole set and cluster features of many sites at once. All sites are
+    clustered in one `batch_two_means` call, and the statistics of the whole sets and of
+    the clusters are computed with `segment_stats`, without a Python loop over sites.
+
+    The layout of every row matches `featurize_site`: whole set, cluster 1 and cluster 2,
+    each as mean, median, max, min and sd of every column. Cluster 2 takes the statistics
+    of cluster 1 when it is empty, and sites with a single read use the whole set for
+    both clusters. Sites without reads get NaN features.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        A 2D array with the reads of all sites, as returned by `pack_rows`.
+
+    offsets : np.ndarray
+        Site boundaries of length n_sites + 1, as returned by `pack_rows`.
+
+    mask : np.ndarray
+        Optional boolean array of shape (3, 5, n_features) selecting the features to
+        compute, see `site_features.feature_mask`. Sites are only clustered when a
+        cluster feature is selected, and features that are not selected are NaN.
+
+    labels : np.ndarray
+        Optional cluster label (0 or 1) of every read, as returned by `batch_two_means`
+        for the non-empty sites. Sites are clustered when it is not given.
+
+    Returns
+    -------
+    features : np.ndarray
+        A 2D float32 array of shape (n_sites, 15 * n_features).
+    """
+    counts = np.diff(offsets)
+    n_sites = len(counts)
+    n_features = data.shape[1] if data.size else 9
+    features = np.full((n_sites, 3, 5, n_features), np.nan, dtype=np.float32)
+
+    valid = counts > 0
+    if not np.any(valid):
+        return features.reshape(n_sites, -1)
+
+    valid_counts = counts[valid]
+    valid_offsets = np.concatenate(([0], np.cumsum(valid_counts)))
+    n_valid = len(valid_counts)
+    site_ids = np.repeat(np.arange(n_valid), valid_counts)
+
+    with stage("aggregate"):
+        whole = segment_stats(data, valid_offsets, None if mask is None else mask[0])
+    features[valid, 0] = whole
+    if mask is not None and not mask[1:].any():
+        return features.reshape(n_sites, -1)
+
+    if labels is None:
+        with stage("cluster"):
+            labels = batch_two_means(data, valid_offsets)
+    with stage("aggregate"):
+        cluster_ids = site_ids * 2 + labels
+        order = np.argsort(cluster_ids, kind="stable")
+        cluster_counts = np.bincount(cluster_ids, minlength=2 * n_valid)
+        non_empty = cluster_counts > 0
+        cluster_offsets = np.concatenate(([0], np.cumsum(cluster_counts[non_empty])))
+
+        cluster_mask = None if mask is None else mask[1] | mask[2]
+        clusters = np.empty((2 * n_valid, 5, n_features))
+        clusters[non_empty] = segment_stats(data[order], cluster_offsets, cluster_mask)
+    clusters = clusters.reshape(n_valid, 2, 5, n_features)
+    empty_cluster_2 = cluster_counts.reshape(n_valid, 2)[:, 1] == 0
+    clusters[empty_cluster_2, 1] = clusters[empty_cluster_2, 0]
+
+    features[valid, 1:] = clusters
+    if mask is not None:
+        features[:, ~mask] = np.nan
+    return features.reshape(n_sites, -1)
+
+
+def featurize_chunk_ragged(lines: list, mask: np.ndarray = None, read_cap: ReadCap = None) -> dict:
+    """
+    Decodes a chunk of JSON lines with `decode_row` and featurizes all of its sites at once with
+    `ragged_features`. Returns the same block layout as `engine.featurize_chunk`.
+
+    Parameters
+    ----------
+    lines : list
+        Strings each containing a single line of JSON data.
+
+    mask : np.ndarray
+        Optional selection of the features to compute, see `ragged_features`.
+
+    read_cap : ReadCap
+        Optional cap on the number of reads featurized per site.
+
+    Returns
+    -------
+    block : dict
+        `transcript_id`, `transcript_position` and `seq` arrays and a 2D float32
+        `features` array, with one entry per site in input order. With `read_cap`,
+        the original read counts are added as `n_reads`.
+    """
+    read_counts = [] if read_cap is not None else None
+    with stage("decode"):
+        rows = [decode_row(line, read_cap=read_cap, read_counts=read_counts) for line in lines]
+        keys, data, offsets = pack_rows(rows)
+    count(lines=len(lines), sites=len(keys))
+    block = {
+        "transcript_id": np.array([key[0] for key in keys], dtype=str),
+        "transcript_position": np.array([key[1] for key in keys], dtype=np.int64),
+        "seq": np.array([key[2] for key in keys], dtype=str),
+        "features": ragged_features(data, offsets, mask),
+    }
+    if read_cap is not None:
+        block[READ_COUNT_COLUMN] = np.array(read_counts, dtype=np.int64)
+    return block
@@ -0,0 +1,334 @@
+import io
+import json
+import os
+import sys
+import argparse
+import numpy as np
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.decode import ReadCap, decode_row
+from scripts.metrics import count, stage
+from scripts.online_features import OnlineSiteFeaturizer
+from scripts.ragged_features import ragged_features
+from scripts.site_features import feature_mask, featurize_site
+from scripts.streaming import KEY_COLUMNS, READ_COUNT_COLUMN, feature_columns, iter_json_lines
+
+
+STORE_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+READS_FILE = "reads.npy"
+N_FEATURES = len(feature_columns()) - len(KEY_COLUMNS)
+
+
+def is_read_store(input_path: str) -> bool:
+    """
+    Checks whether an input path is a read store written by `write_read_store`.
+    """
+    return os.path.isfile(os.path.join(input_path, MANIFEST_FILE))
+
+
+def _npy_header(shape: tuple) -> bytes:
+    f = io.BytesIO()
+    header = {"descr": np.dtype(np.float32).str, "fortran_order": False, "shape": shape}
+    np.lib.format.write_array_header_1_0(f, header)
+    return f.getvalue()
+
+
+def _save(store_dir: str, name: str, array: np.ndarray):
+    np.save(os.path.join(store_dir, f"{name}.npy"), array, allow_pickle=False)
+
+
+def write_read_store(json_path: str, store_dir: str) -> dict:
+    """
+    Converts a JSON or gzipped JSON (.json.gz) file of reads into a columnar binary
+    store, so that later runs can featurize it without decoding JSON again.
+
+    The store is a directory of .npy files: `reads.npy`, a float32 matrix with the
+    reads of every site one after the other, `offsets.npy`, the int64 boundaries of the
+    reads of every site (CSR-style), and the site keys as int32 `transcript_codes.npy`
+    into `transcripts.npy`, int32 `positions.npy` and byte string `kmers.npy`. Reads
+    are appended to `reads.npy` one line at a time, so memory does not grow with the
+    number of reads. The manifest is written last and marks the store as complete.
+
+    Parameters
+    ----------
+    json_path : str
+        Path to the JSON or gzipped JSON (.json.gz) file that contains the input data.
+
+    store_dir : str
+        Directory in which the store is written.
+
+    Returns
+    -------
+    manifest : dict
+        Version, source file and number of sites, reads and read columns of the store.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    manifest_path = os.path.join(store_dir, MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    transcripts = {}
+    transcript_codes = []
+    positions = []
+    kmers = []
+    counts = []
+    n_columns = None
+    with open(os.path.join(store_dir, READS_FILE), "wb") as f:
+        # The header of a 2D float32 array has the same length whatever its shape, so
+        # it is reserved now and written once the number of reads is known
+        header_size = len(_npy_header((0, 0)))
+        f.write(b"\0" * header_size)
+        for line in iter_json_lines(json_path):
+            for key, value in decode_row(line).items():
+                for key1, value1 in value.items():
+                    for key2, reads in value1.items():
+                        if len(reads) > 0:
+                            if n_columns is None:
+                                n_columns = reads.shape[1]
+                            elif reads.shape[1] != n_columns:
+                                raise ValueError(
+                                    f"Site {key} {key1} has {reads.shape[1]} values per read, "
+                                    f"expected {n_columns}."
+                                )
+                            f.write(np.ascontiguousarray(reads, dtype=np.float32).tobytes())
+                        transcript_codes.append(transcripts.setdefault(key, len(transcripts)))
+                        positions.append(int(key1))
+                        kmers.append(key2)
+                        counts.append(len(reads))
+
+        n_reads = sum(counts)
+        header = _npy_header((n_reads, n_columns or 0))
+        if len(header) != header_size:
+            raise ValueError(f"Too many reads ({n_reads}) for a single read store.")
+        f.seek(0)
+        f.write(header)
+
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    _save(store_dir, "offsets", offsets)
+    _save(store_dir, "transcript_codes", np.array(transcript_codes, dtype=np.int32))
+    _save(store_dir, "transcripts", np.array(list(transcripts), dtype=str))
+    _save(store_dir, "positions", np.array(positions, dtype=np.int32))
+    _save(store_dir, "kmers", np.array(kmers, dtype=bytes))
+
+    manifest = {
+        "version": STORE_VERSION,
+        "source": os.path.abspath(json_path),
+        "sites": len(counts),
+        "reads": n_reads,
+        "columns": n_columns or 0,
+    }
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+    return manifest
+
+
+class ReadStore:
+    """
+    A read store opened for featurization. The read matrix is memory-mapped, so that
+    the reads of a site or of a range of sites are zero-copy views and only the pages
+    actually read are loaded; worker processes opening the same store share them
+    through the page cache. The offsets and keys are loaded in memory.
+
+    Parameters
+    ----------
+    store_dir : str
+        Directory written by `write_read_store`.
+    """
+
+    def __init__(self, store_dir: str):
+        with open(os.path.join(store_dir, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("version") != STORE_VERSION:
+            raise ValueError(
+                f"Read store '{store_dir}' has version {self.manifest.get('version')}, "
+                f"expected {STORE_VERSION}. Please convert the dataset again."
+            )
+        self.store_dir = store_dir
+        self.reads = np.load(os.path.join(store_dir, READS_FILE), mmap_mode="r")
+        self.offsets = self._load("offsets")
+        self.transcript_codes = self._load("transcript_codes")
+        self.transcripts = self._load("transcripts")
+        self.positions = self._load("positions")
+        self.kmers = self._load("kmers")
+
+    def _load(self, name: str) -> np.ndarray:
+        return np.load(os.path.join(self.store_dir, f"{name}.npy"), allow_pickle=False)
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def site_reads(self, site: int) -> np.ndarray:
+        """
+        Returns the reads of a site as a read-only view of the memory-mapped matrix.
+        """
+        return self.reads[self.offsets[site]:self.offsets[site + 1]]
+
+    def chunk_reads(self, start: int, end: int) -> tuple:
+        """
+        Returns the reads of sites `start` to `end` as a view of the memory-mapped
+        matrix and their offsets relative to it, as from `ragged_features.pack_rows`.
+        """
+        offsets = self.offsets[start:end + 1]
+        return self.reads[offsets[0]:offsets[-1]], offsets - offsets[0]
+
+    def chunk_keys(self, start: int, end: int) -> dict:
+        """
+        Returns the key arrays of sites `start` to `end` in the layout of a feature block.
+        """
+        return {
+            "transcript_id": self.transcripts[self.transcript_codes[start:end]],
+            "transcript_position": self.positions[start:end].astype(np.int64),
+            "seq": self.kmers[start:end].astype(str),
+        }
+
+    def chunk_ranges(self, chunk_size: int):
+        """
+        Yields (start, end) site ranges of at most `chunk_size` sites covering the store.
+        """
+        for start in range(0, len(self), chunk_size):
+            yield start, min(start + chunk_size, len(self))
+
+
+def _cap_chunk(keys: dict, data: np.ndarray, offsets: np.ndarray, read_cap: ReadCap) -> tuple:
+    # Gathers the reads kept by the cap, selected as when decoding JSON
+    indices = []
+    for i, n_reads in enumerate(np.diff(offsets)):
+        selected = read_cap.select(
+            int(n_reads), keys["transcript_id"][i], str(keys["transcript_position"][i])
+        )
+        indices.append(offsets[i] + (np.arange(n_reads) if selected is None else selected))
+    kept_offsets = np.zeros(len(indices) + 1, dtype=np.int64)
+    np.cumsum([len(site) for site in indices], out=kept_offsets[1:])
+    kept = np.concatenate(indices) if indices else np.empty(0, dtype=np.int64)
+    return data[kept], kept_offsets
+
+
+def featurize_store_chunk(
+    store: ReadStore,
+    start: int,
+    end: int,
+    featurizer: str = "ragged",
+    mask: np.ndarray = None,
+    read_cap: ReadCap = None,
+) -> dict:
+    """
+    Featurizes sites `start` to `end` of a read store, slicing their reads from the
+    memory-mapped matrix instead of decoding JSON. Returns the same block layout as
+    `engine.featurize_chunk`, with one entry per site.
+
+    Parameters
+    ----------
+    store : ReadStore
+        The opened read store.
+
+    start, end : int
+        Range of sites to featurize.
+
+    featurizer : str
+        "site", "ragged" or "online", see `engine.featurize_chunks`.
+
+    mask : np.ndarray
+        Optional selection of the features to compute, ragged featurizer only, see
+        `ragged_features.ragged_features`.
+
+    read_cap : decode.ReadCap
+        Optional cap on the number of reads featurized per site, with the same
+        selection as when decoding JSON.
+
+    Returns
+    -------
+    block : dict
+        `transcript_id`, `transcript_position` and `seq` arrays and a 2D float32
+        `features` array. Sites without reads have NaN features. With `read_cap`, the
+        original read counts are added as `n_reads`.
+    """
+    # Reading the reads from the mapped pages takes the place of decoding
+    with stage("decode"):
+        block = store.chunk_keys(start, end)
+        data, offsets = store.chunk_reads(start, end)
+        counts = np.diff(offsets)
+        if read_cap is not None:
+            data, offsets = _cap_chunk(block, data, offsets, read_cap)
+        if featurizer == "ragged":
+            data = np.asarray(data, dtype=np.float64)
+    count(lines=end - start, sites=end - start)
+
+    if featurizer == "ragged":
+        features = ragged_features(data, offsets, mask)
+    elif featurizer in ("site", "online"):
+        features = np.full((end - start, N_FEATURES), np.nan, dtype=np.float32)
+        for i in range(end - start):
+            reads = data[offsets[i]:offsets[i + 1]]
+            if len(reads) == 0:
+                continue
+            if featurizer == "site":
+                featurize_site(reads, out=features[i])
+            else:
+                online = OnlineSiteFeaturizer(reads.shape[1])
+                for block_start in range(0, len(reads), 256):
+                    online.update(reads[block_start:block_start + 256])
+                features[i] = online.features()
+    else:
+        raise ValueError(f"Unknown featurizer '{featurizer}'.")
+
+    block["features"] = features
+    if read_cap is not None:
+        block[READ_COUNT_COLUMN] = counts.astype(np.int64)
+    return block
+
+
+class StoreTask:
+    """
+    Featurizes a (start, end) range of sites of a read store. The store is opened on
+    first use in every worker, so the task can be sent to worker processes, which then
+    map the same files instead of receiving copies of the reads.
+    """
+
+    def __init__(self, store_dir: str, featurizer: str = "ragged", features: list = None, read_cap: ReadCap = None):
+        if featurizer != "ragged" and features is not None:
+            raise ValueError("Selecting features is only supported by the 'ragged' featurizer.")
+        if featurizer == "online" and read_cap is not None:
+            raise ValueError("The 'online' featurizer keeps every read and cannot cap them.")
+        self.store_dir = store_dir
+        self.featurizer = featurizer
+        self.mask = None if features is None else feature_mask(features)
+        self.read_cap = read_cap
+        self._store = None
+
+    def __getstate__(self) -> dict:
+        return {**self.__dict__, "_store": None}
+
+    def __call__(self, item: tuple) -> dict:
+        if self._store is None:
+            self._store = ReadStore(self.store_dir)
+        start, end = item
+        return featurize_store_chunk(
+            self._store, start, end, self.featurizer, self.mask, self.read_cap
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert a JSON dataset of reads into a memory-mapped binary read store"
+    )
+
+    parser.add_argument("dataset_path", type=str, help="Path to the .json or .json.gz dataset file")
+    parser.add_argument("store_dir", type=str, help="Directory in which the read store is written")
+
+    args = parser.parse_args()
+
+    manifest = write_read_store(args.dataset_path, args.store_dir)
+    print(
+        f"{manifest['sites']} sites and {manifest['reads']} reads saved to {args.store_dir}; "
+        "pass it as the dataset path of the parsing scripts to featurize it without decoding"
+    )
+
+
+if __name__ == "__main__":
+    main()
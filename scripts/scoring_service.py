@@ -0,0 +1,293 @@
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+import urllib.request
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scripts.catboost_predictions import KMER_COLUMNS, load_model, score_batch
+from scripts.engine import blocks_to_frame, featurize_chunk
+from scripts.parse_testset import parse_row_features
+from scripts.streaming import KEY_COLUMNS, iter_batches, iter_json_lines
+
+
+DEFAULT_MODEL_PATH = "models/final_catboost_model.cbm"
+
+
+class MicroBatcher:
+    """
+    Scores frames submitted from many threads with a single model, combining the
+    frames that arrive within `max_wait` seconds of each other into one
+    `predict_proba` call, up to about `max_batch_rows` rows.
+
+    Parameters
+    ----------
+    model : CatBoostClassifier
+        The loaded model.
+
+    max_batch_rows : int
+        Number of rows after which a batch is scored without waiting further.
+
+    max_wait : float
+        Seconds to wait for more frames after the first frame of a batch arrives.
+    """
+
+    def __init__(self, model, max_batch_rows: int = 4096, max_wait: float = 0.005):
+        self.model = model
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait
+        self.columns = KEY_COLUMNS + [
+            name for name in model.feature_names_ if name not in KMER_COLUMNS
+        ]
+        self.batches_scored = 0
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, df: pd.DataFrame) -> Future:
+        """
+        Queues parsed rows for scoring. The returned future resolves to their scores,
+        see `catboost_predictions.score_batch`. Frames missing a column the model
+        needs are rejected with a KeyError.
+        """
+        missing = [column for column in self.columns if column not in df.columns]
+        if missing:
+            raise KeyError(f"Missing columns {missing[:5]}{'...' if len(missing) > 5 else ''}")
+        future = Future()
+        self.queue.put((df, future))
+        return future
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def _next_batch(self) -> list:
+        item = self.queue.get()
+        if item is None:
+            return None
+        items = [item]
+        rows = len(item[0])
+        deadline = time.monotonic() + self.max_wait
+        while rows < self.max_batch_rows:
+            try:
+                item = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is None:
+                # Score what was collected, then stop
+                self.queue.put(None)
+                break
+            items.append(item)
+            rows += len(item[0])
+        return items
+
+    def _run(self):
+        while True:
+            items = self._next_batch()
+            if items is None:
+                return
+            try:
+                scores = score_batch(
+                    self.model, pd.concat([df for df, _ in items], ignore_index=True)
+                )
+            except Exception:
+                # Score the requests one by one so that a bad request only fails itself
+                for df, future in items:
+                    try:
+                        future.set_result(score_batch(self.model, df))
+                    except Exception as error:
+                        future.set_exception(error)
+                continue
+            self.batches_scored += 1
+            start = 0
+            for df, future in items:
+                future.set_result(scores.iloc[start : start + len(df)].reset_index(drop=True))
+                start += len(df)
+
+
+def scores_to_records(scores: pd.DataFrame) -> list:
+    """
+    Converts scores to JSON-serializable records, with None for invalid rows.
+    """
+    return [
+        {
+            "transcript_id": str(transcript_id),
+            "transcript_position": int(position),
+            "score": None if np.isnan(score) else float(score),
+        }
+        for transcript_id, position, score in zip(
+            scores["transcript_id"], scores["transcript_position"], scores["score"]
+        )
+    ]
+
+
+class ScoringHandler(BaseHTTPRequestHandler):
+    """
+    Handles scoring requests:
+
+    - `POST /score/lines` with raw m6Anet JSON lines as the body, which are
+      featurized by the handler before scoring.
+    - `POST /score/rows` with a JSON list of featurized rows (objects with the key
+      columns and the generated features).
+    - `GET /health`.
+
+    Both scoring endpoints answer with `{"scores": [...]}`, one record per site.
+    """
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, {"status": "ok"})
+        else:
+            self._send(404, {"error": f"Unknown path '{self.path}'"})
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+        try:
+            if self.path == "/score/lines":
+                lines = [line for line in body.splitlines() if line.strip()]
+                df = blocks_to_frame([featurize_chunk(lines, parse_row_features)])
+            elif self.path == "/score/rows":
+                df = pd.DataFrame(json.loads(body))
+            else:
+                self._send(404, {"error": f"Unknown path '{self.path}'"})
+                return
+            scores = self.server.batcher.submit(df).result()
+        except (ValueError, KeyError, TypeError, AttributeError) as error:
+            self._send(400, {"error": f"{type(error).__name__}: {error}"})
+            return
+        except Exception as error:
+            self._send(500, {"error": f"{type(error).__name__}: {error}"})
+            return
+        self._send(200, {"scores": scores_to_records(scores)})
+
+    def _send(self, status: int, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def create_server(
+    model_path: str = DEFAULT_MODEL_PATH,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    max_batch_rows: int = 4096,
+    max_wait: float = 0.005,
+    verbose: bool = False,
+) -> ThreadingHTTPServer:
+    """
+    Creates a scoring server that keeps the model loaded. Each request is handled on
+    its own thread, and the scoring of concurrent requests is combined by a
+    `MicroBatcher`.
+
+    Parameters
+    ----------
+    model_path : str
+        Path to the trained CatBoost model, loaded once.
+
+    host, port : str, int
+        Address to listen on. Port 0 picks a free port, see `server.server_address`.
+
+    max_batch_rows, max_wait
+        See `MicroBatcher`.
+
+    verbose : bool
+        Whether to log every request.
+
+    Returns
+    -------
+    server : ThreadingHTTPServer
+        The server, to be run with `serve_forever` and stopped with `shutdown` and
+        `server_close`.
+    """
+    server = ThreadingHTTPServer((host, port), ScoringHandler)
+    server.daemon_threads = True
+    server.verbose = verbose
+    server.batcher = MicroBatcher(load_model(model_path), max_batch_rows, max_wait)
+    return server
+
+
+def score_remote(lines: list, url: str = "http://127.0.0.1:8765") -> pd.DataFrame:
+    """
+    Sends raw m6Anet JSON lines to a running scoring server and returns their scores.
+    """
+    request = urllib.request.Request(
+        f"{url}/score/lines",
+        data="\n".join(line.strip() for line in lines).encode("utf-8"),
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    with urllib.request.urlopen(request) as response:
+        records = json.loads(response.read())["scores"]
+    return pd.DataFrame(records, columns=["transcript_id", "transcript_position", "score"])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve = subparsers.add_parser("serve", help="Run the scoring server")
+    serve.add_argument("--model", type=str, default=DEFAULT_MODEL_PATH, help="Path to the model file")
+    serve.add_argument("--host", type=str, default="127.0.0.1", help="Address to listen on")
+    serve.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    serve.add_argument(
+        "--max-batch-rows", type=int, default=4096, help="Rows after which a batch is scored"
+    )
+    serve.add_argument(
+        "--max-wait-ms", type=float, default=5, help="Time to wait for more requests per batch"
+    )
+    serve.add_argument("--verbose", action="store_true", help="Log every request")
+
+    score = subparsers.add_parser("score", help="Score a dataset with a running server")
+    score.add_argument("dataset_path", type=str, help="Path to the dataset file")
+    score.add_argument("output_name", type=str, help="Name of the output file")
+    score.add_argument("--url", type=str, default="http://127.0.0.1:8765", help="Server URL")
+    score.add_argument("--batch-size", type=int, default=1000, help="Lines sent per request")
+
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = create_server(
+            args.model,
+            args.host,
+            args.port,
+            max_batch_rows=args.max_batch_rows,
+            max_wait=args.max_wait_ms / 1000,
+            verbose=args.verbose,
+        )
+        print(f"Scoring server listening on http://{args.host}:{server.server_address[1]}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            server.batcher.close()
+        return
+
+    os.makedirs("output", exist_ok=True)
+    output_path = f"output/{args.output_name}.csv"
+    header = True
+    with open(output_path, "w") as f:
+        for lines in iter_batches(iter_json_lines(args.dataset_path), args.batch_size):
+            score_remote(lines, args.url).to_csv(f, header=header, index=False)
+            header = False
+    print(f"Processing complete, predictions saved to {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+import glob
+import math
+import os
+import pyarrow.parquet as pq
+
+from scripts.decode import ReadCap
+from scripts.engine import chunk_task, create_executor, write_blocks_parquet
+from scripts.feature_cache import CachedTask, FeatureCache
+from scripts.metrics import active_metrics, recorded, stage
+from scripts.read_store import is_read_store
+from scripts.streaming import iter_line_chunks, merge_sorted_files
+
+
+SHARD_PATTERNS = ["*.json", "*.json.gz"]
+
+
+def is_sharded(input_path: str) -> bool:
+    """
+    Checks whether an input path names several shards: a directory, other than a read
+    store, or a glob pattern.
+    """
+    if is_read_store(input_path):
+        return False
+    return os.path.isdir(input_path) or glob.has_magic(input_path)
+
+
+def resolve_shards(input_path: str) -> list:
+    """
+    Lists the input files named by a path: a single JSON or gzipped JSON (.json.gz)
+    file, a directory of such files, or a glob pattern.
+
+    Parameters
+    ----------
+    input_path : str
+        Path to a file or directory, or a glob pattern such as "data/*.json.gz".
+
+    Returns
+    -------
+    shards : list
+        The input files, in sorted order.
+    """
+    if os.path.isdir(input_path):
+        shards = [
+            path
+            for pattern in SHARD_PATTERNS
+            for path in glob.glob(os.path.join(input_path, pattern))
+        ]
+    elif glob.has_magic(input_path):
+        shards = glob.glob(input_path)
+    else:
+        shards = [input_path]
+
+    shards = sorted(path for path in shards if path.endswith((".json", ".json.gz")))
+    if not shards:
+        raise ValueError(f"No .json or .json.gz files found at '{input_path}'.")
+    return shards
+
+
+def split_byte_ranges(json_path: str, n_ranges: int) -> list:
+    """
+    Splits a plain JSON file into about `n_ranges` byte ranges of similar size whose
+    boundaries fall at the start of a line, so that every range can be read by an
+    independent reader.
+
+    Parameters
+    ----------
+    json_path : str
+        Path to the JSON file.
+
+    n_ranges : int
+        Number of ranges to aim for. Small files may give fewer ranges.
+
+    Returns
+    -------
+    ranges : list
+        (start, end) byte offsets, covering the whole file in order.
+    """
+    size = os.path.getsize(json_path)
+    boundaries = [0]
+    with open(json_path, "rb") as f:
+        for i in range(1, n_ranges):
+            f.seek(max(size * i // n_ranges - 1, boundaries[-1]))
+            f.readline()
+            boundaries.append(min(f.tell(), size))
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries[:-1], boundaries[1:]) if end > start]
+
+
+def _key_range(part_path: str) -> tuple:
+    # First and last (transcript id, position) of a sorted part file
+    parquet_file = pq.ParquetFile(part_path)
+    columns = ["transcript_id", "transcript_position"]
+    first = parquet_file.read_row_group(0, columns=columns).slice(0, 1).to_pylist()[0]
+    last = parquet_file.read_row_group(parquet_file.num_row_groups - 1, columns=columns)
+    last = last.slice(last.num_rows - 1).to_pylist()[0]
+    return (first["transcript_id"], first["transcript_position"]), (last["transcript_id"], last["transcript_position"])
+
+
+def merge_parts(dataset_path: str, compression: str = "snappy", row_group_size: int = None) -> bool:
+    """
+    Orders a directory of sorted part files globally. Parts that already follow each
+    other in order, e.g. shards of consecutive transcripts, are kept as they are.
+    Otherwise they are combined with a streaming k-way merge into a single sorted part
+    file, `part-00000.parquet`.
+
+    Returns
+    -------
+    merged : bool
+        Whether the parts had to be merged.
+    """
+    parts = sorted(glob.glob(os.path.join(dataset_path, "part-*.parquet")))
+    ranges = [_key_range(part) for part in parts if pq.ParquetFile(part).metadata.num_rows > 0]
+    if all(ranges[i][1] <= ranges[i + 1][0] for i in range(len(ranges) - 1)):
+        return False
+
+    print(f"Merging {len(parts)} sorted parts...")
+    merged_path = os.path.join(dataset_path, "merged.parquet.tmp")
+    with stage("sort"):
+        merge_sorted_files(parts, merged_path, compression=compression, row_group_size=row_group_size)
+    for part in parts:
+        os.remove(part)
+    os.replace(merged_path, os.path.join(dataset_path, "part-00000.parquet"))
+    return True
+
+
+def featurize_part(
+    json_path: str,
+    start: int,
+    end: int,
+    part_path: str,
+    row_parser,
+    chunk_size: int = 1000,
+    featurizer: str = "site",
+    features: list = None,
+    read_cap: ReadCap = None,
+    cache_dir: str = None,
+    sort: bool = True,
+    transform=None,
+    compression: str = "snappy",
+    row_group_size: int = None,
+) -> int:
+    """
+    Reads a byte range of an input file on its own, featurizes it chunk by chunk and
+    writes it to a Parquet part file. Runs as a single task on an executor.
+
+    Parameters
+    ----------
+    json_path : str
+        Path to the JSON or gzipped JSON (.json.gz) file.
+
+    start, end : int
+        Byte range to read, see `streaming.iter_line_chunks`. `end` may be None to
+        read until the end of the file.
+
+    part_path : str
+        Path of the Parquet part file to write.
+
+    row_parser, chunk_size, featurizer, features, read_cap, cache_dir, sort,
+    transform, compression, row_group_size
+        See `parse_sharded`.
+
+    Returns
+    -------
+    rows_written : int
+        Number of rows written to the part file.
+    """
+    task = chunk_task(featurizer, row_parser, features, read_cap)
+    chunks = (lines for _, _, lines in iter_line_chunks(json_path, chunk_size, start, end))
+    if cache_dir is not None:
+        cache = FeatureCache(cache_dir, featurizer, row_parser, features, read_cap)
+        task = CachedTask(cache, task)
+        chunks = cache.keyed(chunks)
+    blocks = (task(chunk) for chunk in chunks)
+    return write_blocks_parquet(
+        blocks,
+        part_path,
+        sort=sort,
+        transform=transform,
+        compression=compression,
+        row_group_size=row_group_size,
+    )
+
+
+def parse_sharded(
+    input_path: str,
+    dataset_path: str,
+    row_parser,
+    backend: str = "thread",
+    workers: int = None,
+    chunk_size: int = 1000,
+    featurizer: str = "site",
+    features: list = None,
+    read_cap: ReadCap = None,
+    cache_dir: str = None,
+    sort: bool = True,
+    transform=None,
+    compression: str = "snappy",
+    row_group_size: int = None,
+) -> int:
+    """
+    Featurizes a dataset with independent readers and writes it as a directory of
+    Parquet part files, which pandas and pyarrow read as a single table.
+
+    Plain .json inputs are split into line-aligned byte ranges, so that every worker
+    reads its own range directly instead of waiting on a single reader. Gzipped shards
+    cannot be split and are read whole, one worker per shard. Part files follow the
+    input order. With `sort`, every part is sorted and the parts are then ordered
+    globally with `merge_parts`, so the directory reads as one sorted table.
+
+    Parameters
+    ----------
+    input_path : str
+        A JSON or gzipped JSON (.json.gz) file, a directory of such files, or a glob
+        pattern, see `resolve_shards`.
+
+    dataset_path : str
+        Directory in which the part files are written. Part files left there by an
+        earlier run are removed.
+
+    row_parser : callable
+        Function turning a decoded JSON row into a list of keys and features.
+
+    backend : str
+        Execution backend, "thread" or "process". With the process backend,
+        `row_parser` and `transform` must be picklable.
+
+    workers : int
+        Number of workers, see `engine.create_executor`.
+
+    chunk_size : int
+        Number of lines featurized at a time by a worker.
+
+    featurizer : str
+        "site" or "ragged", see `engine.featurize_chunks`.
+
+    features : list
+        Optional selection of generated features, see `site_features.feature_mask`.
+
+    read_cap : decode.ReadCap
+        Optional cap on the number of reads featurized per site, see `decode.ReadCap`.
+
+    cache_dir : str
+        Optional directory of a `feature_cache.FeatureCache`.
+
+    sort : bool
+        Whether to order the rows of the dataset by transcript id and position.
+
+    transform : callable
+        Optional function applied to each batch's DataFrame before it is written,
+        see `engine.write_blocks_parquet`.
+
+    compression : str
+        Parquet compression codec, one of `streaming.COMPRESSION_CODECS`.
+
+    row_group_size : int
+        Maximum number of rows per row group.
+
+    Returns
+    -------
+    rows_written : int
+        Number of rows written to all part files.
+    """
+    shards = resolve_shards(input_path)
+    executor, workers = create_executor(backend, workers)
+
+    ranges = []
+    n_plain = sum(1 for shard in shards if shard.endswith(".json"))
+    for shard in shards:
+        if shard.endswith(".json"):
+            n_ranges = math.ceil(workers / n_plain)
+            ranges.extend((shard, start, end) for start, end in split_byte_ranges(shard, n_ranges))
+        else:
+            ranges.append((shard, 0, None))
+
+    os.makedirs(dataset_path, exist_ok=True)
+    for stale_part in glob.glob(os.path.join(dataset_path, "part-*.parquet")):
+        os.remove(stale_part)
+
+    print(f"Processing {len(shards)} input files as {len(ranges)} parts on {workers} workers")
+    metrics = active_metrics()
+    with executor:
+        futures = [
+            executor.submit(
+                recorded,
+                featurize_part,
+                shard,
+                start,
+                end,
+                os.path.join(dataset_path, f"part-{i:05d}.parquet"),
+                row_parser,
+                chunk_size=chunk_size,
+                featurizer=featurizer,
+                features=features,
+                read_cap=read_cap,
+                cache_dir=cache_dir,
+                sort=sort,
+                transform=transform,
+                compression=compression,
+                row_group_size=row_group_size,
+            )
+            for i, (shard, start, end) in enumerate(ranges)
+        ]
+        rows_written = 0
+        for i, future in enumerate(futures):
+            part_rows, recorder = future.result()
+            rows_written += part_rows
+            if metrics is not None:
+                metrics.merge(recorder)
+            print(f"Finished part {i + 1}/{len(ranges)}")
+
+    if sort and rows_written > 0:
+        merge_parts(dataset_path, compression=compression, row_group_size=row_group_size)
+    return rows_written
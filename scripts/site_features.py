@@ -0,0 +1,139 @@
+import numpy as np
+
+from scripts.metrics import stage
+from scripts.streaming import KEY_COLUMNS, FEATURE_COLUMNS, feature_columns
+from scripts.two_means import two_means
+
+
+AGGREGATES = ["mean", "median", "max", "min", "sd"]
+DATA_RANGES = ["whole", "cluster_1", "cluster_2"]
+
+
+def feature_mask(features: list) -> np.ndarray:
+    """
+    Marks which statistics a feature list needs, so that a featurizer can skip the
+    others. Only the "ragged" featurizer accepts a selection of features, and the
+    features that are not selected are left empty.
+
+    Parameters
+    ----------
+    features : list
+        Names of generated features, e.g. loaded from `data/features_reduced.json`.
+
+    Returns
+    -------
+    mask : np.ndarray
+        A boolean array of shape (3, 5, 9) indexed by data range (`DATA_RANGES`),
+        aggregate (`AGGREGATES`) and read column, in the layout of `feature_columns`.
+    """
+    unknown = [feature for feature in features if feature not in FEATURE_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown features {unknown[:5]}. Please use generated feature names.")
+    columns = feature_columns()[len(KEY_COLUMNS):]
+    mask = np.zeros(len(columns), dtype=bool)
+    mask[[columns.index(feature) for feature in features]] = True
+    return mask.reshape(len(DATA_RANGES), len(AGGREGATES), -1)
+
+
+def fused_site_features(array: np.ndarray, labels: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """
+    Computes the mean, median, max, min and standard deviation of every column for the
+    whole set and for both clusters in a single pass over the reads.
+
+    Each column is argsorted once; the sorted values give the median, min and max of the
+    whole set, and masking the sorted order by label gives the sorted values of each
+    cluster without sorting again. Means and variances come from per-cluster sums, and
+    the whole-set variance is combined from the cluster variances.
+
+    The layout matches `generate_features` applied to the whole set, cluster 1 (label 0)
+    and cluster 2 (label 1) in turn. If cluster 2 is empty it takes the statistics of
+    cluster 1, as in `cluster_samples`.
+
+    Parameters
+    ----------
+    array : np.ndarray
+        A 2D NumPy array of shape (n_reads, n_features) with at least one read.
+
+    labels : np.ndarray
+        Cluster label (0 or 1) of every read, with label 0 non-empty.
+
+    out : np.ndarray
+        Optional preallocated float32 array of length 15 * n_features to write into.
+
+    Returns
+    -------
+    row : np.ndarray
+        A 1D float32 array with the 15 * n_features features of the site.
+    """
+    array = np.asarray(array, dtype=np.float64)
+    labels = np.asarray(labels)
+    n_reads, n_features = array.shape
+    if out is None:
+        out = np.empty(15 * n_features, dtype=np.float32)
+    blocks = out.reshape(3, 5, n_features)
+
+    order = np.argsort(array, axis=0, kind="stable")
+    sorted_values = np.take_along_axis(array, order, axis=0)
+    sorted_labels = labels[order]
+
+    in_cluster_2 = labels == 1
+    counts = np.array([n_reads - in_cluster_2.sum(), in_cluster_2.sum()])
+    sums = np.stack((array[~in_cluster_2].sum(axis=0), array[in_cluster_2].sum(axis=0)))
+    means = sums / np.maximum(counts, 1)[:, None]
+    deviations = (array - means[labels.astype(np.int64)]) ** 2
+    squares = np.stack(
+        (deviations[~in_cluster_2].sum(axis=0), deviations[in_cluster_2].sum(axis=0))
+    )
+
+    whole_mean = sums.sum(axis=0) / n_reads
+    whole_var = (
+        squares.sum(axis=0) + np.sum(counts[:, None] * (means - whole_mean) ** 2, axis=0)
+    ) / n_reads
+    _fill_block(blocks[0], sorted_values, whole_mean, whole_var)
+
+    for cluster in (0, 1):
+        n_cluster = counts[cluster]
+        if n_cluster == 0:
+            blocks[2] = blocks[1]
+            continue
+        cluster_sorted = sorted_values.T[(sorted_labels == cluster).T].reshape(n_features, n_cluster).T
+        _fill_block(blocks[1 + cluster], cluster_sorted, means[cluster], squares[cluster] / n_cluster)
+
+    return out
+
+
+def _fill_block(block: np.ndarray, sorted_values: np.ndarray, mean: np.ndarray, var: np.ndarray):
+    n = len(sorted_values)
+    block[0] = mean
+    block[1] = (sorted_values[(n - 1) // 2] + sorted_values[n // 2]) / 2
+    block[2] = sorted_values[-1]
+    block[3] = sorted_values[0]
+    block[4] = np.sqrt(var)
+
+
+def featurize_site(array: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """
+    Clusters the reads of a site with `two_means` and generates the whole set and
+    cluster features with `fused_site_features`. Sites with a single read use the
+    whole set features for both clusters.
+
+    Parameters
+    ----------
+    array : np.ndarray
+        A 2D NumPy array of shape (n_reads, n_features) with at least one read.
+
+    out : np.ndarray
+        Optional preallocated float32 array of length 15 * n_features to write into.
+
+    Returns
+    -------
+    row : np.ndarray
+        A 1D float32 array with the 15 * n_features features of the site.
+    """
+    with stage("cluster"):
+        if len(array) >= 2:
+            labels = two_means(array)
+        else:
+            labels = np.zeros(len(array), dtype=np.int64)
+    with stage("aggregate"):
+        return fused_site_features(array, labels, out=out)
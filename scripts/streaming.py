@@ -0,0 +1,700 @@
+import gzip
+import json
+import os
+from collections import deque
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from scripts.metrics import stage
+
+
+KEY_COLUMNS = ["transcript_id", "transcript_position", "seq"]
+# Original number of reads of every site, added when reads are capped while parsing.
+# It describes the input rather than the site and is never a model input.
+READ_COUNT_COLUMN = "n_reads"
+
+
+def feature_columns() -> list:
+    """
+    Builds the column layout of a parsed dataset: the three key columns followed
+    by the 135 generated features.
+
+    Returns
+    -------
+    columns : list
+        Column names in the order produced by `parse_row`.
+    """
+    columns = list(KEY_COLUMNS)
+    values = [
+        "dt_1",
+        "sd_1",
+        "curr_1",
+        "dt_2",
+        "sd_2",
+        "curr_2",
+        "dt_3",
+        "sd_3",
+        "curr_3",
+    ]
+
+    for data_range in ["whole", "cluster_1", "cluster_2"]:
+        for aggregate in ["mean", "median", "max", "min", "sd"]:
+            for val in values:
+                columns.append(f"{data_range}_{aggregate}_{val}")
+
+    return columns
+
+
+FEATURE_COLUMNS = set(feature_columns()[len(KEY_COLUMNS):])
+
+
+def iter_json_lines(json_path: str):
+    """
+    Lazily yields the non-empty lines of a JSON or gzipped JSON (.json.gz) file,
+    so that only one line is held in memory at a time.
+
+    Parameters
+    ----------
+    json_path : str
+        Path to the JSON or gzipped JSON (.json.gz) file that contains the input data.
+
+    Yields
+    ------
+    line : str
+        A single line of JSON data.
+    """
+    if json_path.endswith(".gz"):
+        f = gzip.open(json_path, "rt")
+    elif json_path.endswith(".json"):
+        f = open(json_path, "r")
+    else:
+        raise ValueError("File format not supported. Please provide a .json or .json.gz file.")
+
+    with f:
+        for line in f:
+            if line.strip():
+                yield line
+
+
+def iter_line_chunks(json_path: str, chunk_size: int, start: int = 0, end: int = None):
+    """
+    Lazily reads a JSON or gzipped JSON (.json.gz) file in chunks of non-empty lines,
+    recording the byte range covered by every chunk so that reading can later be
+    resumed from the end of any chunk, or restricted to a byte range of the file.
+
+    Offsets of gzipped files refer to the decompressed data. Seeking into a gzipped
+    file decompresses everything before the offset, which is still far cheaper than
+    featurizing it again.
+
+    Parameters
+    ----------
+    json_path : str
+        Path to the JSON or gzipped JSON (.json.gz) file that contains the input data.
+
+    chunk_size : int
+        Maximum number of lines per chunk.
+
+    start : int
+        Byte offset at which to start reading. It must be at the start of a line.
+
+    end : int
+        Byte offset at which to stop reading. Lines starting before `end` are read
+        in full. Defaults to the end of the file.
+
+    Yields
+    ------
+    start : int
+        Byte offset of the first line of the chunk.
+
+    end : int
+        Byte offset just after the last line of the chunk.
+
+    lines : list
+        The lines of the chunk.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be a positive integer.")
+    if json_path.endswith(".gz"):
+        f = gzip.open(json_path, "rb")
+    elif json_path.endswith(".json"):
+        f = open(json_path, "rb")
+    else:
+        raise ValueError("File format not supported. Please provide a .json or .json.gz file.")
+
+    with f:
+        f.seek(start)
+        offset = start
+        lines = []
+        for line in f:
+            if end is not None and offset >= end:
+                break
+            offset += len(line)
+            if line.strip():
+                lines.append(line.decode("utf-8"))
+            if len(lines) == chunk_size:
+                yield start, offset, lines
+                start = offset
+                lines = []
+        if lines:
+            yield start, offset, lines
+
+
+def iter_batches(iterable, batch_size: int):
+    """
+    Groups an iterable into lists of at most `batch_size` items.
+
+    Parameters
+    ----------
+    iterable : iterable
+        Items to be grouped.
+
+    batch_size : int
+        Maximum number of items per batch.
+
+    Yields
+    ------
+    batch : list
+        The next batch of items.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be a positive integer.")
+
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def bounded_map(executor, fn, iterable, max_pending: int):
+    """
+    Maps `fn` over `iterable` on an executor, keeping at most `max_pending` tasks
+    in flight. The iterable is only advanced when a slot frees up, which applies
+    backpressure to the reader. Results are yielded in input order.
+
+    Parameters
+    ----------
+    executor : concurrent.futures.Executor
+        Executor on which the tasks are run.
+
+    fn : callable
+        Function applied to every item.
+
+    iterable : iterable
+        Items to be processed.
+
+    max_pending : int
+        Maximum number of submitted tasks whose results have not been yielded yet.
+
+    Yields
+    ------
+    result : object
+        The result of `fn` for the next item, in input order.
+    """
+    pending = deque()
+    for item in iterable:
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+        pending.append(executor.submit(fn, item))
+    while pending:
+        yield pending.popleft().result()
+
+
+COMPRESSION_CODECS = ["snappy", "zstd", "gzip", "lz4", "brotli", "none"]
+
+
+def frame_schema(df: pd.DataFrame) -> pa.Schema:
+    """
+    Derives the compact Arrow schema of a parsed dataset frame: dictionary-encoded
+    transcript ids and k-mers, int32 positions and float32 features. Key and feature
+    columns get explicit types so that batches with missing values share one schema.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        A batch of parsed rows, optionally merged with label columns.
+
+    Returns
+    -------
+    schema : pa.Schema
+        The schema used for every row group of the output file.
+    """
+    inferred = pa.Schema.from_pandas(df, preserve_index=False)
+    fields = []
+    for field in inferred:
+        if field.name in ("transcript_id", "seq"):
+            fields.append(pa.field(field.name, pa.dictionary(pa.int32(), pa.string())))
+        elif field.name in ("transcript_position", READ_COUNT_COLUMN):
+            fields.append(pa.field(field.name, pa.int32()))
+        elif field.name in FEATURE_COLUMNS:
+            fields.append(pa.field(field.name, pa.float32()))
+        else:
+            fields.append(field)
+    return pa.schema(fields)
+
+
+def to_compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts a parsed dataset frame to the compact dtypes of `frame_schema`:
+    categorical transcript ids and k-mers, int32 positions and float32 features.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        A parsed dataset frame, optionally merged with label columns.
+
+    Returns
+    -------
+    df : pd.DataFrame
+        The frame with compact dtypes.
+    """
+    dtypes = {}
+    for column in df.columns:
+        if column in ("transcript_id", "seq"):
+            dtypes[column] = "category"
+        elif column in ("transcript_position", READ_COUNT_COLUMN):
+            dtypes[column] = np.int32
+    # Features are converted as one block, so the frame is not split into one block per column
+    features = [column for column in df.columns if column in FEATURE_COLUMNS]
+    compact = pd.concat(
+        [
+            df.drop(columns=features).astype(dtypes),
+            pd.DataFrame(df[features].to_numpy(np.float32), columns=features, index=df.index),
+        ],
+        axis=1,
+    )
+    if list(compact.columns) != list(df.columns):
+        compact = compact[list(df.columns)]
+    return compact
+
+
+def write_parquet(
+    df: pd.DataFrame, output_path: str, compression: str = "snappy", row_group_size: int = None
+):
+    """
+    Writes a parsed dataset frame to Parquet with the compact schema of `frame_schema`.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        A parsed dataset frame, optionally merged with label columns.
+
+    output_path : str
+        Path of the Parquet file to write.
+
+    compression : str
+        Parquet compression codec, one of `COMPRESSION_CODECS`.
+
+    row_group_size : int
+        Maximum number of rows per row group. Defaults to the pyarrow default.
+    """
+    with stage("write"):
+        table = pa.Table.from_pandas(
+            to_compact_frame(df), schema=frame_schema(df), preserve_index=False
+        )
+        pq.write_table(
+            table,
+            output_path,
+            compression=_codec(compression),
+            row_group_size=row_group_size,
+        )
+
+
+def parquet_to_csv(parquet_path: str, csv_path: str, batch_size: int = 65536, index: bool = False):
+    """
+    Converts a Parquet file, or a directory of Parquet part files, to CSV one batch
+    at a time.
+
+    Parameters
+    ----------
+    parquet_path : str
+        Path of the Parquet file or dataset directory to read.
+
+    csv_path : str
+        Path of the CSV file to write.
+
+    batch_size : int
+        Number of rows converted at a time.
+
+    index : bool
+        Whether to start every row with its row number in an unnamed column, the
+        layout of `DataFrame.to_csv` with the default index.
+    """
+    dataset = ds.dataset(parquet_path, format="parquet")
+    rows_written = 0
+    with open(csv_path, "w") as f:
+        for batch in dataset.to_batches(batch_size=batch_size):
+            df = batch.to_pandas()
+            df.index = pd.RangeIndex(rows_written, rows_written + len(df))
+            df.to_csv(f, header=rows_written == 0, index=index)
+            rows_written += len(df)
+
+
+def write_predictions(batches, output_path: str, index: bool = False) -> tuple:
+    """
+    Appends batches of scores to a CSV or Parquet (.parquet) file as they arrive.
+
+    Parameters
+    ----------
+    batches : iterable of pd.DataFrame
+        Batches of scores.
+
+    output_path : str
+        Path of the CSV or Parquet (.parquet) file to write.
+
+    index : bool
+        Whether to start every CSV row with its row number in an unnamed column, the
+        layout of `DataFrame.to_csv` with the default index.
+
+    Returns
+    -------
+    rows_written : int
+        Number of rows written.
+
+    invalid_rows : int
+        Number of rows missing a score in any of the score columns.
+    """
+    rows_written = 0
+    invalid_rows = 0
+    writer = None
+    f = None if output_path.endswith(".parquet") else open(output_path, "w")
+    try:
+        for df in batches:
+            df = df.astype({"transcript_id": str})
+            if f is not None:
+                df.index = pd.RangeIndex(rows_written, rows_written + len(df))
+                df.to_csv(f, header=rows_written == 0, index=index)
+            else:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(output_path, table.schema)
+                writer.write_table(table)
+            rows_written += len(df)
+            invalid_rows += int(df.filter(like="score").isna().any(axis=1).sum())
+    finally:
+        if f is not None:
+            f.close()
+        if writer is not None:
+            writer.close()
+    return rows_written, invalid_rows
+
+
+def iter_parquet_frames(parquet_path: str, columns: list = None, batch_size: int = 65536):
+    """
+    Reads a Parquet file, or a directory of Parquet part files, one batch at a time.
+
+    Parameters
+    ----------
+    parquet_path : str
+        Path of the Parquet file or dataset directory to read.
+
+    columns : list
+        Columns to read. Defaults to all columns.
+
+    batch_size : int
+        Maximum number of rows per batch.
+
+    Yields
+    ------
+    df : pd.DataFrame
+        The next non-empty batch of rows.
+    """
+    dataset = ds.dataset(parquet_path, format="parquet")
+    for batch in dataset.to_batches(columns=columns, batch_size=batch_size):
+        if batch.num_rows > 0:
+            yield batch.to_pandas()
+
+
+def read_feature_list(features_path: str) -> list:
+    """
+    Loads a JSON list of generated feature names, such as
+    "data/features_reduced.json", and checks that every name is a generated feature.
+    """
+    with open(features_path, "r") as f:
+        features = json.load(f)
+    unknown = [feature for feature in features if feature not in FEATURE_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown features {unknown[:5]} in '{features_path}'.")
+    return features
+
+
+def read_parsed_dataset(
+    parquet_path: str, features: list = None, columns: list = None
+) -> pd.DataFrame:
+    """
+    Reads a parsed Parquet file or dataset directory, decoding only the columns that
+    are needed instead of all 138.
+
+    Parameters
+    ----------
+    parquet_path : str
+        Path of the Parquet file or dataset directory to read.
+
+    features : list
+        Generated features to read, e.g. loaded with `read_feature_list`. Defaults to
+        all of them.
+
+    columns : list
+        Other columns to read, e.g. `["label"]`. Defaults to `KEY_COLUMNS`.
+
+    Returns
+    -------
+    df : pd.DataFrame
+        `columns` followed by `features`.
+    """
+    if columns is None:
+        columns = KEY_COLUMNS
+    if features is None:
+        features = feature_columns()[len(KEY_COLUMNS):]
+    return pd.read_parquet(parquet_path, columns=list(columns) + list(features))
+
+
+def _codec(compression: str):
+    if compression not in COMPRESSION_CODECS:
+        raise ValueError(
+            f"Unknown compression codec '{compression}'. Please use one of {COMPRESSION_CODECS}."
+        )
+    return None if compression == "none" else compression
+
+
+class ParquetStreamWriter:
+    """
+    Writes DataFrame batches to a single Parquet file with the compact schema of
+    `frame_schema`, one row group per batch, so the full dataset never needs to be
+    held in memory.
+
+    Parameters
+    ----------
+    output_path : str
+        Path of the Parquet file to create.
+
+    compression : str
+        Parquet compression codec, one of `COMPRESSION_CODECS`.
+
+    row_group_size : int
+        Maximum number of rows per row group. Larger batches are split.
+    """
+
+    def __init__(self, output_path: str, compression: str = "snappy", row_group_size: int = None):
+        self.output_path = output_path
+        self.compression = _codec(compression)
+        self.row_group_size = row_group_size
+        self.schema = None
+        self.writer = None
+        self.rows_written = 0
+
+    def write_frame(self, df: pd.DataFrame):
+        with stage("write"):
+            if self.writer is None:
+                self.schema = frame_schema(df)
+                self.writer = pq.ParquetWriter(
+                    self.output_path, self.schema, compression=self.compression
+                )
+            table = pa.Table.from_pandas(
+                to_compact_frame(df), schema=self.schema, preserve_index=False
+            )
+            self.writer.write_table(table, row_group_size=self.row_group_size)
+        self.rows_written += len(df)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+
+MERGE_FAN_IN = 64
+
+
+def _iter_run(parquet_file: pq.ParquetFile, row_groups: list, batch_size: int):
+    # Yields the non-empty batches of a sorted run, spanning one or more row groups,
+    # with their transcript ids and positions as numpy arrays
+    for batch in parquet_file.iter_batches(batch_size=batch_size, row_groups=row_groups):
+        if batch.num_rows == 0:
+            continue
+        transcript_ids = batch.column("transcript_id")
+        if pa.types.is_dictionary(transcript_ids.type):
+            transcript_ids = transcript_ids.dictionary_decode()
+        yield (
+            pa.Table.from_batches([batch]),
+            transcript_ids.to_numpy(zero_copy_only=False).astype(str),
+            batch.column("transcript_position").to_numpy(zero_copy_only=False),
+        )
+
+
+def _merge_runs(runs: list, writer: pq.ParquetWriter, batch_size: int, row_group_size: int) -> int:
+    """
+    Merges sorted runs, (Parquet file, row groups) pairs, one window at a time and
+    writes them in row groups of `row_group_size` rows. One batch of every run is buffered; all buffered
+    rows up to the smallest last key of the buffers can be written, as no later row
+    of any run sorts before it. They are ordered with a single lexsort and take, and
+    the buffer that ended at that key is refilled. Returns the number of row groups
+    written.
+    """
+    iterators = [_iter_run(parquet_file, row_groups, batch_size) for parquet_file, row_groups in runs]
+    buffers = [next(iterator, None) for iterator in iterators]
+    pending = []
+    pending_rows = 0
+    row_groups = 0
+    while True:
+        live = [i for i, buffer in enumerate(buffers) if buffer is not None]
+        if not live:
+            break
+        bound_id, bound_position = min((buffers[i][1][-1], buffers[i][2][-1]) for i in live)
+
+        tables, ids, positions = [], [], []
+        for i in live:
+            table, run_ids, run_positions = buffers[i]
+            n = int(np.count_nonzero(
+                (run_ids < bound_id) | ((run_ids == bound_id) & (run_positions <= bound_position))
+            ))
+            if n == 0:
+                continue
+            tables.append(table.slice(0, n))
+            ids.append(run_ids[:n])
+            positions.append(run_positions[:n])
+            if n == len(run_ids):
+                buffers[i] = next(iterators[i], None)
+            else:
+                buffers[i] = (table.slice(n), run_ids[n:], run_positions[n:])
+
+        order = np.lexsort((np.concatenate(positions), np.concatenate(ids)))
+        pending.append(pa.concat_tables(tables).take(order))
+        pending_rows += len(order)
+        while pending_rows >= row_group_size:
+            table = pa.concat_tables(pending)
+            writer.write_table(table.slice(0, row_group_size), row_group_size=row_group_size)
+            row_groups += 1
+            pending = [table.slice(row_group_size)]
+            pending_rows -= row_group_size
+    if pending_rows:
+        writer.write_table(pa.concat_tables(pending), row_group_size=row_group_size)
+        row_groups += 1
+    return row_groups
+
+
+def _merge_passes(
+    runs: list,
+    schema: pa.Schema,
+    output_path: str,
+    batch_size: int,
+    compression: str,
+    row_group_size: int,
+    max_fan_in: int,
+) -> int:
+    # Merges (Parquet file, row groups) runs into `output_path`, at most `max_fan_in`
+    # at a time, through temporary files next to it. Returns the number of passes.
+    if max_fan_in < 2:
+        raise ValueError(f"The merge fan-in must be at least 2, got {max_fan_in}.")
+    codec = _codec(compression)
+    passes = 0
+    pass_path = None
+    try:
+        while len(runs) > max_fan_in:
+            next_path = f"{output_path}.pass{passes}"
+            next_groups = []
+            with pq.ParquetWriter(next_path, schema, compression=codec) as writer:
+                for start in range(0, len(runs), max_fan_in):
+                    first = sum(len(groups) for groups in next_groups)
+                    n_groups = _merge_runs(runs[start:start + max_fan_in], writer, batch_size, batch_size)
+                    next_groups.append(list(range(first, first + n_groups)))
+            if pass_path is not None:
+                os.remove(pass_path)
+            pass_path = next_path
+            parquet_file = pq.ParquetFile(pass_path)
+            runs = [(parquet_file, groups) for groups in next_groups]
+            passes += 1
+
+        with pq.ParquetWriter(output_path, schema, compression=codec) as writer:
+            _merge_runs(runs, writer, batch_size, row_group_size or batch_size)
+    finally:
+        if pass_path is not None and os.path.exists(pass_path):
+            os.remove(pass_path)
+    return passes + 1
+
+
+def merge_sorted_runs(
+    run_path: str,
+    output_path: str,
+    batch_size: int = 1024,
+    compression: str = "snappy",
+    row_group_size: int = None,
+    max_fan_in: int = MERGE_FAN_IN,
+) -> int:
+    """
+    Merges the row groups of a Parquet file, each already sorted by transcript id and
+    position, into a single sorted Parquet file.
+
+    At most `max_fan_in` runs are merged at a time, each read `batch_size` rows at a
+    time and merged in columnar windows (see `_merge_runs`), so memory is bounded by
+    `max_fan_in` times `batch_size` rows, plus one output row group, whatever the
+    number of row groups. Files with more row groups are merged in several passes
+    through temporary files next to `output_path`.
+
+    Parameters
+    ----------
+    run_path : str
+        Parquet file whose row groups are individually sorted.
+
+    output_path : str
+        Path of the merged Parquet file to write.
+
+    batch_size : int
+        Number of rows read from each run at a time.
+
+    compression : str
+        Parquet compression codec of the merged file, one of `COMPRESSION_CODECS`.
+
+    row_group_size : int
+        Number of rows per row group of the merged file. Defaults to `batch_size`.
+
+    max_fan_in : int
+        Maximum number of runs merged at a time, at least 2.
+
+    Returns
+    -------
+    passes : int
+        Number of merge passes over the data.
+    """
+    parquet_file = pq.ParquetFile(run_path)
+    runs = [(parquet_file, [row_group]) for row_group in range(parquet_file.num_row_groups)]
+    return _merge_passes(
+        runs, parquet_file.schema_arrow, output_path, batch_size, compression, row_group_size, max_fan_in
+    )
+
+
+def merge_sorted_files(
+    paths: list,
+    output_path: str,
+    batch_size: int = 1024,
+    compression: str = "snappy",
+    row_group_size: int = None,
+    max_fan_in: int = MERGE_FAN_IN,
+) -> int:
+    """
+    Merges Parquet files with the same schema, each already sorted by transcript id
+    and position, into a single sorted Parquet file. Every file is a single run, see
+    `merge_sorted_runs` for the parameters and the memory bound.
+
+    Returns
+    -------
+    passes : int
+        Number of merge passes over the data.
+    """
+    files = [pq.ParquetFile(path) for path in paths]
+    runs = [(parquet_file, list(range(parquet_file.num_row_groups))) for parquet_file in files]
+    return _merge_passes(
+        runs, files[0].schema_arrow, output_path, batch_size, compression, row_group_size, max_fan_in
+    )
@@ -0,0 +1,250 @@
+import numpy as np
+
+# The features the models were trained on were clustered with
+# KMeans(n_clusters=2, random_state=0) of scikit-learn 1.3, which runs 10 k-means++
+# initializations and stops Lloyd iterations at a relative tolerance of 1e-4
+N_INIT = 10
+RANDOM_STATE = 0
+TOL = 1e-4
+
+
+def _sq_distances(centers: np.ndarray, x: np.ndarray, x_norms: np.ndarray, subscripts: str) -> np.ndarray:
+    # Squared distances in the expanded form of sklearn's euclidean_distances
+    distances = -2 * np.einsum(subscripts, x, centers)
+    distances += np.expand_dims(np.einsum("...f,...f->...", centers, centers), -1)
+    distances += x_norms
+    return np.maximum(distances, 0, out=distances)
+
+
+def _kmeans_plusplus(x: np.ndarray, x_norms: np.ndarray, draws: np.ndarray) -> np.ndarray:
+    """
+    Seeds the two centers of every site for every initialization with greedy
+    k-means++, as `sklearn.cluster.kmeans_plusplus` does with 2 local trials.
+
+    Every initialization of a `RandomState` draws three uniform numbers, `draws[i]`,
+    whatever the data: one picks the first center and two pick the candidates for
+    the second.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Array of shape (n_sites, n_reads, n_features), the reads of sites with the
+        same number of reads.
+
+    x_norms : np.ndarray
+        Array of shape (n_sites, n_reads), the squared norms of the reads.
+
+    draws : np.ndarray
+        Array of shape (n_init, 3) of uniform numbers.
+
+    Returns
+    -------
+    centers : np.ndarray
+        Array of shape (n_init, n_sites, 2, n_features), the initial centers.
+    """
+    n_sites, n_reads, _ = x.shape
+    # RandomState.choice(n, p=uniform weights) searches the cumulative weights
+    cdf = np.cumsum(np.full(n_reads, 1.0 / n_reads))
+    cdf /= cdf[-1]
+    first = x[:, np.searchsorted(cdf, draws[:, 0], side="right")].transpose(1, 0, 2)
+    closest = _sq_distances(first, x, x_norms, "mnf,kmf->kmn")
+
+    targets = draws[:, None, 1:] * closest.sum(axis=2)[..., None]
+    cumulative = np.cumsum(closest, axis=2)
+    candidates = np.minimum((cumulative[:, :, None, :] < targets[..., None]).sum(axis=3), n_reads - 1)
+    candidate_centers = x[np.arange(n_sites)[:, None], candidates]
+    candidate_distances = np.minimum(
+        closest[:, :, None, :], _sq_distances(candidate_centers, x, x_norms[:, None], "mnf,kmjf->kmjn")
+    )
+    best = np.argmin(candidate_distances.sum(axis=3), axis=2)
+    second = np.take_along_axis(candidate_centers, best[..., None, None], axis=2)[:, :, 0]
+    return np.stack((first, second), axis=2)
+
+
+def _assign(x: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    # Nearest of the two centers of every read, the first on ties
+    scores = np.einsum("mjf,mjf->mj", centers, centers)[:, None, :] - 2 * (x @ centers.transpose(0, 2, 1))
+    return scores[..., 1] < scores[..., 0]
+
+
+def _lloyd(x: np.ndarray, centers: np.ndarray, tol: np.ndarray, max_iter: int) -> tuple:
+    """
+    Runs Lloyd's algorithm on sites with the same number of reads with the stopping
+    rules of sklearn's `_kmeans_single_lloyd`: a site stops when no label changes,
+    or when the squared center shift is at most `tol`, after which its reads are
+    assigned once more. An emptied cluster is moved to the read farthest from its
+    center.
+
+    Returns
+    -------
+    labels : np.ndarray
+        Boolean array of shape (n_sites, n_reads), whether every read is in cluster 1.
+
+    inertia : np.ndarray
+        Sum of squared distances of the reads of every site to their centers.
+    """
+    n_sites, n_reads, _ = x.shape
+    centers = centers.copy()
+    labels = np.zeros((n_sites, n_reads), dtype=bool)
+    reassign = np.zeros(n_sites, dtype=bool)
+    # Converged sites are only dropped from the working set once it halves
+    rows = np.arange(n_sites)
+    live = np.ones(n_sites, dtype=bool)
+    working = x
+    for iteration in range(max_iter):
+        new_labels = _assign(working, centers[rows])
+        one_hot = np.stack((~new_labels, new_labels), axis=1).astype(np.float64)
+        sums = one_hot @ working
+        counts_1 = new_labels.sum(axis=1)
+        cluster_counts = np.stack((n_reads - counts_1, counts_1), axis=1).astype(np.float64)
+        for row in np.flatnonzero(live & (cluster_counts == 0).any(axis=1)):
+            assigned = centers[rows[row], new_labels[row].astype(np.int64)]
+            distances = np.sum((working[row] - assigned) ** 2, axis=1)
+            far = np.argpartition(distances, -1)[-1]
+            old, empty = int(new_labels[row, far]), int(not new_labels[row, far])
+            sums[row, old] -= working[row, far]
+            cluster_counts[row, old] -= 1
+            sums[row, empty] = working[row, far]
+            cluster_counts[row, empty] = 1
+
+        old_centers = centers[rows]
+        new_centers = old_centers.copy()
+        non_empty = live[:, None] & (cluster_counts > 0)
+        new_centers[non_empty] = sums[non_empty] * (1 / cluster_counts[non_empty])[:, None]
+        shift = (np.sqrt(np.sum((new_centers - old_centers) ** 2, axis=2)) ** 2).sum(axis=1)
+        changed = (new_labels != labels[rows]).any(axis=1) | (iteration == 0)
+        labels[rows[live]] = new_labels[live]
+        centers[rows[live]] = new_centers[live]
+
+        converged = live & changed & (shift <= tol[rows])
+        reassign[rows[converged]] = True
+        live &= changed & ~converged
+        if not live.any():
+            break
+        if live.sum() <= len(rows) // 2:
+            rows, working, live = rows[live], x[rows[live]], np.ones(live.sum(), dtype=bool)
+    else:
+        reassign[rows[live]] = True
+
+    if reassign.any():
+        labels[reassign] = _assign(x[reassign], centers[reassign])
+    residuals = x - np.where(labels[..., None], centers[:, None, 1], centers[:, None, 0])
+    squared = residuals[..., 0] ** 2
+    for j in range(1, residuals.shape[2]):
+        squared += residuals[..., j] ** 2
+    return labels, np.cumsum(squared, axis=1)[:, -1]
+
+
+def _same_clustering(labels: np.ndarray, other: np.ndarray) -> np.ndarray:
+    # Whether two labellings split the reads of every site the same way, up to
+    # swapping the clusters
+    mixed = np.zeros(len(labels), dtype=bool)
+    for cluster in (False, True):
+        in_cluster = labels == cluster
+        mixed |= (in_cluster & other).any(axis=1) & (in_cluster & ~other).any(axis=1)
+    return ~mixed
+
+
+def _site_two_means(x: np.ndarray, tol: np.ndarray, max_iter: int, n_init: int) -> np.ndarray:
+    # Clusters sites with the same number of reads, keeping the labels of the
+    # initialization with the lowest inertia of every site
+    n_sites = len(x)
+    draws = np.random.RandomState(RANDOM_STATE).random_sample((n_init, 3))
+    centers = _kmeans_plusplus(x, np.einsum("mnf,mnf->mn", x, x), draws)
+
+    # Every initialization of a site is clustered as a site of its own
+    labels, inertia = _lloyd(
+        np.broadcast_to(x, (n_init,) + x.shape).reshape((-1,) + x.shape[1:]),
+        centers.reshape((-1,) + centers.shape[2:]),
+        np.tile(tol, n_init),
+        max_iter,
+    )
+    labels = labels.reshape((n_init, n_sites, -1))
+    inertia = inertia.reshape(n_init, n_sites)
+
+    # Like sklearn, keeps the first initialization of lowest inertia, skipping any
+    # that only relabels the clusters of the best one
+    best, best_inertia = labels[0], inertia[0]
+    for i in range(1, n_init):
+        better = (inertia[i] < best_inertia) & ~_same_clustering(labels[i], best)
+        best = np.where(better[:, None], labels[i], best)
+        best_inertia = np.where(better, inertia[i], best_inertia)
+    return best
+
+
+def batch_two_means(
+    data: np.ndarray, offsets: np.ndarray, max_iter: int = 300, n_init: int = N_INIT
+) -> np.ndarray:
+    """
+    Clusters the reads of many sites into two clusters each, vectorized across the
+    sites with the same number of reads, with the labels
+    `KMeans(n_clusters=2, random_state=0)` of scikit-learn 1.3 gives every site, up
+    to floating point rounding.
+
+    Every initialization is seeded with k-means++ from the draws of a
+    `RandomState(0)`, refined with Lloyd's algorithm, and the one with the lowest
+    inertia is kept. Sites with a single read, which sklearn cannot cluster, and
+    sites whose reads cannot be split have every read labelled 0.
+
+    Parameters
+    ----------
+    data : np.ndarray
+        A 2D array of shape (n_reads, n_features) holding the reads of all sites
+        one after the other.
+
+    offsets : np.ndarray
+        Array of length n_sites + 1, the reads of site i are
+        `data[offsets[i]:offsets[i + 1]]`. Every site must contain at least one read.
+
+    max_iter : int
+        Maximum number of Lloyd iterations.
+
+    n_init : int
+        Number of k-means++ initializations.
+
+    Returns
+    -------
+    labels : np.ndarray
+        Cluster label (0 or 1) of every read.
+    """
+    data = np.asarray(data, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    counts = np.diff(offsets)
+    if np.any(counts < 1):
+        raise ValueError("Every site must contain at least one read.")
+    labels = np.zeros(len(data), dtype=np.int64)
+
+    for n_reads in np.unique(counts[counts >= 2]):
+        index = offsets[:-1][counts == n_reads][:, None] + np.arange(n_reads)
+        # Like sklearn, clusters the reads of every site centered on their mean
+        x = data[index]
+        x -= x.sum(axis=1, keepdims=True) / n_reads
+        tol = ((x * x).sum(axis=1) / n_reads).mean(axis=1) * TOL
+        site_labels = _site_two_means(x, tol, max_iter, n_init)
+        # Label 0 is always the non-empty cluster
+        site_labels[site_labels.all(axis=1)] = False
+        labels[index] = site_labels
+    return labels
+
+
+def two_means(array: np.ndarray, max_iter: int = 300, n_init: int = N_INIT) -> np.ndarray:
+    """
+    Clusters the reads of a single site into two clusters, see `batch_two_means`.
+
+    Parameters
+    ----------
+    array : np.ndarray
+        A 2D NumPy array of numerical data.
+
+    max_iter : int
+        Maximum number of Lloyd iterations.
+
+    n_init : int
+        Number of k-means++ initializations.
+
+    Returns
+    -------
+    labels : np.ndarray
+        Cluster label (0 or 1) of every row of the input array.
+    """
+    return batch_two_means(array, np.array([0, len(array)]), max_iter=max_iter, n_init=n_init)
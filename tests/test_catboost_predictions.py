@@ -0,0 +1,74 @@
+import pytest
+import numpy as np
+import pandas as pd
+from scripts.catboost_predictions import (
+    add_kmer_columns,
+    iter_predictions,
+    load_model,
+    score_batch,
+    write_predictions,
+)
+from scripts.parse_testset import parse_json
+from scripts.streaming import write_parquet
+
+MODEL_PATH = "models/final_catboost_model.cbm"
+
+
+@pytest.fixture
+def write_dataset(tmp_path, make_line, write_lines):
+    def write(n_lines):
+        lines = [make_line(f"ENST{i % 3}", i, n_reads=i % 5) for i in range(n_lines)]
+        df = parse_json(write_lines(tmp_path / "data.json", lines))
+        write_parquet(df, str(tmp_path / "parsed.parquet"), row_group_size=4)
+        return df
+
+    return write
+
+
+def test_add_kmer_columns():
+    df = pd.DataFrame({"seq": pd.Categorical(["AAACTGG", "GGACTTA"])})
+
+    result = add_kmer_columns(df)
+
+    assert list(result["seq_1"]) == ["AAACT", "GGACT"]
+    assert list(result["seq_2"]) == ["AACTG", "GACTT"]
+    assert list(result["seq_3"]) == ["ACTGG", "ACTTA"]
+
+
+def test_iter_predictions_matches_single_batch(tmp_path, write_dataset):
+    df = write_dataset(15)
+    model = load_model(MODEL_PATH)
+
+    batches = list(iter_predictions(str(tmp_path / "parsed.parquet"), model, batch_size=3))
+    result = pd.concat(batches, ignore_index=True)
+    expected = score_batch(model, df)
+
+    assert len(batches) > 1
+    assert list(result["transcript_position"]) == list(expected["transcript_position"])
+    assert np.allclose(result["score"], expected["score"], equal_nan=True)
+    assert result["score"].isna().sum() == 3
+
+
+def test_write_predictions(tmp_path, write_dataset):
+    write_dataset(10)
+    model = load_model(MODEL_PATH)
+
+    for name in ["scores.csv", "scores.parquet"]:
+        batches = iter_predictions(str(tmp_path / "parsed.parquet"), model, batch_size=3)
+        rows_written, invalid_rows = write_predictions(batches, str(tmp_path / name))
+
+        assert (rows_written, invalid_rows) == (10, 2)
+
+    csv = pd.read_csv(tmp_path / "scores.csv")
+    parquet = pd.read_parquet(tmp_path / "scores.parquet")
+    assert list(csv.columns) == ["transcript_id", "transcript_position", "score"]
+    assert np.allclose(csv["score"], parquet["score"], equal_nan=True)
+
+
+def test_score_batch_ignores_read_counts(tmp_path, write_dataset):
+    df = write_dataset(6)
+    model = load_model(MODEL_PATH)
+
+    with_counts = score_batch(model, df.assign(n_reads=np.arange(len(df))))
+
+    pd.testing.assert_frame_equal(with_counts, score_batch(model, df))
@@ -0,0 +1,66 @@
+import pytest
+import os
+import numpy as np
+import pandas as pd
+from sklearn.metrics import auc, precision_recall_curve, roc_auc_score
+from scripts.catboost_training import generate_predictions, split_by_gene, training_frame
+
+
+def test_split_by_gene():
+    genes = np.repeat([f"g{i}" for i in range(20)], np.arange(1, 21))
+    held_out = split_by_gene(genes, 0.2, seed=1)
+
+    assert set(genes[held_out]).isdisjoint(genes[~held_out])
+    assert 0.2 <= held_out.mean() < 0.2 + 20 / len(genes)
+    assert (split_by_gene(genes, 0.2, seed=1) == held_out).all()
+    assert not split_by_gene(genes, 0.0).any()
+    # At least one gene is kept for training
+    assert (~split_by_gene(np.array(["a", "a", "b"]), 0.9)).any()
+    with pytest.raises(ValueError):
+        split_by_gene(genes, 1.0)
+
+
+def test_training_frame(tmp_path, write_training_set):
+    train = pd.read_parquet(write_training_set(tmp_path, n_sites=10))
+    x, y = training_frame(train)
+
+    assert list(x.columns[-3:]) == ["seq_1", "seq_2", "seq_3"]
+    assert len(x.columns) == 138
+    assert (x["seq_2"] == "AACTG").all()
+    assert (y == train["label"].to_numpy()).all()
+
+
+def test_held_out_training_with_cached_pools(tmp_path, monkeypatch, write_training_set):
+    # CatBoost writes its logs to catboost_info in the working directory
+    monkeypatch.chdir(tmp_path)
+    training_path = write_training_set(tmp_path)
+    cache_dir = str(tmp_path / "pools")
+    settings = dict(iterations=30, thread_count=1, validation_fraction=0.25, early_stopping_rounds=5)
+
+    first = generate_predictions(training_path, cache_dir=cache_dir, **settings)
+    entries = os.listdir(cache_dir)
+    second = generate_predictions(training_path, cache_dir=cache_dir, **settings)
+    uncached = generate_predictions(training_path, **settings)
+    x, _ = training_frame(pd.read_parquet(training_path))
+
+    assert len(entries) == 1
+    assert sorted(os.listdir(os.path.join(cache_dir, entries[0]))) == ["borders.tsv", "eval.qpool", "train.qpool"]
+    assert os.listdir(cache_dir) == entries
+    assert first.tree_count_ == first.best_iteration_ + 1 <= 30
+    assert np.allclose(first.predict_proba(x), second.predict_proba(x))
+    assert uncached.tree_count_ <= 30
+
+
+def test_training_without_held_out_rows(tmp_path, monkeypatch, capsys, write_training_set):
+    monkeypatch.chdir(tmp_path)
+    training_path = write_training_set(tmp_path)
+    model = generate_predictions(training_path, iterations=10, thread_count=1)
+    out = capsys.readouterr().out
+
+    # The same evaluation as a predict pass over the training rows
+    x, y = training_frame(pd.read_parquet(training_path))
+    scores = model.predict_proba(x)[:, 1]
+    precision, recall, _ = precision_recall_curve(y, scores)
+    assert model.tree_count_ == 10
+    assert f"train roc auc: {round(roc_auc_score(y, scores),4)}" in out
+    assert f"train pr auc: {round(auc(recall, precision),4)}" in out
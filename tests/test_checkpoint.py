@@ -0,0 +1,115 @@
+import pytest
+import pandas as pd
+from scripts.checkpoint import Checkpoint, featurize_checkpointed
+from scripts.streaming import iter_line_chunks
+from scripts.engine import parse_dataset_streaming
+from scripts.parse_testset import parse_json, parse_row_features
+
+
+@pytest.mark.parametrize("name", ["data.json", "data.json.gz"])
+def test_iter_line_chunks_offsets(tmp_path, name, site_lines, write_lines):
+    json_path = tmp_path / name
+    write_lines(json_path, site_lines(7))
+
+    chunks = list(iter_line_chunks(str(json_path), 3))
+    resumed = list(iter_line_chunks(str(json_path), 3, start=chunks[0][1]))
+
+    assert [len(lines) for _, _, lines in chunks] == [3, 3, 1]
+    assert chunks[0][0] == 0
+    assert all(chunks[i][1] == chunks[i + 1][0] for i in range(2))
+    assert [lines for _, _, lines in resumed] == [lines for _, _, lines in chunks[1:]]
+
+
+def test_resume_skips_committed_chunks(tmp_path, site_lines, write_lines):
+    json_path = tmp_path / "data.json"
+    write_lines(json_path, site_lines(10))
+    work_dir = tmp_path / "work"
+
+    featurize_checkpointed(str(json_path), str(work_dir), parse_row_features, chunk_size=3)
+    # Simulate a run interrupted after its first two chunks
+    checkpoint = Checkpoint.open(str(work_dir), str(json_path), resume=True)
+    checkpoint.manifest["chunks"] = checkpoint.manifest["chunks"][:2]
+    checkpoint.manifest["complete"] = False
+    checkpoint._save()
+
+    parsed_lines = []
+
+    def counting_parser(row):
+        parsed_lines.append(row)
+        return parse_row_features(row)
+
+    checkpoint = featurize_checkpointed(
+        str(json_path), str(work_dir), counting_parser, resume=True, chunk_size=3
+    )
+
+    assert len(parsed_lines) == 4
+    assert checkpoint.complete
+    assert checkpoint.lines_done == 10
+
+
+def test_parse_dataset_streaming_resume_matches_fresh_run(tmp_path, site_lines, write_lines):
+    json_path = tmp_path / "data.json"
+    write_lines(json_path, site_lines(10))
+    output_path = tmp_path / "out.parquet"
+
+    parse_dataset_streaming(
+        str(json_path), str(output_path), parse_row_features, batch_size=4, work_dir=str(tmp_path / "work")
+    )
+    rows_written = parse_dataset_streaming(
+        str(json_path),
+        str(output_path),
+        parse_row_features,
+        batch_size=4,
+        work_dir=str(tmp_path / "work"),
+        resume=True,
+    )
+    result = pd.read_parquet(output_path)
+    expected = parse_json(str(json_path))
+
+    assert rows_written == 10
+    assert (result.values[:, 3:] == expected.values[:, 3:]).all()
+    assert list(result["transcript_position"]) == list(expected["transcript_position"])
+
+
+def test_resume_rejects_other_input(tmp_path, site_lines, write_lines):
+    json_path = tmp_path / "data.json"
+    write_lines(json_path, site_lines(4))
+    featurize_checkpointed(str(json_path), str(tmp_path / "work"), parse_row_features)
+    write_lines(json_path, site_lines(5))
+
+    with pytest.raises(ValueError):
+        Checkpoint.open(str(tmp_path / "work"), str(json_path), resume=True)
+
+
+def test_resume_rejects_other_features(tmp_path, site_lines, write_lines):
+    json_path = tmp_path / "data.json"
+    write_lines(json_path, site_lines(4))
+    Checkpoint.open(str(tmp_path / "work"), str(json_path), features=["whole_mean_dt_1"])
+
+    with pytest.raises(ValueError):
+        Checkpoint.open(str(tmp_path / "work"), str(json_path), resume=True)
+
+
+def test_resume_rejects_other_featurizer(tmp_path, site_lines, write_lines):
+    json_path = tmp_path / "data.json"
+    write_lines(json_path, site_lines(4))
+    featurize_checkpointed(str(json_path), str(tmp_path / "work"), parse_row_features)
+
+    with pytest.raises(ValueError):
+        featurize_checkpointed(
+            str(json_path), str(tmp_path / "work"), parse_row_features, resume=True, featurizer="ragged"
+        )
+
+
+def test_manifest_counts_lines_and_sites(tmp_path, site_lines, write_lines):
+    json_path = tmp_path / "data.json"
+    write_lines(json_path, site_lines(5))
+
+    checkpoint = featurize_checkpointed(
+        str(json_path), str(tmp_path / "work"), parse_row_features, chunk_size=2
+    )
+    blocks = list(checkpoint.iter_blocks())
+
+    assert [chunk["lines"] for chunk in checkpoint.manifest["chunks"]] == [2, 2, 1]
+    assert [chunk["sites"] for chunk in checkpoint.manifest["chunks"]] == [len(b["transcript_id"]) for b in blocks]
+    assert checkpoint.lines_done == 5
@@ -0,0 +1,49 @@
+import pytest
+from scripts.cli import main, resolve_command
+
+
+def test_resolve_parse():
+    assert resolve_command("parse", ["data.json", "eval"]) == ("scripts.parse_testset", ["data.json", "eval"])
+    assert resolve_command("parse", ["data.json", "--labels", "labels.info", "train", "--workers", "2"]) == (
+        "scripts.parse_json",
+        ["data.json", "labels.info", "train", "--workers", "2"],
+    )
+
+
+def test_resolve_train():
+    assert resolve_command("train", ["train.parquet", "test.parquet"]) == (
+        "scripts.catboost_training",
+        ["train.parquet", "test.parquet"],
+    )
+    assert resolve_command("train", ["--lgbm", "train.parquet", "features.json", "model.joblib"]) == (
+        "scripts.lgbm_predictions",
+        ["train", "train.parquet", "features.json", "model.joblib"],
+    )
+
+
+def test_resolve_predict(tmp_path):
+    assert resolve_command("predict", ["data.json.gz", "model.cbm", "out"])[0] == "scripts.pipeline"
+    store_dir = tmp_path / "store"
+    store_dir.mkdir()
+    (store_dir / "manifest.json").write_text("{}")
+    assert resolve_command("predict", [str(store_dir), "model.cbm", "out"])[0] == "scripts.pipeline"
+    assert resolve_command("predict", ["eval", "model.cbm", "out"]) == (
+        "scripts.catboost_predictions",
+        ["eval", "model.cbm", "out"],
+    )
+    assert resolve_command("predict", ["eval", "model.joblib", "out"]) == (
+        "scripts.lgbm_predictions",
+        ["predict", "eval", "model.joblib", "out"],
+    )
+
+
+def test_resolve_unknown_command():
+    with pytest.raises(ValueError):
+        resolve_command("fit", [])
+
+
+def test_main_help_imports_no_command(capsys):
+    main([])
+    assert "parse" in capsys.readouterr().out
+    with pytest.raises(SystemExit):
+        main(["fit"])
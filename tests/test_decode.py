@@ -0,0 +1,104 @@
+import pytest
+import json
+import numpy as np
+from scripts.decode import ReadCap, decode_row, decode_site_blocks, orjson, parse_reads
+
+
+MOCK_LINE = json.dumps(
+    {"ENST1": {"244": {"AAGACCA": [[0.00299, 2.06, 125.0], [0.0177, 10.4, 122.0]]}}}
+)
+
+
+def test_parse_reads():
+    reads = parse_reads("[[1.5, 2, 3e-3], [4, 5, 6]]")
+
+    assert reads.dtype == np.float32
+    assert np.allclose(reads, [[1.5, 2, 0.003], [4, 5, 6]])
+
+
+def test_parse_reads_malformed():
+    assert parse_reads("[[1, 2], [3]]") is None
+    assert parse_reads('[[1, "x"]]') is None
+
+
+@pytest.mark.parametrize("decoder", ["auto", "scan", "orjson", "json"])
+def test_decode_row(decoder):
+    if decoder == "orjson" and orjson is None:
+        pytest.skip("orjson is not installed")
+    row = decode_row(MOCK_LINE, decoder=decoder)
+    reads = row["ENST1"]["244"]["AAGACCA"]
+
+    assert reads.dtype == np.float32
+    assert np.allclose(reads, [[0.00299, 2.06, 125.0], [0.0177, 10.4, 122.0]])
+
+
+def test_decode_row_fallback():
+    line = json.dumps({"ENST1": {"1": {"AAACT": [[1, 2]]}, "2": {"AACTG": [[3, 4]]}}})
+    row = decode_row(line, decoder="scan")
+
+    assert np.allclose(row["ENST1"]["1"]["AAACT"], [[1, 2]])
+    assert np.allclose(row["ENST1"]["2"]["AACTG"], [[3, 4]])
+
+
+def test_decode_row_empty_reads():
+    row = decode_row(json.dumps({"ENST1": {"1": {"AAACT": []}}}), decoder="scan")
+
+    assert len(row["ENST1"]["1"]["AAACT"]) == 0
+
+
+def test_decode_row_unknown_decoder():
+    with pytest.raises(ValueError):
+        decode_row(MOCK_LINE, decoder="simdjson")
+
+
+@pytest.mark.parametrize("sampling", ["uniform", "stratified"])
+def test_read_cap_select(sampling):
+    read_cap = ReadCap(10, sampling, seed=3)
+    indices = read_cap.select(95, "ENST1", "244")
+
+    assert len(indices) == 10
+    assert len(np.unique(indices)) == 10
+    assert (np.diff(indices) > 0).all() and indices[0] >= 0 and indices[-1] < 95
+    assert (read_cap.select(95, "ENST1", "244") == indices).all()
+    assert read_cap.select(10, "ENST1", "244") is None
+    if sampling == "stratified":
+        assert ((indices // 9.5).astype(int) == np.arange(10)).all()
+
+
+def test_read_cap_invalid():
+    with pytest.raises(ValueError):
+        ReadCap(0)
+    with pytest.raises(ValueError):
+        ReadCap(10, sampling="reservoir")
+
+
+@pytest.mark.parametrize("decoder", ["scan", "json"])
+def test_decode_row_read_cap(decoder):
+    reads = np.arange(60, dtype=np.float32).reshape(20, 3)
+    line = json.dumps({"ENST1": {"244": {"AAGACCA": reads.tolist()}}})
+    read_cap = ReadCap(5, seed=1)
+    read_counts = []
+    row = decode_row(line, decoder=decoder, read_cap=read_cap, read_counts=read_counts)
+
+    indices = read_cap.select(20, "ENST1", "244")
+    assert read_counts == [20]
+    assert np.array_equal(row["ENST1"]["244"]["AAGACCA"], reads[indices])
+
+
+def test_decode_site_blocks():
+    reads = np.arange(21, dtype=np.float32).reshape(7, 3)
+    line = json.dumps({"ENST1": {"244": {"AAGACCA": reads.tolist()}}})
+    multi_line = json.dumps(
+        {"ENST1": {"1": {"AAACT": reads.tolist()}, "2": {"AACTG": reads[:2].tolist()}}}
+    )
+
+    [(transcript, position, kmer, blocks)] = decode_site_blocks(line, 3)
+    assert (transcript, position, kmer) == ("ENST1", "244", "AAGACCA")
+    blocks = list(blocks)
+    assert [len(block) for block in blocks] == [3, 3, 1]
+    assert np.array_equal(np.concatenate(blocks), reads)
+
+    sites = decode_site_blocks(multi_line, 3)
+    assert [site[:3] for site in sites] == [("ENST1", "1", "AAACT"), ("ENST1", "2", "AACTG")]
+    assert np.array_equal(np.concatenate(list(sites[0][3])), reads)
+    assert np.array_equal(np.concatenate(list(sites[1][3])), reads[:2])
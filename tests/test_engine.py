@@ -0,0 +1,70 @@
+import pytest
+import numpy as np
+from scripts.engine import (
+    blocks_to_frame,
+    featurize_chunk,
+    iter_feature_blocks,
+    keys_sorted,
+    sort_block,
+)
+from scripts.parse_testset import parse_row_features
+
+
+def test_featurize_chunk(make_line):
+    lines = [make_line("ENST1", 10), make_line("ENST2", 3)]
+    block = featurize_chunk(lines, parse_row_features)
+
+    assert list(block["transcript_id"]) == ["ENST1", "ENST2"]
+    assert list(block["transcript_position"]) == [10, 3]
+    assert block["features"].shape == (2, 135)
+
+
+def test_blocks_to_frame(make_line):
+    blocks = [featurize_chunk([make_line("ENST1", 10)], parse_row_features) for _ in range(3)]
+    df = blocks_to_frame(blocks)
+
+    assert df.shape == (3, 138)
+    assert list(df.columns[:3]) == ["transcript_id", "transcript_position", "seq"]
+
+
+def test_process_backend_matches_thread_backend(tmp_path, make_line, write_lines):
+    lines = [make_line(f"ENST{i % 3}", i, n_reads=2 + i % 5) for i in range(20)]
+    json_path = write_lines(tmp_path / "data.json", lines)
+
+    thread_blocks = list(
+        iter_feature_blocks(json_path, parse_row_features, backend="thread", chunk_size=3)
+    )
+    process_blocks = list(
+        iter_feature_blocks(
+            json_path, parse_row_features, backend="process", workers=2, chunk_size=3
+        )
+    )
+
+    assert len(process_blocks) == 7
+    assert np.allclose(
+        blocks_to_frame(thread_blocks).values[:, 3:].astype(float),
+        blocks_to_frame(process_blocks).values[:, 3:].astype(float),
+    )
+
+
+def test_unknown_backend(tmp_path):
+    with pytest.raises(ValueError):
+        next(iter_feature_blocks("data.json", parse_row_features, backend="gpu"))
+
+
+def test_sort_block(make_line):
+    lines = [make_line("ENST2", 3), make_line("ENST1", 10), make_line("ENST1", 4)]
+    block = featurize_chunk(lines, parse_row_features)
+    sorted_block = sort_block(block)
+
+    assert not keys_sorted(block)
+    assert keys_sorted(sorted_block)
+    assert list(sorted_block["transcript_id"]) == ["ENST1", "ENST1", "ENST2"]
+    assert list(sorted_block["transcript_position"]) == [4, 10, 3]
+    assert np.array_equal(sorted_block["features"][2], block["features"][0])
+
+
+def test_sort_block_already_sorted(make_line):
+    block = featurize_chunk([make_line("ENST1", 4), make_line("ENST1", 10)], parse_row_features)
+
+    assert sort_block(block) is block
@@ -0,0 +1,91 @@
+import pytest
+import json
+import os
+import sys
+import numpy as np
+import pandas as pd
+from lightgbm import LGBMClassifier
+from sklearn.preprocessing import MinMaxScaler
+from scripts.catboost_predictions import load_model, score_batch
+from scripts.ensemble_predictions import iter_ensemble_predictions, load_scorers, main
+from scripts.model_artifacts import load_lgbm_artifact, load_scorer, save_lgbm_artifact
+from scripts.parse_testset import parse_json
+from scripts.streaming import write_parquet
+
+MODEL_PATH = "models/final_catboost_model.cbm"
+
+
+@pytest.fixture
+def dataset(tmp_path, make_line, write_lines):
+    lines = [make_line(f"ENST{i // 4}", i, n_reads=i % 5, slope=i) for i in range(20)]
+    df = parse_json(write_lines(tmp_path / "data.json", lines), sort=False)
+    write_parquet(df, str(tmp_path / "parsed.parquet"))
+
+    with open("data/features_pr_auc.json") as f:
+        features = json.load(f)
+    valid = df.dropna()
+    scaler = MinMaxScaler().fit(valid[features].to_numpy())
+    model = LGBMClassifier(n_estimators=5, min_child_samples=2, verbose=-1)
+    model.fit(scaler.transform(valid[features].to_numpy()), np.arange(len(valid)) % 2)
+    save_lgbm_artifact(str(tmp_path / "lgbm.joblib"), model, scaler, features)
+    return tmp_path, df
+
+
+def test_lgbm_artifact_round_trip(dataset):
+    tmp_path, df = dataset
+
+    artifact = load_lgbm_artifact(str(tmp_path / "lgbm.joblib"))
+    scores = load_scorer(str(tmp_path / "lgbm.joblib")).score(df)
+
+    assert len(artifact["features"]) == 130
+    assert np.isnan(scores).sum() == 4
+    assert np.all((scores[~np.isnan(scores)] >= 0) & (scores[~np.isnan(scores)] <= 1))
+
+
+def test_load_scorer_unknown_format():
+    with pytest.raises(ValueError):
+        load_scorer("model.pkl")
+
+
+@pytest.mark.parametrize("input_name", ["parsed.parquet", "data.json"])
+def test_ensemble_scores_every_model(dataset, input_name):
+    tmp_path, df = dataset
+    scorers = load_scorers([MODEL_PATH, str(tmp_path / "lgbm.joblib"), MODEL_PATH])
+
+    batches = iter_ensemble_predictions(str(tmp_path / input_name), scorers, average=True, batch_size=7)
+    result = pd.concat(list(batches), ignore_index=True)
+    catboost_scores = score_batch(load_model(MODEL_PATH), df)["score"]
+
+    assert list(result.columns) == [
+        "transcript_id",
+        "transcript_position",
+        "score_final_catboost_model",
+        "score_lgbm",
+        "score_final_catboost_model_2",
+        "score",
+    ]
+    assert np.allclose(result["score_final_catboost_model"], catboost_scores, equal_nan=True)
+    assert np.allclose(
+        result["score"], result.iloc[:, 2:5].mean(axis=1, skipna=False), equal_nan=True
+    )
+
+
+def test_main_writes_ensemble_scores(dataset, monkeypatch):
+    tmp_path, df = dataset
+    model_path = os.path.abspath(MODEL_PATH)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["ensemble_predictions.py", "parsed.parquet", "ensemble", "--model", model_path,
+         "--model", "lgbm.joblib", "--average", "--batch-size", "7"],
+    )
+
+    main()
+
+    result = pd.read_csv(tmp_path / "output" / "ensemble.csv")
+    assert list(result.columns) == [
+        "transcript_id", "transcript_position", "score_final_catboost_model", "score_lgbm", "score"
+    ]
+    assert list(result["transcript_position"]) == list(df["transcript_position"])
+    assert result["score"].isna().sum() == 4
@@ -0,0 +1,97 @@
+import os
+import numpy as np
+import pandas as pd
+import scripts.engine as engine
+import scripts.feature_cache as feature_cache
+from scripts.feature_cache import FeatureCache
+from scripts.engine import parse_dataset_streaming
+from scripts.parse_testset import parse_json, parse_row_features
+
+
+def test_store_and_load(tmp_path):
+    cache = FeatureCache(str(tmp_path / "cache"), "ragged")
+    block = {
+        "transcript_id": np.array(["ENST1", "ENST2"]),
+        "transcript_position": np.array([5, 7]),
+        "seq": np.array(["AAACT", "AACTG"]),
+        "features": np.ones((2, 135), dtype=np.float32),
+    }
+    key = cache.chunk_key(["line 1\n", "line 2\n"])
+    assert key not in cache
+
+    cache.store(key, block)
+    loaded = cache.load(key)
+
+    assert key in cache
+    assert loaded.keys() == block.keys()
+    for name in block:
+        assert (loaded[name] == block[name]).all()
+        assert loaded[name].dtype == block[name].dtype
+
+
+def test_prune_deletes_least_recently_used(tmp_path):
+    cache = FeatureCache(str(tmp_path / "cache"), "ragged")
+    keys = [cache.chunk_key([f"line {i}"]) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.store(key, {"features": np.full((50, 135), i, dtype=np.float32)})
+        os.utime(cache.path(key), (i, i))
+    cache.load(keys[0])
+    size = os.path.getsize(cache.path(keys[0])) + os.path.getsize(cache.path(keys[2]))
+
+    assert cache.prune(size) == 1
+    assert keys[0] in cache
+    assert keys[1] not in cache
+    assert keys[2] in cache
+    assert cache.prune(size) == 0
+
+
+def test_chunk_key_depends_on_settings(tmp_path, monkeypatch, make_line):
+    lines = [make_line("ENST1", 5)]
+    site = FeatureCache(str(tmp_path), "site", parse_row_features).chunk_key(lines)
+    ragged = FeatureCache(str(tmp_path), "ragged").chunk_key(lines)
+    selected = FeatureCache(str(tmp_path), "ragged", features=["whole_mean_dt_1"]).chunk_key(lines)
+
+    assert len({site, ragged, selected}) == 3
+    assert FeatureCache(str(tmp_path), "ragged").chunk_key([lines[0] + "\n"]) == ragged
+
+    monkeypatch.setattr(feature_cache, "FEATURIZER_VERSION", feature_cache.FEATURIZER_VERSION + 1)
+    assert FeatureCache(str(tmp_path), "ragged").chunk_key(lines) != ragged
+
+
+def test_cached_run_skips_featurization(tmp_path, monkeypatch, site_lines, write_lines):
+    json_path = tmp_path / "data.json"
+    write_lines(json_path, site_lines(7))
+    cache_dir = str(tmp_path / "cache")
+    first = parse_dataset_streaming(
+        str(json_path), str(tmp_path / "first.parquet"), parse_row_features, batch_size=3, cache_dir=cache_dir
+    )
+
+    def fail(*args, **kwargs):
+        raise AssertionError("cached chunks should not be featurized again")
+
+    monkeypatch.setattr(engine, "featurize_chunk", fail)
+    second = parse_dataset_streaming(
+        str(json_path), str(tmp_path / "second.parquet"), parse_row_features, batch_size=3, cache_dir=cache_dir
+    )
+
+    assert first == second == 7
+    pd.testing.assert_frame_equal(
+        pd.read_parquet(tmp_path / "first.parquet"), pd.read_parquet(tmp_path / "second.parquet")
+    )
+
+
+def test_changed_input_recomputes_changed_chunks(tmp_path, make_line, site_lines, write_lines):
+    json_path = tmp_path / "data.json"
+    cache_dir = str(tmp_path / "cache")
+    write_lines(json_path, site_lines(7))
+    parse_json(str(json_path), chunk_size=3, featurizer="ragged", cache_dir=cache_dir)
+
+    lines = site_lines(7)
+    lines[4] = make_line("ENST9", 99)
+    write_lines(json_path, lines)
+    cache = FeatureCache(cache_dir, "ragged")
+    list(cache.keyed([lines[:3], lines[3:6], lines[6:]]))
+    df = parse_json(str(json_path), chunk_size=3, featurizer="ragged", cache_dir=cache_dir)
+
+    assert (cache.hits, cache.misses) == (2, 1)
+    assert ((df["transcript_id"] == "ENST9") & (df["transcript_position"] == 99)).sum() == 1
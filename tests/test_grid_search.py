@@ -0,0 +1,49 @@
+import pytest
+import numpy as np
+from scripts.grid_search import expand_grid, gene_folds, run_search
+
+FEATURES_PATHS = ["data/features_pr_auc.json", "data/features_reduced.json"]
+GRIDS = {"catboost": {"iterations": [5], "depth": [2, 3]}, "lgbm": {"n_estimators": [5], "min_child_samples": [2]}}
+
+
+def test_gene_folds():
+    genes = np.repeat([f"g{i}" for i in range(12)], np.arange(1, 13))
+    folds = gene_folds(genes, 3, seed=2)
+
+    for gene in np.unique(genes):
+        assert len(np.unique(folds[genes == gene])) == 1
+    assert sorted(np.bincount(folds)) == [26, 26, 26]
+    assert (gene_folds(genes, 3, seed=2) == folds).all()
+    with pytest.raises(ValueError):
+        gene_folds(np.array(["a", "a", "b"]), 3)
+
+
+def test_expand_grid():
+    assert expand_grid({"depth": [4, 6], "iterations": [10]}) == [
+        {"depth": 4, "iterations": 10},
+        {"depth": 6, "iterations": 10},
+    ]
+    assert expand_grid({}) == [{}]
+
+
+def test_run_search(tmp_path, write_training_set):
+    training_path = write_training_set(tmp_path, n_sites=60, sites_per_gene=6, kmers=("GGACTAA", "AAACTGG"))
+
+    folds, summary = run_search(training_path, FEATURES_PATHS, grids=GRIDS, n_folds=3, workers=1)
+    process_folds, _ = run_search(training_path, FEATURES_PATHS, grids=GRIDS, n_folds=3, workers=2)
+
+    # 2 feature lists x (2 CatBoost + 1 LightGBM configurations) x 3 folds
+    assert len(folds) == 18
+    assert len(summary) == 6
+    assert (summary["folds"] == 3).all()
+    assert summary["pr_auc_mean"].is_monotonic_decreasing
+    assert set(summary["features"]) == {"features_pr_auc", "features_reduced"}
+    assert (folds["train_rows"] + folds["valid_rows"] == 60).all()
+    assert (folds["fit_seconds"] > 0).all()
+    assert np.allclose(folds["roc_auc"], process_folds["roc_auc"])
+    assert np.allclose(folds["pr_auc"], process_folds["pr_auc"])
+
+
+def test_run_search_unknown_model(tmp_path):
+    with pytest.raises(ValueError):
+        run_search("train.parquet", FEATURES_PATHS, models=["xgboost"])
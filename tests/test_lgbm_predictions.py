@@ -0,0 +1,58 @@
+import json
+import sys
+import numpy as np
+import pandas as pd
+from scripts.lgbm_predictions import iter_predictions, main, train_model
+from scripts.model_artifacts import load_lgbm_artifact
+from scripts.parse_testset import parse_json
+from scripts.streaming import write_parquet
+
+FEATURES_PATH = "data/features_pr_auc.json"
+
+
+def test_train_then_predict(tmp_path, make_line, write_lines):
+    lines = [make_line(f"ENST{i // 5}", i, n_reads=i % 6, slope=i) for i in range(40)]
+    df = parse_json(write_lines(tmp_path / "data.json", lines))
+    write_parquet(df, str(tmp_path / "test.parquet"), row_group_size=8)
+    train = df.dropna().assign(label=lambda x: (x["transcript_position"] % 2).astype(int))
+    write_parquet(train, str(tmp_path / "train.parquet"))
+    artifact_path = str(tmp_path / "lgbm.joblib")
+
+    train_model(str(tmp_path / "train.parquet"), FEATURES_PATH, artifact_path)
+    result = pd.concat(list(iter_predictions(str(tmp_path / "test.parquet"), artifact_path, batch_size=6)))
+
+    artifact = load_lgbm_artifact(artifact_path)
+    with open(FEATURES_PATH) as f:
+        features = json.load(f)
+    valid = df[features].notna().all(axis=1).to_numpy()
+    expected = artifact["model"].predict_proba(
+        artifact["scaler"].transform(df.loc[valid, features].to_numpy())
+    )[:, 1]
+
+    assert artifact["features"] == features
+    assert list(result["transcript_position"]) == list(df["transcript_position"])
+    assert np.isnan(result["score"].to_numpy()[~valid]).all()
+    assert np.allclose(result["score"].to_numpy()[valid], expected)
+
+
+def test_predict_keeps_csv_layout(tmp_path, monkeypatch, make_line, write_lines):
+    lines = [make_line(f"ENST{i // 5}", i, n_reads=i % 6, slope=i) for i in range(30)]
+    df = parse_json(write_lines(tmp_path / "data.json", lines))
+    write_parquet(df, str(tmp_path / "test.parquet"), row_group_size=8)
+    train = df.dropna().assign(label=lambda x: (x["transcript_position"] % 2).astype(int))
+    write_parquet(train, str(tmp_path / "train.parquet"))
+    artifact_path = str(tmp_path / "lgbm.joblib")
+    train_model(str(tmp_path / "train.parquet"), FEATURES_PATH, artifact_path)
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["lgbm_predictions.py", "predict", "test.parquet", artifact_path, "dataset", "--batch-size", "7"],
+    )
+    main()
+
+    # The layout of DataFrame.to_csv on the whole set of scores
+    expected = pd.concat(list(iter_predictions("test.parquet", artifact_path)), ignore_index=True)
+    with open("output/dataset_results.csv") as f:
+        assert f.read() == expected.astype({"transcript_id": str}).to_csv()
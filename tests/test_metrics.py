@@ -0,0 +1,70 @@
+import json
+import pstats
+from scripts.metrics import InstrumentedTask, Metrics, active_metrics, count, recorded, stage
+from scripts.parse_testset import parse_json
+
+
+def featurize(lines):
+    with stage("decode"):
+        count(lines=len(lines))
+    return len(lines)
+
+
+def test_stage_without_recorder():
+    with stage("decode"):
+        count(lines=1)
+    assert active_metrics() is None
+
+
+def test_recorded():
+    result, recorder = recorded(featurize, ["a", "b"])
+
+    assert result == 2
+    assert recorder["counters"] == {"lines": 2}
+    assert recorder["stages"]["decode"][1] == 1
+
+
+def test_instrumented_task_fraction(tmp_path):
+    task = InstrumentedTask(featurize, profile_fraction=0.25, profile_dir=str(tmp_path))
+    results = [task((i, ["line"])) for i in range(8)]
+
+    assert [block for block, _ in results] == [1] * 8
+    assert sum(task.profiled(i) for i in range(8)) == 2
+    assert len(list(tmp_path.glob("*.prof"))) == 2
+    assert not any(InstrumentedTask(featurize, 0.25).profiled(i) for i in range(8))
+
+
+def test_metrics_of_parse(tmp_path, capsys, random_lines):
+    json_path = tmp_path / "data.json"
+    json_path.write_text("\n".join(random_lines(30)) + "\n")
+    metrics_path = tmp_path / "metrics.json"
+    profile_path = tmp_path / "run.prof"
+
+    metrics = Metrics(progress_interval=3600, profile_path=str(profile_path), profile_fraction=1.0)
+    with metrics.recording():
+        assert active_metrics() is metrics
+        parse_json(str(json_path), chunk_size=7, featurizer="ragged", backend="process", workers=2)
+    summary = metrics.finish(str(metrics_path))
+
+    assert active_metrics() is None
+    assert summary["counters"] == {"lines": 30, "sites": 30}
+    assert summary["stages"]["decode"]["calls"] == 5
+    assert {"decode", "cluster", "aggregate", "frame", "sort"} <= set(summary["stages"])
+    assert summary["sites_per_second"] > 0
+    assert json.loads(metrics_path.read_text()) == json.loads(json.dumps(summary))
+    assert pstats.Stats(str(profile_path)).total_calls > 0
+    assert not (tmp_path / "run.prof.chunks").exists()
+    # Progress is only reported once, at the end, within the interval
+    assert capsys.readouterr().out.count("Processed") == 1
+
+
+def test_site_featurizer_stages(tmp_path, random_lines):
+    json_path = tmp_path / "data.json"
+    json_path.write_text("\n".join(random_lines(10)) + "\n")
+
+    metrics = Metrics()
+    with metrics.recording():
+        parse_json(str(json_path), chunk_size=4, featurizer="site")
+    stages = metrics.summary()["stages"]
+
+    assert stages["decode"]["calls"] == stages["cluster"]["calls"] == stages["aggregate"]["calls"] == 10
@@ -0,0 +1,77 @@
+import pytest
+import json
+import numpy as np
+from scripts.engine import chunk_task
+from scripts.decode import ReadCap
+from scripts.online_features import (
+    OnlineSiteFeaturizer,
+    QuantileSketch,
+    RunningStats,
+    featurize_chunk_online,
+)
+from scripts.ragged_features import featurize_chunk_ragged
+from scripts.site_features import featurize_site
+
+
+def make_rows(n_sites, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        {f"ENST{i % 4}": {str(i): {"AAACTGG": rng.normal(size=(rng.integers(1, 40), 9)).tolist()}}}
+        for i in range(n_sites)
+    ]
+
+
+def test_running_stats():
+    array = np.random.default_rng(0).normal(5, 2, size=(1000, 9))
+    stats = RunningStats(9)
+    for start in range(0, len(array), 97):
+        stats.update(array[start:start + 97])
+
+    assert stats.count == 1000
+    assert np.allclose(stats.mean, array.mean(axis=0))
+    assert np.allclose(stats.sd, array.std(axis=0))
+    assert np.array_equal(stats.min, array.min(axis=0))
+    assert np.array_equal(stats.max, array.max(axis=0))
+
+
+def test_quantile_sketch():
+    array = np.random.default_rng(0).random((20000, 3))
+    sketch = QuantileSketch(3, capacity=128)
+    for start in range(0, len(array), 100):
+        sketch.update(array[start:start + 100])
+        if start + 100 <= 128:
+            assert np.array_equal(sketch.median(), np.median(array[:start + 100], axis=0))
+
+    assert sum(len(level) for level in sketch.levels) < 128 * len(sketch.levels)
+    ranks = (array < sketch.median()).mean(axis=0)
+    assert np.all(np.abs(ranks - 0.5) < 0.03)
+
+
+@pytest.mark.parametrize("n_reads", [1, 2, 7, 300])
+def test_online_featurizer_matches_featurize_site(n_reads):
+    array = np.random.default_rng(n_reads).normal(size=(n_reads, 9))
+    featurizer = OnlineSiteFeaturizer(9, init_size=300, capacity=300)
+    for start in range(0, n_reads, 64):
+        featurizer.update(array[start:start + 64])
+
+    assert np.allclose(featurizer.features(), featurize_site(array), atol=1e-5)
+
+
+def test_featurize_chunk_online_matches_ragged():
+    rows = [{"ENST0": {"0": {"AAACT": []}}}] + make_rows(20)
+    lines = [json.dumps(row) for row in rows]
+    block = featurize_chunk_online(lines, block_size=8)
+    expected = featurize_chunk_ragged(lines)
+
+    assert list(block["transcript_position"]) == list(expected["transcript_position"])
+    assert block["features"].dtype == np.float32
+    assert np.isnan(block["features"][0]).all()
+    assert np.allclose(block["features"], expected["features"], atol=1e-5, equal_nan=True)
+
+
+def test_online_chunk_task_options():
+    assert chunk_task("online", None) is featurize_chunk_online
+    with pytest.raises(ValueError):
+        chunk_task("online", None, features=["whole_mean_dt_1"])
+    with pytest.raises(ValueError):
+        chunk_task("online", None, read_cap=ReadCap(10))
@@ -1,9 +1,13 @@
 import pytest
 import numpy as np
+import pandas as pd
 import json
+import sys
+import scripts.parse_json as parse_json_script
 from scripts.parse_json import (
     generate_features,
     cluster_samples,
+    parse_json,
     parse_row,
     process_line,
 )
@@ -55,3 +59,25 @@ def test_process_line():
     result = process_line(0, mock_line)
 
     assert len(result) == 48
+
+
+@pytest.mark.parametrize("mode", [[], ["--stream"], ["--parts", "--workers", "2"]])
+def test_main_merges_labels(tmp_path, monkeypatch, site_lines, write_lines, mode):
+    write_lines(tmp_path / "data.json", site_lines(9))
+    pd.DataFrame({
+        "gene_id": [f"ENSG{i // 3}" for i in range(0, 9, 2)],
+        "transcript_id": [f"ENST{i // 3}" for i in range(0, 9, 2)],
+        "transcript_position": list(range(0, 9, 2)),
+        "label": [i % 4 // 2 for i in range(0, 9, 2)],
+    }).to_csv(tmp_path / "labels.csv", index=False)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["parse_json.py", "data.json", "labels.csv", "training"] + mode)
+    parse_json_script.main()
+
+    path = "data/training" if mode[:1] == ["--parts"] else "data/training.parquet"
+    result = pd.read_parquet(path)
+    expected = parse_json("data.json", "labels.csv")
+
+    assert list(result["transcript_position"]) == [0, 2, 4, 6, 8]
+    assert list(result["label"]) == list(expected["label"])
+    assert (result.values[:, 3:] == expected.values[:, 3:]).all()
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+from scripts.catboost_predictions import generate_predictions, load_model, score_batch
+from scripts.parse_testset import parse_json
+from scripts.pipeline import run_pipeline
+from scripts.streaming import write_parquet
+
+MODEL_PATH = "models/final_catboost_model.cbm"
+
+
+def test_score_batch_keeps_invalid_rows(tmp_path, make_line, write_lines):
+    lines = [make_line("ENST1", 1), make_line("ENST1", 2, n_reads=0)]
+    df = parse_json(write_lines(tmp_path / "data.json", lines))
+
+    scores = score_batch(load_model(MODEL_PATH), df)
+
+    assert list(scores.columns) == ["transcript_id", "transcript_position", "score"]
+    assert 0 <= scores["score"][0] <= 1
+    assert np.isnan(scores["score"][1])
+
+
+def test_run_pipeline_matches_two_step_predictions(tmp_path, make_line, write_lines):
+    lines = [make_line(f"ENST{i % 3}", i, n_reads=2 + i % 5) for i in range(12)]
+    json_path = write_lines(tmp_path / "data.json", lines)
+    features_path = tmp_path / "features.parquet"
+    write_parquet(parse_json(json_path), str(tmp_path / "parsed.parquet"))
+
+    scores = run_pipeline(
+        json_path, MODEL_PATH, batch_size=5, features_path=str(features_path)
+    )
+    expected = generate_predictions(str(tmp_path / "parsed.parquet"), MODEL_PATH)
+
+    assert list(scores["transcript_position"]) == list(expected["transcript_position"])
+    assert np.allclose(scores["score"], expected["score"])
+    assert len(pd.read_parquet(features_path)) == 12
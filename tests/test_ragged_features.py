@@ -0,0 +1,133 @@
+import pytest
+import json
+import numpy as np
+import scripts.engine as engine
+from scripts.ragged_features import (
+    featurize_chunk_ragged,
+    pack_rows,
+    ragged_features,
+    segment_stats,
+)
+from scripts.parse_testset import generate_features, parse_row_features
+from scripts.decode import ReadCap
+from scripts.site_features import feature_mask, featurize_site
+from scripts.streaming import KEY_COLUMNS, feature_columns
+
+
+def make_rows(n_sites, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        {f"ENST{i % 4}": {str(i): {"AAACTGG": rng.normal(size=(rng.integers(1, 40), 9)).tolist()}}}
+        for i in range(n_sites)
+    ]
+
+
+def test_pack_rows():
+    rows = [
+        {"ENST1": {"1": {"AAACT": [[1, 2], [3, 4]]}}},
+        {"ENST1": {"2": {"AACTG": []}}},
+        {"ENST2": {"7": {"ACTGG": [[5, 6]]}}},
+    ]
+    keys, data, offsets = pack_rows(rows)
+
+    assert keys == [("ENST1", "1", "AAACT"), ("ENST1", "2", "AACTG"), ("ENST2", "7", "ACTGG")]
+    assert data.shape == (3, 2)
+    assert list(offsets) == [0, 2, 2, 3]
+
+
+def test_segment_stats():
+    array = np.array([[1, 2, 3], [4, 5, 6], [7, 8, 9]], dtype=float)
+    data = np.vstack((array, array[:2]))
+    stats = segment_stats(data, np.array([0, 3, 5]))
+
+    assert stats.shape == (2, 5, 3)
+    assert np.allclose(stats[0].ravel(), generate_features(array))
+    assert np.allclose(stats[1].ravel(), generate_features(array[:2]))
+
+
+def test_ragged_features_match_featurize_site():
+    keys, data, offsets = pack_rows(make_rows(200))
+    features = ragged_features(data, offsets)
+
+    assert features.shape == (200, 135)
+    for i in range(len(keys)):
+        assert np.allclose(features[i], featurize_site(data[offsets[i]:offsets[i + 1]]))
+
+
+def test_ragged_features_invalid_site():
+    rows = [{"ENST1": {"1": {"AAACT": []}}}] + make_rows(3)
+    keys, data, offsets = pack_rows(rows)
+    features = ragged_features(data, offsets)
+
+    assert np.isnan(features[0]).all()
+    assert not np.isnan(features[1:]).any()
+
+
+def test_ragged_features_given_labels(monkeypatch):
+    import scripts.ragged_features as ragged
+
+    keys, data, offsets = pack_rows(make_rows(20))
+    labels = ragged.batch_two_means(data, offsets)
+    expected = ragged_features(data, offsets)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("given labels should not be recomputed")
+
+    monkeypatch.setattr(ragged, "batch_two_means", fail)
+    assert np.array_equal(ragged_features(data, offsets, labels=labels), expected)
+
+
+def test_featurize_chunk_ragged():
+    lines = [json.dumps(row) for row in make_rows(5)]
+    block = featurize_chunk_ragged(lines)
+
+    assert list(block["transcript_position"]) == [0, 1, 2, 3, 4]
+    assert block["features"].dtype == np.float32
+    assert block["features"].shape == (5, 135)
+
+
+@pytest.mark.parametrize(
+    "selected",
+    [
+        ["whole_mean_dt_1", "whole_max_curr_3"],
+        ["whole_median_sd_2", "cluster_1_min_dt_1", "cluster_2_sd_curr_2"],
+        ["cluster_2_max_dt_3", "cluster_2_median_dt_3"],
+    ],
+)
+def test_ragged_features_mask(selected):
+    keys, data, offsets = pack_rows(make_rows(100))
+    full = ragged_features(data, offsets)
+    masked = ragged_features(data, offsets, mask=feature_mask(selected))
+
+    columns = feature_columns()[len(KEY_COLUMNS):]
+    index = [columns.index(feature) for feature in selected]
+    others = [i for i in range(len(columns)) if i not in index]
+    assert np.allclose(masked[:, index], full[:, index])
+    assert np.isnan(masked[:, others]).all()
+
+
+def test_ragged_features_mask_skips_clustering(monkeypatch):
+    import scripts.ragged_features as ragged
+
+    def fail(*args, **kwargs):
+        raise AssertionError("two_means should not run for whole-site features")
+
+    monkeypatch.setattr(ragged, "batch_two_means", fail)
+    keys, data, offsets = pack_rows(make_rows(10))
+    features = ragged_features(data, offsets, mask=feature_mask(["whole_sd_dt_1"]))
+
+    assert not np.isnan(features[:, 4 * 9]).any()
+
+
+def test_featurize_chunk_ragged_read_cap():
+    lines = [json.dumps(row) for row in make_rows(20)]
+    block = featurize_chunk_ragged(lines, read_cap=ReadCap(8))
+    site_block = engine.featurize_chunk(lines, parse_row_features, read_cap=ReadCap(8))
+    full = featurize_chunk_ragged(lines)
+
+    counts = [len(list(row.values())[0][str(i)]["AAACTGG"]) for i, row in enumerate(make_rows(20))]
+    assert list(block["n_reads"]) == counts == list(site_block["n_reads"])
+    assert np.allclose(block["features"], site_block["features"], equal_nan=True)
+    small = np.array(counts) <= 8
+    assert np.array_equal(block["features"][small], full["features"][small])
+    assert not np.allclose(block["features"][~small], full["features"][~small])
@@ -0,0 +1,70 @@
+import pytest
+import json
+import numpy as np
+import pandas as pd
+from scripts.decode import ReadCap, decode_row
+from scripts.read_store import MANIFEST_FILE, ReadStore, is_read_store, write_read_store
+from scripts.shards import is_sharded
+from scripts.parse_testset import parse_json
+
+
+def test_write_read_store(tmp_path, write_lines, random_lines):
+    lines = random_lines(12) + [json.dumps({"ENST9": {"3": {"AACTG": []}}})]
+    json_path = write_lines(tmp_path / "data.json", lines)
+    manifest = write_read_store(json_path, str(tmp_path / "store"))
+    store = ReadStore(str(tmp_path / "store"))
+
+    assert is_read_store(str(tmp_path / "store"))
+    assert not is_sharded(str(tmp_path / "store"))
+    assert len(store) == manifest["sites"] == 13
+    assert isinstance(store.reads, np.memmap)
+    assert store.reads.dtype == np.float32
+    assert manifest["reads"] == len(store.reads)
+    for i, line in enumerate(lines):
+        [(transcript, positions)] = decode_row(line).items()
+        [(position, kmers)] = positions.items()
+        [(kmer, reads)] = kmers.items()
+        keys = store.chunk_keys(i, i + 1)
+        assert (keys["transcript_id"][0], keys["transcript_position"][0], keys["seq"][0]) == (
+            transcript, int(position), kmer
+        )
+        assert len(store.site_reads(i)) == len(reads)
+        if len(reads):
+            assert np.array_equal(store.site_reads(i), reads)
+
+
+def test_store_version(tmp_path, write_lines, random_lines):
+    json_path = write_lines(tmp_path / "data.json", random_lines(3))
+    write_read_store(json_path, str(tmp_path / "store"))
+    manifest_path = tmp_path / "store" / MANIFEST_FILE
+    manifest = json.loads(manifest_path.read_text())
+    manifest_path.write_text(json.dumps({**manifest, "version": 0}))
+
+    with pytest.raises(ValueError):
+        ReadStore(str(tmp_path / "store"))
+
+
+@pytest.mark.parametrize(
+    "featurizer, read_cap",
+    [("ragged", None), ("site", None), ("online", None), ("ragged", ReadCap(5)), ("site", ReadCap(5, "stratified"))],
+)
+def test_store_matches_json(tmp_path, featurizer, read_cap, write_lines, random_lines):
+    json_path = write_lines(tmp_path / "data.json", random_lines(30))
+    store_dir = str(tmp_path / "store")
+    write_read_store(json_path, store_dir)
+
+    expected = parse_json(json_path, chunk_size=7, featurizer=featurizer, read_cap=read_cap)
+    df = parse_json(store_dir, chunk_size=7, featurizer=featurizer, read_cap=read_cap)
+
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_store_process_backend(tmp_path, write_lines, random_lines):
+    json_path = write_lines(tmp_path / "data.json", random_lines(20))
+    store_dir = str(tmp_path / "store")
+    write_read_store(json_path, store_dir)
+
+    expected = parse_json(store_dir, chunk_size=6, featurizer="ragged")
+    df = parse_json(store_dir, chunk_size=6, featurizer="ragged", backend="process", workers=2)
+
+    pd.testing.assert_frame_equal(df, expected)
@@ -0,0 +1,89 @@
+import pytest
+import json
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from scripts.catboost_predictions import load_model, score_batch
+from scripts.parse_testset import parse_json
+from scripts.scoring_service import (
+    MicroBatcher,
+    create_server,
+    score_remote,
+    scores_to_records,
+)
+
+MODEL_PATH = "models/final_catboost_model.cbm"
+
+
+@pytest.fixture(scope="module")
+def server():
+    server = create_server(MODEL_PATH, port=0, max_wait=0.05)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    server.batcher.close()
+
+
+def url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_score_lines_matches_local_scoring(server, tmp_path, make_line, write_lines):
+    lines = [make_line("ENST1", i, n_reads=i % 4) for i in range(8)]
+    df = parse_json(write_lines(tmp_path / "data.json", lines), sort=False)
+    expected = score_batch(load_model(MODEL_PATH), df)
+
+    scores = score_remote(lines, url(server))
+
+    assert list(scores["transcript_position"]) == list(range(8))
+    assert np.allclose(scores["score"].astype(float), expected["score"], equal_nan=True)
+
+
+def test_score_rows(server, tmp_path, make_line, write_lines):
+    df = parse_json(write_lines(tmp_path / "data.json", [make_line("ENST1", 5)]))
+    rows = json.loads(df.astype({"transcript_id": str, "seq": str}).to_json(orient="records"))
+
+    request = urllib.request.Request(f"{url(server)}/score/rows", data=json.dumps(rows).encode())
+    with urllib.request.urlopen(request) as response:
+        records = json.loads(response.read())["scores"]
+
+    assert records == scores_to_records(score_batch(load_model(MODEL_PATH), df))
+
+
+def test_concurrent_requests_are_micro_batched(server, make_line):
+    batches_before = server.batcher.batches_scored
+    with ThreadPoolExecutor(8) as executor:
+        results = list(
+            executor.map(lambda i: score_remote([make_line("ENST2", i)], url(server)), range(8))
+        )
+
+    assert [int(result["transcript_position"][0]) for result in results] == list(range(8))
+    assert server.batcher.batches_scored - batches_before < 8
+
+
+def test_invalid_rows_request(server):
+    request = urllib.request.Request(f"{url(server)}/score/rows", data=b'[{"seq": "AAACTGG"}]')
+
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(request)
+
+    assert error.value.code == 400
+
+
+def test_bad_request_only_fails_itself(tmp_path, make_line, write_lines):
+    df = parse_json(write_lines(tmp_path / "data.json", [make_line("ENST1", 5)]))
+
+    batcher = MicroBatcher(load_model(MODEL_PATH), max_wait=0.2)
+    with pytest.raises(KeyError):
+        batcher.submit(df.drop(columns=["whole_mean_dt_1"]))
+    bad = batcher.submit(df.assign(whole_mean_dt_1="not a number"))
+    good = batcher.submit(df)
+    batcher.close()
+
+    with pytest.raises(Exception):
+        bad.result()
+    assert 0 <= good.result()["score"][0] <= 1
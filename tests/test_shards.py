@@ -0,0 +1,103 @@
+import pytest
+import pandas as pd
+from scripts.shards import is_sharded, parse_sharded, resolve_shards, split_byte_ranges
+from scripts.streaming import iter_line_chunks
+from scripts.parse_testset import parse_json, parse_row_features
+
+
+def test_split_byte_ranges_line_aligned(tmp_path, make_line, write_lines):
+    json_path = tmp_path / "data.json"
+    lines = [make_line("ENST1", i, n_reads=1 + i % 7) for i in range(25)]
+    write_lines(json_path, lines)
+
+    ranges = split_byte_ranges(str(json_path), 4)
+    read = [
+        line.strip()
+        for start, end in ranges
+        for _, _, chunk in iter_line_chunks(str(json_path), 100, start, end)
+        for line in chunk
+    ]
+
+    assert len(ranges) == 4
+    assert ranges[0][0] == 0 and ranges[-1][1] == json_path.stat().st_size
+    assert all(ranges[i][1] == ranges[i + 1][0] for i in range(3))
+    assert read == lines
+
+
+def test_split_byte_ranges_small_file(tmp_path, make_line, write_lines):
+    json_path = tmp_path / "data.json"
+    write_lines(json_path, [make_line("ENST1", 1)])
+
+    assert split_byte_ranges(str(json_path), 8) == [(0, json_path.stat().st_size)]
+
+
+def test_resolve_shards(tmp_path):
+    for name in ["b.json.gz", "a.json.gz", "notes.txt"]:
+        (tmp_path / name).write_text("")
+
+    assert is_sharded(str(tmp_path))
+    assert is_sharded(str(tmp_path / "*.json.gz"))
+    assert not is_sharded(str(tmp_path / "a.json.gz"))
+    assert resolve_shards(str(tmp_path)) == [str(tmp_path / "a.json.gz"), str(tmp_path / "b.json.gz")]
+    with pytest.raises(ValueError):
+        resolve_shards(str(tmp_path / "*.csv"))
+
+
+def test_parse_sharded_plain_file(tmp_path, make_line, write_lines):
+    json_path = tmp_path / "data.json"
+    write_lines(json_path, [make_line(f"ENST{i:03d}", i, n_reads=2 + i % 3) for i in range(30)])
+    dataset_path = tmp_path / "dataset"
+
+    rows_written = parse_sharded(str(json_path), str(dataset_path), parse_row_features, chunk_size=4, workers=3)
+    parts = sorted(path.name for path in dataset_path.iterdir())
+    result = pd.read_parquet(dataset_path)
+    expected = parse_json(str(json_path))
+
+    assert rows_written == 30
+    assert parts == ["part-00000.parquet", "part-00001.parquet", "part-00002.parquet"]
+    assert list(result["transcript_position"]) == list(expected["transcript_position"])
+    assert (result.values[:, 3:] == expected.values[:, 3:]).all()
+
+
+def test_parse_sharded_unsorted_ranges_are_merged(tmp_path, make_line, write_lines):
+    json_path = tmp_path / "data.json"
+    # Every byte range holds sites of all transcripts, so no part follows another
+    write_lines(json_path, [make_line(f"ENST{i % 4}", 100 - i, n_reads=2 + i % 3) for i in range(30)])
+    dataset_path = tmp_path / "dataset"
+
+    rows_written = parse_sharded(str(json_path), str(dataset_path), parse_row_features, chunk_size=4, workers=3)
+    result = pd.read_parquet(dataset_path)
+    expected = parse_json(str(json_path))
+
+    assert rows_written == 30
+    assert [path.name for path in dataset_path.iterdir()] == ["part-00000.parquet"]
+    assert list(result["transcript_id"].astype(str)) == list(expected["transcript_id"].astype(str))
+    assert list(result["transcript_position"]) == list(expected["transcript_position"])
+    assert (result.values[:, 3:] == expected.values[:, 3:]).all()
+
+
+def test_parse_sharded_no_sort_keeps_parts(tmp_path, make_line, write_lines):
+    json_path = tmp_path / "data.json"
+    write_lines(json_path, [make_line(f"ENST{i % 4}", 100 - i) for i in range(30)])
+    dataset_path = tmp_path / "dataset"
+
+    parse_sharded(str(json_path), str(dataset_path), parse_row_features, chunk_size=4, workers=3, sort=False)
+    result = pd.read_parquet(dataset_path)
+
+    assert len(list(dataset_path.iterdir())) == 3
+    assert list(result["transcript_position"]) == [100 - i for i in range(30)]
+
+
+def test_parse_sharded_gz_shards(tmp_path, make_line, write_lines):
+    shard_dir = tmp_path / "shards"
+    shard_dir.mkdir()
+    write_lines(shard_dir / "s1.json.gz", [make_line("ENST1", i) for i in range(5)])
+    write_lines(shard_dir / "s2.json.gz", [make_line("ENST2", i) for i in range(3)])
+    dataset_path = tmp_path / "dataset"
+
+    rows_written = parse_sharded(str(shard_dir / "*.json.gz"), str(dataset_path), parse_row_features, workers=2)
+    result = pd.read_parquet(dataset_path)
+
+    assert rows_written == 8
+    assert len(list(dataset_path.iterdir())) == 2
+    assert list(result["transcript_id"].astype(str)) == ["ENST1"] * 5 + ["ENST2"] * 3
@@ -0,0 +1,63 @@
+import pytest
+import numpy as np
+from scripts.site_features import feature_mask, featurize_site, fused_site_features
+from scripts.parse_testset import generate_features, cluster_samples
+
+
+def reference_features(array):
+    whole_set = generate_features(array)
+    if len(array) < 2:
+        return np.concatenate((whole_set, whole_set, whole_set))
+    cluster_1, cluster_2 = cluster_samples(array)
+    return np.concatenate(
+        (whole_set, generate_features(cluster_1), generate_features(cluster_2))
+    )
+
+
+def test_fused_site_features():
+    array = np.array([[1, 2, 3], [4, 5, 6], [7, 8, 9], [100, 100, 100]])
+    labels = np.array([0, 0, 0, 1])
+    result = fused_site_features(array, labels)
+
+    assert result.dtype == np.float32
+    assert len(result) == 45
+    assert np.allclose(result[:15], generate_features(array))
+    assert np.allclose(result[15:30], generate_features(array[:3]))
+    assert np.allclose(result[30:], generate_features(array[3:]))
+
+
+def test_fused_site_features_empty_cluster_2():
+    array = np.array([[1.0, 2.0], [3.0, 5.0]])
+    result = fused_site_features(array, np.zeros(2, dtype=int))
+
+    assert np.allclose(result[:10], result[10:20])
+    assert np.allclose(result[10:20], result[20:])
+
+
+def test_featurize_site_matches_reference():
+    rng = np.random.default_rng(0)
+    for n_reads in [1, 2, 3, 10, 57]:
+        array = rng.normal(size=(n_reads, 9))
+
+        assert np.allclose(featurize_site(array), reference_features(array), atol=1e-5)
+
+
+def test_featurize_site_out():
+    out = np.zeros(45, dtype=np.float32)
+    result = featurize_site(np.array([[1, 2, 3], [4, 5, 6], [7, 8, 9]]), out=out)
+
+    assert result is out
+    assert np.allclose(out[:3], [4, 5, 6])
+
+
+def test_feature_mask():
+    mask = feature_mask(["whole_mean_dt_1", "cluster_2_sd_curr_3"])
+
+    assert mask.shape == (3, 5, 9)
+    assert mask.sum() == 2
+    assert mask[0, 0, 0] and mask[2, 4, 8]
+
+
+def test_feature_mask_unknown_feature():
+    with pytest.raises(ValueError):
+        feature_mask(["whole_mean_dt_1", "seq_1"])
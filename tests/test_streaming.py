@@ -0,0 +1,255 @@
+import pytest
+import gzip
+import json
+import sys
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from concurrent.futures import ThreadPoolExecutor
+from scripts.streaming import (
+    bounded_map,
+    feature_columns,
+    frame_schema,
+    iter_batches,
+    iter_json_lines,
+    merge_sorted_runs,
+    parquet_to_csv,
+    read_feature_list,
+    read_parsed_dataset,
+    to_compact_frame,
+    write_parquet,
+)
+from scripts.decode import ReadCap
+import scripts.parse_testset as parse_testset
+from scripts.parse_testset import parse_json
+from scripts.engine import blocks_to_frame, featurize_chunk, parse_dataset_streaming
+from scripts.parse_testset import parse_row_features
+
+
+def test_feature_columns():
+    columns = feature_columns()
+
+    assert len(columns) == 138
+    assert columns[:3] == ["transcript_id", "transcript_position", "seq"]
+    assert columns[3] == "whole_mean_dt_1"
+    assert columns[-1] == "cluster_2_sd_curr_3"
+
+
+def test_iter_batches():
+    batches = list(iter_batches(range(7), 3))
+
+    assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_iter_json_lines_gz(tmp_path, make_line):
+    path = tmp_path / "data.json.gz"
+    with gzip.open(path, "wt") as f:
+        f.write(make_line("ENST1", 10) + "\n\n" + make_line("ENST1", 20) + "\n")
+
+    lines = list(iter_json_lines(str(path)))
+
+    assert len(lines) == 2
+
+
+def test_iter_json_lines_invalid_format():
+    with pytest.raises(ValueError):
+        list(iter_json_lines("data.csv"))
+
+
+def test_bounded_map_keeps_order():
+    with ThreadPoolExecutor(4) as executor:
+        results = list(bounded_map(executor, lambda x: x * 2, range(20), 3))
+
+    assert results == [x * 2 for x in range(20)]
+
+
+def test_parse_dataset_streaming(tmp_path, make_line):
+    json_path = tmp_path / "data.json"
+    lines = [make_line("ENST2", 5), make_line("ENST1", 30), make_line("ENST1", 7)]
+    json_path.write_text("\n".join(lines) + "\n")
+    output_path = tmp_path / "out.parquet"
+
+    rows_written = parse_dataset_streaming(str(json_path), str(output_path), parse_row_features, batch_size=2)
+    streamed = pd.read_parquet(output_path)
+    expected = parse_json(str(json_path))
+
+    assert rows_written == 3
+    assert list(streamed.columns) == feature_columns()
+    assert list(streamed["transcript_id"]) == ["ENST1", "ENST1", "ENST2"]
+    assert list(streamed["transcript_position"]) == [7, 30, 5]
+    assert (streamed.values[:, 3:] == expected.values[:, 3:]).all()
+
+
+def test_parse_dataset_streaming_unsorted(tmp_path, make_line):
+    json_path = tmp_path / "data.json"
+    lines = [make_line("ENST2", 5), make_line("ENST1", 30), make_line("ENST1", 7)]
+    json_path.write_text("\n".join(lines) + "\n")
+    output_path = tmp_path / "out.parquet"
+
+    parse_dataset_streaming(str(json_path), str(output_path), parse_row_features, batch_size=2, sort=False)
+    streamed = pd.read_parquet(output_path)
+
+    assert list(streamed["transcript_position"]) == [5, 30, 7]
+
+
+def test_merge_sorted_runs(tmp_path):
+    run_path = tmp_path / "runs.parquet"
+    output_path = tmp_path / "merged.parquet"
+    runs = [
+        pd.DataFrame({"transcript_id": ["A", "B", "C"], "transcript_position": [1, 2, 3]}),
+        pd.DataFrame({"transcript_id": ["A", "A", "D"], "transcript_position": [0, 5, 1]}),
+        pd.DataFrame({"transcript_id": ["B"], "transcript_position": [1]}),
+    ]
+    with pq.ParquetWriter(run_path, pa.Schema.from_pandas(runs[0], preserve_index=False)) as writer:
+        for run in runs:
+            writer.write_table(pa.Table.from_pandas(run, preserve_index=False))
+
+    merge_sorted_runs(str(run_path), str(output_path), batch_size=2)
+    merged = pd.read_parquet(output_path)
+
+    assert list(merged["transcript_id"]) == ["A", "A", "A", "B", "B", "C", "D"]
+    assert list(merged["transcript_position"]) == [0, 1, 5, 1, 2, 3, 1]
+
+
+def test_merge_sorted_runs_bounded_fan_in(tmp_path, monkeypatch):
+    import scripts.streaming as streaming
+
+    rng = np.random.default_rng(0)
+    run_path = tmp_path / "runs.parquet"
+    output_path = tmp_path / "merged.parquet"
+    frames = []
+    with pq.ParquetWriter(run_path, frame_schema(pd.DataFrame({
+        "transcript_id": ["A"], "transcript_position": [0], "value": [0.0]
+    }))) as writer:
+        for _ in range(50):
+            run = pd.DataFrame({
+                "transcript_id": rng.choice(["ENST1", "ENST2", "ENST3"], 40),
+                "transcript_position": rng.integers(0, 10**6, 40),
+                "value": rng.normal(size=40),
+            }).sort_values(["transcript_id", "transcript_position"])
+            frames.append(run)
+            writer.write_table(pa.Table.from_pandas(to_compact_frame(run), schema=writer.schema, preserve_index=False))
+
+    # Counts the runs read at the same time, which bounds the buffered rows
+    open_runs = []
+    max_open_runs = []
+    iter_run = streaming._iter_run
+
+    def counting_iter_run(*args):
+        open_runs.append(1)
+        max_open_runs.append(len(open_runs))
+        yield from iter_run(*args)
+        open_runs.pop()
+
+    monkeypatch.setattr(streaming, "_iter_run", counting_iter_run)
+    passes = merge_sorted_runs(str(run_path), str(output_path), batch_size=16, row_group_size=100, max_fan_in=4)
+    merged = pd.read_parquet(output_path)
+    expected = pd.concat(frames).sort_values(["transcript_id", "transcript_position"], kind="stable")
+
+    assert passes == 3
+    assert max(max_open_runs) <= 4
+    assert list(merged["transcript_id"].astype(str)) == list(expected["transcript_id"])
+    assert list(merged["transcript_position"]) == list(expected["transcript_position"])
+    assert np.allclose(merged["value"], expected["value"])
+    assert pq.ParquetFile(output_path).metadata.num_row_groups == 20
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["merged.parquet", "runs.parquet"]
+
+
+def test_write_parquet_compact_schema(tmp_path, make_line):
+    lines = [make_line("ENST1", 10), make_line("ENST1", 12)]
+    df = blocks_to_frame([featurize_chunk(lines, parse_row_features)])
+    output_path = tmp_path / "out.parquet"
+
+    write_parquet(df, str(output_path), compression="zstd", row_group_size=1)
+    schema = pq.read_schema(output_path)
+
+    assert pa.types.is_dictionary(schema.field("transcript_id").type)
+    assert pa.types.is_dictionary(schema.field("seq").type)
+    assert schema.field("transcript_position").type == pa.int32()
+    assert schema.field("whole_mean_dt_1").type == pa.float32()
+    assert pq.ParquetFile(output_path).num_row_groups == 2
+
+
+def test_write_parquet_invalid_codec(tmp_path):
+    df = pd.DataFrame({"transcript_id": ["ENST1"], "transcript_position": [1]})
+
+    with pytest.raises(ValueError):
+        write_parquet(df, str(tmp_path / "out.parquet"), compression="zip")
+
+
+def test_parquet_to_csv(tmp_path):
+    df = pd.DataFrame({"transcript_id": ["ENST1", "ENST2"], "transcript_position": [1, 2]})
+    write_parquet(df, str(tmp_path / "out.parquet"))
+
+    parquet_to_csv(str(tmp_path / "out.parquet"), str(tmp_path / "out.csv"), batch_size=1)
+    result = pd.read_csv(tmp_path / "out.csv")
+
+    assert list(result["transcript_id"]) == ["ENST1", "ENST2"]
+    assert list(result["transcript_position"]) == [1, 2]
+
+    parquet_to_csv(str(tmp_path / "out.parquet"), str(tmp_path / "index.csv"), batch_size=1, index=True)
+    assert (tmp_path / "index.csv").read_text() == df.to_csv()
+
+
+@pytest.mark.parametrize("mode", [[], ["--stream"], ["--parts", "--workers", "2"]])
+def test_parse_testset_csv_copy(tmp_path, monkeypatch, site_lines, write_lines, mode):
+    write_lines(tmp_path / "data.json", site_lines(9))
+    monkeypatch.chdir(tmp_path)
+    argv = ["parse_testset.py", "data.json", "parsed", "--csv", "--batch-size", "4"]
+    monkeypatch.setattr(sys, "argv", argv + mode)
+    parse_testset.main()
+
+    expected = parse_json("data.json").astype({"transcript_id": str, "seq": str})
+    result = pd.read_csv("data/parsed.csv", index_col=0)
+
+    assert list(result.index) == list(range(9))
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, rtol=1e-6)
+
+
+def test_read_feature_list(tmp_path):
+    features_path = tmp_path / "features.json"
+    features_path.write_text(json.dumps(["whole_mean_dt_1", "cluster_1_sd_curr_2"]))
+    assert read_feature_list(str(features_path)) == ["whole_mean_dt_1", "cluster_1_sd_curr_2"]
+
+    features_path.write_text(json.dumps(["whole_mean_dt_1", "label"]))
+    with pytest.raises(ValueError):
+        read_feature_list(str(features_path))
+
+
+def test_parse_dataset_streaming_selected_features(tmp_path, make_line):
+    json_path = tmp_path / "data.json"
+    lines = [make_line("ENST2", 5), make_line("ENST1", 30, n_reads=7), make_line("ENST1", 7)]
+    json_path.write_text("\n".join(lines) + "\n")
+    output_path = tmp_path / "out.parquet"
+    features = ["whole_mean_dt_1", "cluster_2_max_curr_3"]
+
+    parse_dataset_streaming(
+        str(json_path), str(output_path), parse_row_features, batch_size=2, featurizer="ragged", features=features
+    )
+    selected = read_parsed_dataset(str(output_path), features)
+    expected = parse_json(str(json_path))
+
+    assert list(selected.columns) == ["transcript_id", "transcript_position", "seq"] + features
+    assert (selected[features].values == expected[features].values).all()
+
+
+def test_parse_json_selected_features_site_featurizer(tmp_path, make_line):
+    json_path = tmp_path / "data.json"
+    json_path.write_text(make_line("ENST1", 5) + "\n")
+    with pytest.raises(ValueError):
+        parse_json(str(json_path), features=["whole_mean_dt_1"])
+
+
+def test_parse_dataset_streaming_read_cap(tmp_path, make_line):
+    json_path = tmp_path / "data.json"
+    lines = [make_line("ENST1", 5, n_reads=30), make_line("ENST1", 7, n_reads=3)]
+    json_path.write_text("\n".join(lines) + "\n")
+    output_path = tmp_path / "out.parquet"
+
+    parse_dataset_streaming(str(json_path), str(output_path), parse_row_features, read_cap=ReadCap(10, seed=2))
+    df = pd.read_parquet(output_path)
+
+    assert list(df.columns) == feature_columns() + ["n_reads"]
+    assert list(df["n_reads"]) == [30, 3]
+    assert pq.read_schema(output_path).field("n_reads").type == pa.int32()
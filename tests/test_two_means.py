@@ -0,0 +1,100 @@
+import pytest
+import numpy as np
+from sklearn.cluster import KMeans
+from scripts.parse_testset import generate_features, parse_row
+from scripts.two_means import batch_two_means, two_means
+
+
+def make_sites(n_sites, seed=0):
+    rng = np.random.default_rng(seed)
+    sites = []
+    for _ in range(n_sites):
+        n_a, n_b = rng.integers(2, 30, size=2)
+        centre = rng.normal(0, 5, size=9)
+        shift = rng.normal(0, 1, size=9)
+        shift = 8 * shift / np.linalg.norm(shift)
+        sites.append(
+            np.vstack(
+                (
+                    rng.normal(centre, 0.5, size=(n_a, 9)),
+                    rng.normal(centre + shift, 0.5, size=(n_b, 9)),
+                )
+            )
+        )
+    return sites
+
+
+def make_overlapping_sites(n_sites, seed=0):
+    # Reads shaped like m6Anet signal features, where a minority of modified reads
+    # shift one mean current by less than its spread
+    rng = np.random.default_rng(seed)
+    sites = []
+    for _ in range(n_sites):
+        n_reads = rng.integers(2, 80)
+        reads = np.empty((n_reads, 9))
+        reads[:, 0::3] = rng.lognormal(-5, 0.6, size=(n_reads, 3))
+        reads[:, 1::3] = rng.gamma(4, 1.5, size=(n_reads, 3))
+        reads[:, 2::3] = rng.normal(105, 8, size=(n_reads, 3))
+        reads[rng.random(n_reads) < rng.uniform(0, 0.4), 5] += 6
+        sites.append(reads)
+    return sites
+
+
+def sklearn_labels(array):
+    # The clustering of the original cluster_samples, with the n_init of scikit-learn 1.3
+    return KMeans(n_clusters=2, random_state=0, n_init=10).fit(array).labels_
+
+
+def test_two_means_matches_sklearn():
+    for array in make_sites(50):
+        assert np.array_equal(two_means(array), sklearn_labels(array))
+
+
+def test_two_means_matches_sklearn_on_overlapping_reads():
+    sites = make_overlapping_sites(200)
+    offsets = np.concatenate(([0], np.cumsum([len(site) for site in sites])))
+    labels = batch_two_means(np.vstack(sites), offsets)
+
+    for i, site in enumerate(sites):
+        assert np.array_equal(labels[offsets[i]:offsets[i + 1]], sklearn_labels(site))
+
+
+def test_cluster_features_match_sklearn_clusters():
+    for i, reads in enumerate(make_overlapping_sites(50, seed=2)):
+        labels = sklearn_labels(reads)
+        cluster_2 = reads[labels == 1] if (labels == 1).any() else reads[labels == 0]
+        expected = np.concatenate(
+            [generate_features(reads), generate_features(reads[labels == 0]), generate_features(cluster_2)]
+        )
+
+        features = parse_row({"ENST1": {str(i): {"AAACTGG": reads.tolist()}}})[3:]
+
+        assert np.allclose(features, expected, rtol=1e-5)
+
+
+def test_batch_two_means_matches_single_site():
+    sites = make_sites(30, seed=1)
+    offsets = np.concatenate(([0], np.cumsum([len(site) for site in sites])))
+    labels = batch_two_means(np.vstack(sites), offsets)
+
+    for i, site in enumerate(sites):
+        assert np.array_equal(labels[offsets[i]:offsets[i + 1]], two_means(site))
+
+
+def test_two_means_identical_reads():
+    labels = two_means(np.ones((5, 3)))
+
+    assert np.array_equal(labels, np.zeros(5))
+
+
+def test_two_means_single_read_sites():
+    data = np.array([[1.0, 2.0], [3.0, 4.0], [5.0, 6.0], [50.0, 60.0]])
+    labels = batch_two_means(data, np.array([0, 1, 2, 4]))
+
+    assert np.array_equal(labels[:2], [0, 0])
+    assert np.array_equal(labels[2:], sklearn_labels(data[2:]))
+
+
+def test_batch_two_means_empty_site():
+    with pytest.raises(ValueError):
+        batch_two_means(np.ones((2, 3)), np.array([0, 0, 2]))